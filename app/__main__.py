@@ -0,0 +1,120 @@
+"""CLI của pipeline: python -m app <stage> [...]
+
+    python -m app run [--fresh] [--stream]   # toàn bộ pipeline, resume lượt chạy dở
+    python -m app ingest | extract | dedupe | rank | summarize [--limit N]
+    python -m app worker [--kinds extract,summarize] [--exit-when-idle]   # xử lý job queue
+    python -m app --help
+
+Mỗi lệnh chỉ import module nó cần (feedparser, trafilatura, numpy, client LLM ... nạp lúc
+chạy lệnh chứ không phải lúc import), nên `--help` hay một stage nhẹ khởi động nhanh.
+Mọi lệnh nhận --profile: chạy dưới cProfile, lưu file .prof cạnh DB và in 25 hàm tốn
+nhất (cumulative).
+Các stage lẻ chạy ngoài pipeline_runs: rank chỉ in thứ hạng, summarize tóm tắt top bài
+đang xếp hạng vào summary_cache (lượt run sau dùng lại), không ghi picks.
+"""
+import argparse, json, os, sys
+from datetime import datetime
+
+def cmd_run(args):
+    from .config import PIPELINE_STREAM
+    from .pipeline import run_pipeline
+    return run_pipeline(resume=not args.fresh, stream=PIPELINE_STREAM or args.stream)
+
+def cmd_ingest(args):
+    from .ingest import ingest_once
+    return f"Ingested {ingest_once()} new items."
+
+def cmd_extract(args):
+    import asyncio
+    from .extract import extract_missing_text
+    return f"Extracted {asyncio.run(extract_missing_text())} articles"
+
+def cmd_dedupe(args):
+    from .dedupe import dedupe_titles, dedupe_content
+    return f"Removed {dedupe_titles()} duplicates, clustered {dedupe_content()} near-duplicate articles"
+
+def _ranked(limit):
+    from .config import PICK_POOL
+    from .embed import embed_missing
+    from .ranker import rank_recent, diversify
+    embed_missing()
+    ranked = rank_recent(limit=max(PICK_POOL, limit))
+    score = {nid: sc for sc, nid in ranked}
+    return [(score[nid], nid) for nid in diversify(ranked, limit)]
+
+def _news(ids):
+    from sqlalchemy import select, func
+    from .db import SessionLocal
+    from .models import News, NewsContent
+    with SessionLocal() as s:
+        rows = s.execute(
+            select(News.id, News.url, News.title, News.source, func.unzstd(NewsContent.body).label("content_text"))
+            .outerjoin(NewsContent, NewsContent.news_id == News.id)
+            .where(News.id.in_(ids))
+        ).all()
+    by_id = {r.id: r for r in rows}
+    return [by_id[i] for i in ids if i in by_id]
+
+def cmd_rank(args):
+    ranked = _ranked(args.limit)
+    for (sc, _), r in zip(ranked, _news([nid for _, nid in ranked])):
+        print(f"{sc:7.3f}  [{r.source}] {r.title[:90]}")
+    return f"Ranked {len(ranked)} articles"
+
+def cmd_summarize(args):
+    import asyncio
+    from .summarizer import summarize_many
+    rows = _news([nid for _, nid in _ranked(args.limit)])
+    summaries = asyncio.run(summarize_many([(r.url, r.title, r.source, r.content_text) for r in rows]))
+    for summ in summaries:
+        print(json.dumps(summ, ensure_ascii=False))
+    return f"Summarized {len(summaries)} articles"
+
+def cmd_worker(args):
+    # chạy N process này (cùng máy với DB) để chia việc extract / summarize của pipeline,
+    # xem app/jobs.py và PIPELINE_WORKERS
+    from .db import init_db
+    from .jobs import run_worker, WORKER_ID
+    init_db()
+    print(f"[worker {WORKER_ID}] waiting for {args.kinds} jobs")
+    return run_worker(tuple(args.kinds.split(",")), exit_when_idle=args.exit_when_idle)
+
+def main(argv=None):
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--profile", action="store_true", default=argparse.SUPPRESS, help="chạy dưới cProfile, lưu .prof cạnh DB")
+    ap = argparse.ArgumentParser(prog="python -m app", parents=[common])
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p_run = sub.add_parser("run", parents=[common], help="toàn bộ pipeline ingest → ... → publish")
+    p_run.add_argument("--fresh", action="store_true", help="bỏ lượt chạy dở (nếu có), chạy lại từ ingest")
+    p_run.add_argument("--stream", action="store_true", help="các stage chạy gối nhau qua queue")
+    sub.add_parser("ingest", parents=[common], help="crawl feed, lưu bài mới")
+    sub.add_parser("extract", parents=[common], help="tải + extract nội dung bài chưa có")
+    sub.add_parser("dedupe", parents=[common], help="loại trùng tiêu đề, gom bài trùng nội dung")
+    for name, text in (("rank", "in top bài đang xếp hạng (sau MMR)"), ("summarize", "tóm tắt top bài vào cache")):
+        p = sub.add_parser(name, parents=[common], help=text)
+        p.add_argument("--limit", type=int, default=None, help="số bài (mặc định DAILY_TOP_K)")
+    p_worker = sub.add_parser("worker", parents=[common], help="nhận job extract / summarize từ bảng jobs")
+    p_worker.add_argument("--kinds", default="extract,summarize")
+    p_worker.add_argument("--exit-when-idle", action="store_true", help="thoát khi hàng đợi trống")
+    args = ap.parse_args(argv)
+    if getattr(args, "limit", 0) is None:
+        from .config import DAILY_TOP_K
+        args.limit = DAILY_TOP_K
+    cmd = globals()[f"cmd_{args.cmd}"]
+
+    if not getattr(args, "profile", False):
+        print(cmd(args))
+        return
+    import cProfile, pstats
+    from .config import DB_PATH
+    prof = cProfile.Profile()
+    try:
+        print(prof.runcall(cmd, args))
+    finally:
+        path = os.path.join(os.path.dirname(DB_PATH), f"{args.cmd}-{datetime.now():%Y%m%d-%H%M%S}.prof")
+        prof.dump_stats(path)
+        pstats.Stats(prof).sort_stats("cumulative").print_stats(25)
+        print(f"📈 Profile: {path} (python -m pstats {path}, hoặc snakeviz)")
+
+if __name__ == "__main__":
+    sys.exit(main())
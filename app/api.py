@@ -1,12 +1,25 @@
-from fastapi import FastAPI
-from fastapi.responses import HTMLResponse, JSONResponse
-from sqlalchemy import select
 import json
-from .db import SessionLocal
-from .models import News, Summary, Picks
-from .pipeline import today_str
-
-app = FastAPI(title="AI News MVP")
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Path, Query, Request
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
+from sqlalchemy import select
+from .archive import MAX_LIMIT, news_page, summaries_page, stream_page
+from .db import init_db
+from .models import PipelineRun
+from .publish import PicksPageCache, page_response, today_str
+from .readdb import read_engine, fetch_one
+from .search import MAX_RESULTS, search
+from . import metrics
+
+@asynccontextmanager
+async def lifespan(app):
+    # pool read-only mở file ở mode=ro → file + bảng phải có sẵn
+    init_db()
+    yield
+    await read_engine.dispose()
+
+app = FastAPI(title="AI News MVP", lifespan=lifespan)
+app.add_middleware(metrics.RequestMetrics)
 
 HTML_PAGE = """
 <!doctype html>
@@ -124,30 +137,61 @@ HTML_PAGE = """
 """
 
 @app.get("/", response_class=HTMLResponse)
-def home():
+async def home():
     return HTML_PAGE
 
 
+picks_pages = PicksPageCache()
+
 @app.get("/api/picks/today", response_class=JSONResponse)
-def api_picks_today():
-    d = today_str()
-    with SessionLocal() as s:
-        rows = s.execute(
-            select(Picks, Summary, News)
-            .join(Summary, Summary.id == Picks.summary_id)
-            .join(News, News.id == Picks.news_id)
-            .where(Picks.date_str == d)
-            .order_by(Picks.rank.asc())
-        ).all()
-
-        out = []
-        for p, summ, news in rows:
-            out.append({
-                "rank": p.rank,
-                "title_vi": summ.title_vi,
-                "bullets": json.loads(summ.bullets_json),
-                "hashtags": summ.hashtags.split(",") if summ.hashtags else [],
-                "source": news.source,
-                "url": news.url,
-            })
-        return {"date": d, "top_posts": out}
\ No newline at end of file
+async def api_picks_today(request: Request):
+    # bytes dựng sẵn bởi pipeline (app/publish.py); hỗ trợ If-None-Match → 304 và gzip/br
+    return page_response(await picks_pages.get(today_str()), request)
+
+@app.get("/api/picks/{date}", response_class=JSONResponse)
+async def api_picks_date(request: Request, date: str = Path(pattern=r"^\d{4}-\d{2}-\d{2}$")):
+    return page_response(await picks_pages.get(date), request)
+
+@app.get("/api/news")
+async def api_news(
+    source: str | None = None,
+    before: str | None = None,
+    limit: int = Query(50, ge=1, le=MAX_LIMIT),
+    fields: str | None = None,
+):
+    # ?fields=id,title,url,... ; content_text chỉ trả khi được yêu cầu rõ
+    try:
+        stmt, cols, cursor_of = news_page(source, before, fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(stream_page(stmt, cols, limit, cursor_of), media_type="application/json")
+
+@app.get("/api/summaries")
+async def api_summaries(
+    before: str | None = None,
+    limit: int = Query(50, ge=1, le=MAX_LIMIT),
+    fields: str | None = None,
+):
+    try:
+        stmt, cols, cursor_of = summaries_page(before, fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(stream_page(stmt, cols, limit, cursor_of), media_type="application/json")
+
+@app.get("/api/search")
+async def api_search(q: str = Query(..., min_length=1, max_length=200), limit: int = Query(20, ge=1, le=MAX_RESULTS)):
+    # FTS5 + bm25, không phân biệt dấu: "tri tue nhan tao" khớp "trí tuệ nhân tạo"
+    return {"q": q, "items": await search(q, limit)}
+
+LAST_RUN_REPORT = (
+    select(PipelineRun.report).where(PipelineRun.report.is_not(None)).order_by(PipelineRun.id.desc()).limit(1)
+)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    # metrics của process API + snapshot trong report của lượt pipeline gần nhất
+    sources = [(metrics.snapshot(), {"process": "api"})]
+    row = await fetch_one(LAST_RUN_REPORT)
+    if row is not None:
+        sources.append((json.loads(row.report)["metrics"], {"process": "pipeline"}))
+    return PlainTextResponse(metrics.render(*sources), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,110 @@
+import json
+from datetime import datetime
+from sqlalchemy import select, literal, tuple_, func
+from .models import News, NewsContent, Summary
+from .readdb import stream
+
+# Danh sách bài / summary cho API, phân trang keyset: trang sau gửi lại `next` của
+# trang trước qua ?before=, mỗi trang là một range scan ngược trên index
+# (published_at, id) / (source, published_at, id) hoặc PK — không OFFSET nên thời
+# gian trả lời không phụ thuộc trang sâu bao nhiêu hay bảng lớn bao nhiêu.
+
+MAX_LIMIT = 500
+
+NEWS_FIELDS = {
+    name: getattr(News, name)
+    for name in ("id", "url", "title", "source", "published_at", "og_image", "lang", "fetched_at",
+                 "social_score", "topic_tags", "topic_cluster", "cluster_id", "content_len")
+}
+# nội dung nằm ở news_content (nén zstd), chỉ giải nén khi được yêu cầu
+NEWS_FIELDS["content_text"] = (
+    select(func.unzstd(NewsContent.body)).where(NewsContent.news_id == News.id).scalar_subquery()
+)
+NEWS_DEFAULT = ("id", "title", "source", "url", "published_at", "og_image")
+
+SUMMARY_FIELDS = {
+    "id": Summary.id,
+    "news_id": Summary.news_id,
+    "title_vi": Summary.title_vi,
+    "bullets": Summary.bullets_json,
+    "so_what_vn": Summary.so_what_vn,
+    "hashtags": Summary.hashtags,
+    "attribution": Summary.attribution,
+    "url": Summary.url,
+    "created_at": Summary.created_at,
+    "source": News.source,
+    "published_at": News.published_at,
+}
+SUMMARY_DEFAULT = ("id", "news_id", "title_vi", "bullets", "hashtags", "source", "url", "created_at")
+
+def _fields(spec: str | None, known: dict, default: tuple) -> list[str]:
+    if not spec:
+        return list(default)
+    names = [f.strip() for f in spec.split(",") if f.strip()]
+    unknown = [f for f in names if f not in known]
+    if unknown:
+        raise ValueError(f"unknown fields: {', '.join(unknown)}")
+    return list(dict.fromkeys(names))
+
+def _news_cursor(before: str):
+    # "<published_at ISO>_<id>" (giá trị `next`) hoặc chỉ một mốc ngày/giờ
+    ts, _, nid = before.partition("_")
+    try:
+        return datetime.fromisoformat(ts), int(nid) if nid else None
+    except ValueError:
+        raise ValueError(f"invalid cursor: {before!r}") from None
+
+def news_page(source: str | None, before: str | None, fields: str | None):
+    fields = _fields(fields, NEWS_FIELDS, NEWS_DEFAULT)
+    stmt = select(*(NEWS_FIELDS[f].label(f) for f in fields), News.published_at.label("_ts"), News.id.label("_id"))
+    if source:
+        stmt = stmt.where(News.source == source)
+    if before:
+        ts, nid = _news_cursor(before)
+        ts = literal(ts, News.published_at.type)
+        stmt = stmt.where(News.published_at < ts if nid is None else tuple_(News.published_at, News.id) < tuple_(ts, nid))
+    stmt = stmt.order_by(News.published_at.desc(), News.id.desc())
+    return stmt, fields, lambda row: f"{row._ts.isoformat()}_{row._id}"
+
+def summaries_page(before: str | None, fields: str | None):
+    fields = _fields(fields, SUMMARY_FIELDS, SUMMARY_DEFAULT)
+    stmt = select(*(SUMMARY_FIELDS[f].label(f) for f in fields), Summary.id.label("_id"))
+    if {"source", "published_at"} & set(fields):
+        stmt = stmt.outerjoin(News, News.id == Summary.news_id)
+    if before:
+        try:
+            stmt = stmt.where(Summary.id < int(before))
+        except ValueError:
+            raise ValueError(f"invalid cursor: {before!r}") from None
+    return stmt.order_by(Summary.id.desc()), fields, lambda row: str(row._id)
+
+def _value(name, value):
+    if name == "bullets":
+        try:
+            return json.loads(value)
+        except Exception:
+            return []
+    if name == "hashtags":
+        # cùng dạng list như /api/picks (publish.materialize_picks)
+        return value.split(",") if value else []
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+async def stream_page(stmt, fields, limit: int, cursor_of):
+    """Ghi {"items": [...], "next": cursor|null} dần theo từng lô dòng đọc từ DB."""
+    yield b'{"items":['
+    n, last, more = 0, None, False
+    async for rows in stream(stmt.limit(limit + 1)):
+        if n + len(rows) > limit:
+            rows, more = rows[:limit - n], True
+        if not rows:
+            break
+        # một chunk HTTP cho mỗi lô dòng
+        chunk = b",".join(
+            json.dumps({f: _value(f, getattr(row, f)) for f in fields}, ensure_ascii=False).encode() for row in rows
+        )
+        yield (b"," if n else b"") + chunk
+        n, last = n + len(rows), rows[-1]
+    nxt = cursor_of(last) if more else None
+    yield b'],"next":' + json.dumps(nxt).encode() + b"}"
@@ -0,0 +1,43 @@
+import json
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, delete
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from .config import SUMMARY_CACHE_TTL_DAYS, SUMMARY_CACHE_MAX_ROWS
+from .db import SessionLocal
+from .models import SummaryCache
+
+# Cache kết quả LLM theo key nội dung (xem summarizer.cache_key) – một bài đã tóm tắt
+# với cùng model + prompt thì các lần chạy lại không gọi LLM nữa.
+
+def get_many(keys) -> dict:
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        return {}
+    with SessionLocal() as s:
+        rows = s.execute(select(SummaryCache.key, SummaryCache.payload).where(SummaryCache.key.in_(keys))).all()
+        if rows:
+            s.execute(update(SummaryCache).where(SummaryCache.key.in_([k for k, _ in rows])).values(used_at=datetime.utcnow()))
+            s.commit()
+    return {k: json.loads(p) for k, p in rows}
+
+def put(key: str, model: str, payload: dict):
+    now = datetime.utcnow()
+    stmt = sqlite_insert(SummaryCache).values(
+        key=key, model=model, payload=json.dumps(payload, ensure_ascii=False), created_at=now, used_at=now
+    )
+    with SessionLocal() as s:
+        s.execute(stmt.on_conflict_do_update(
+            index_elements=[SummaryCache.key],
+            set_={"payload": stmt.excluded.payload, "model": stmt.excluded.model,
+                  "created_at": now, "used_at": now},
+        ))
+        s.commit()
+
+def evict(ttl_days: float = SUMMARY_CACHE_TTL_DAYS, max_rows: int = SUMMARY_CACHE_MAX_ROWS) -> int:
+    """Xoá mục quá TTL, rồi giữ lại tối đa max_rows mục dùng gần nhất."""
+    with SessionLocal() as s:
+        n = s.execute(delete(SummaryCache).where(SummaryCache.created_at < datetime.utcnow() - timedelta(days=ttl_days))).rowcount
+        keep = select(SummaryCache.key).order_by(SummaryCache.used_at.desc()).limit(max_rows)
+        n += s.execute(delete(SummaryCache).where(SummaryCache.key.not_in(keep))).rowcount
+        s.commit()
+    return n
@@ -4,9 +4,88 @@ load_dotenv()
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "")  # để trống = endpoint mặc định của SDK
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com")
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "60"))
 OUTPUT_LANG = os.getenv("OUTPUT_LANG", "vi")
 DAILY_TOP_K = int(os.getenv("DAILY_TOP_K", "10"))
 TIMEZONE = os.getenv("TIMEZONE", "Asia/Ho_Chi_Minh")
 OUTPUT_LANG = "tiếng Việt"
 
-DB_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "data", "ai_news.db"))
+# Ingest: tải feed song song
+FEED_CONCURRENCY = int(os.getenv("FEED_CONCURRENCY", "16"))
+FEED_PER_HOST = int(os.getenv("FEED_PER_HOST", "2"))
+FEED_TIMEOUT = float(os.getenv("FEED_TIMEOUT", "20"))
+
+# Pipeline: 1 = chế độ streaming (ingest → extract → dedupe → tóm tắt nối qua queue), như --stream
+PIPELINE_STREAM = os.getenv("PIPELINE_STREAM", "0") == "1"
+# Stream: tóm tắt trước tối đa N bài lọt top giữa chừng (0 = không tóm tắt trước), xem app/stream.py
+STREAM_PREFETCH = int(os.getenv("STREAM_PREFETCH", os.getenv("DAILY_TOP_K", "10")))
+# Job queue (bảng jobs): stage extract / summarize chia việc cho PIPELINE_WORKERS process
+# (pipeline tự mở thêm N-1 process `python -m app worker`, worker chạy sẵn ở nơi khác cũng
+# nhận việc); 0 = chạy trong process pipeline như cũ
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", "0"))
+JOB_LEASE_S = float(os.getenv("JOB_LEASE_S", "60"))  # job / lock không được gia hạn sau N giây → nhận lại
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# stage ít hơn N việc chạy thẳng trong process pipeline: mỗi process worker mất ~0.5s khởi
+# động (import + process pool), lô nhỏ qua queue chậm hơn chạy tại chỗ
+JOB_MIN_ITEMS = int(os.getenv("JOB_MIN_ITEMS", "200"))
+
+# Extract: tải trang song song, parse trafilatura trong process pool
+EXTRACT_CONCURRENCY = int(os.getenv("EXTRACT_CONCURRENCY", "32"))
+EXTRACT_PER_DOMAIN = int(os.getenv("EXTRACT_PER_DOMAIN", "4"))
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", "0"))  # 0 = số CPU
+EXTRACT_BATCH = int(os.getenv("EXTRACT_BATCH", "50"))
+EXTRACT_TIMEOUT = float(os.getenv("EXTRACT_TIMEOUT", "20"))
+
+# Dedupe: token có df vượt ngưỡng không dùng để chặn cặp ứng viên
+DEDUPE_BATCH = int(os.getenv("DEDUPE_BATCH", "2000"))
+DEDUPE_MAX_DF = int(os.getenv("DEDUPE_MAX_DF", "500"))
+DEDUPE_MAX_CANDIDATES = int(os.getenv("DEDUPE_MAX_CANDIDATES", "50"))
+# Dedupe nội dung: khoảng cách Hamming tối đa giữa hai SimHash (<= 3 để band 4×16 bit không bỏ sót)
+SIMHASH_MAX_DISTANCE = int(os.getenv("SIMHASH_MAX_DISTANCE", "3"))
+# Ranking: cửa sổ ứng viên (giờ), số ứng viên tối đa, độ dài nội dung tối thiểu (ký tự)
+RANK_WINDOW_HOURS = float(os.getenv("RANK_WINDOW_HOURS", "72"))
+RANK_MAX_CANDIDATES = int(os.getenv("RANK_MAX_CANDIDATES", "100000"))
+RANK_MIN_CONTENT_LEN = int(os.getenv("RANK_MIN_CONTENT_LEN", "200"))
+# Đa dạng hoá picks: MMR trên PICK_POOL bài điểm cao nhất; bài có cosine >= TOPIC_SIM
+# được gom chung một chủ đề (news.topic_cluster)
+PICK_POOL = int(os.getenv("PICK_POOL", "200"))
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.5"))
+TOPIC_SIM = float(os.getenv("TOPIC_SIM", "0.5"))
+EMBED_DIM = int(os.getenv("EMBED_DIM", "256"))
+# Summarize: số request LLM chạy đồng thời + hạn mức theo provider (requests/phút, tokens/phút)
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "8"))
+SUMMARY_BATCH_SIZE = int(os.getenv("SUMMARY_BATCH_SIZE", "1"))  # >1: nhiều bài / request
+# Ngân sách token nội dung mỗi bài gửi LLM (các câu trích, xem summarizer.extract_many)
+SUMMARY_INPUT_TOKENS = int(os.getenv("SUMMARY_INPUT_TOKENS", "500"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+OPENAI_RPM = float(os.getenv("OPENAI_RPM", "500"))
+OPENAI_TPM = float(os.getenv("OPENAI_TPM", "200000"))
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", "15"))
+GEMINI_TPM = float(os.getenv("GEMINI_TPM", "1000000"))
+# Cache tóm tắt LLM: hết hạn sau N ngày, giữ tối đa N mục
+SUMMARY_CACHE_TTL_DAYS = float(os.getenv("SUMMARY_CACHE_TTL_DAYS", "30"))
+SUMMARY_CACHE_MAX_ROWS = int(os.getenv("SUMMARY_CACHE_MAX_ROWS", "20000"))
+
+# SQLite: WAL + busy_timeout để API đọc được khi pipeline đang ghi
+SQLITE_PRAGMAS = os.getenv("SQLITE_PRAGMAS", "1") != "0"
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "10000"))
+SQLITE_CACHE_MB = int(os.getenv("SQLITE_CACHE_MB", "64"))
+SQLITE_MMAP_MB = int(os.getenv("SQLITE_MMAP_MB", "256"))
+# API: số kết nối read-only (aiosqlite) giữ sẵn trong pool
+READ_POOL_SIZE = int(os.getenv("READ_POOL_SIZE", "8"))
+
+DB_PATH = os.getenv("DB_PATH") or os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "data", "ai_news.db")
+)
+# Vector embedding (float16, memmap) của bài, mặc định cạnh file DB
+EMBED_PATH = os.getenv("EMBED_PATH") or os.path.join(os.path.dirname(DB_PATH), "embeddings.f16")
+# Nội dung bài: nén zstd trong bảng news_content; từ điển (python -m app.content train) lưu
+# trong CONTENT_DICT_DIR — phải giữ (và backup) cùng file DB
+CONTENT_ZSTD_LEVEL = int(os.getenv("CONTENT_ZSTD_LEVEL", "9"))
+CONTENT_DICT_DIR = os.getenv("CONTENT_DICT_DIR") or os.path.join(os.path.dirname(DB_PATH), "zstd")
+# Lưu trữ: nội dung bài đăng cách đây hơn N ngày chuyển ra file nén theo tháng (0 = không chuyển)
+CONTENT_RETENTION_DAYS = float(os.getenv("CONTENT_RETENTION_DAYS", "30"))
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR") or os.path.join(os.path.dirname(DB_PATH), "archive")
@@ -0,0 +1,191 @@
+import argparse, io, json, os, threading, time
+from datetime import datetime, timedelta
+from glob import glob
+from hashlib import blake2b
+import zstandard as zstd
+
+from .config import CONTENT_ZSTD_LEVEL, CONTENT_DICT_DIR, CONTENT_RETENTION_DAYS, ARCHIVE_DIR
+
+# Nội dung bài không nằm trong bảng news mà trong news_content, mỗi bài một frame zstd;
+# news chỉ giữ content_len + content_hash nên các query quét news (ranker, dedupe, API)
+# không kéo nội dung theo. Nếu đã train từ điển (python -m app.content train) thì nén kèm
+# từ điển mới nhất — bài cùng site lặp lại nhiều đoạn giống nhau, bài ngắn nén tốt hơn hẳn.
+# Header frame ghi dict_id nên giải nén tự tìm đúng <CONTENT_DICT_DIR>/<dict_id>.dict, từ
+# điển cũ phải được giữ lại.
+# Hàm SQL unzstd(body) được đăng ký trên mọi kết nối (app.db, app.readdb): trigger FTS,
+# snippet() và query đọc nội dung ngay trong SQL, vd. select(func.unzstd(NewsContent.body)).
+#
+# Bài cũ hơn CONTENT_RETENTION_DAYS: `python -m app.content archive` chuyển nội dung ra
+# ARCHIVE_DIR/content-YYYY-MM.jsonl.zst (zstd thường, đọc được bằng zstdcat) rồi xoá khỏi
+# news_content; dòng news vẫn giữ (url unique là khoá chống ingest lại bài cũ).
+
+ARCHIVE_ZSTD_LEVEL = 19
+DICT_SIZE = 112_640  # mặc định của zstd --train
+
+_local = threading.local()  # ZstdCompressor / ZstdDecompressor không dùng chung giữa các thread
+_dicts: dict = {}
+_current = None
+
+def _dict(dict_id: int):
+    d = _dicts.get(dict_id)
+    if d is None:
+        with open(os.path.join(CONTENT_DICT_DIR, f"{dict_id}.dict"), "rb") as f:
+            d = _dicts[dict_id] = zstd.ZstdCompressionDict(f.read())
+    return d
+
+def current_dict() -> int:
+    """dict_id của từ điển mới nhất trong CONTENT_DICT_DIR, 0 = nén không từ điển."""
+    global _current
+    if _current is None:
+        files = glob(os.path.join(CONTENT_DICT_DIR, "*.dict"))
+        _current = int(os.path.basename(max(files, key=os.path.getmtime))[:-5]) if files else 0
+    return _current
+
+def _ctx(dict_id: int, compress: bool):
+    cache = _local.__dict__.setdefault("ctx", {})
+    c = cache.get((dict_id, compress))
+    if c is None:
+        d = _dict(dict_id) if dict_id else None
+        c = cache[(dict_id, compress)] = (
+            zstd.ZstdCompressor(level=CONTENT_ZSTD_LEVEL, dict_data=d) if compress else zstd.ZstdDecompressor(dict_data=d)
+        )
+    return c
+
+def compress(text: str) -> bytes:
+    return _ctx(current_dict(), True).compress(text.encode("utf-8"))
+
+def decompress(body: bytes | None) -> str | None:
+    if body is None:
+        return None
+    return _ctx(zstd.get_frame_parameters(body).dict_id, False).decompress(body).decode("utf-8")
+
+def content_hash(text: str) -> str:
+    return blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+def register(dbapi_conn, _record=None):
+    """Đăng ký unzstd(body) cho một kết nối SQLite (dùng làm listener "connect")."""
+    dbapi_conn.create_function("unzstd", 1, decompress, deterministic=True)
+
+def train_dict(samples=2000, recompress=True) -> dict:
+    """Train từ điển từ `samples` bài mới nhất, dùng nó cho các lần nén sau.
+
+    recompress: nén lại toàn bộ news_content bằng từ điển mới.
+    """
+    global _current
+    from sqlalchemy import select, func, update, bindparam
+    from .db import SessionLocal, init_db
+    from .models import NewsContent
+    init_db()
+    with SessionLocal() as s:
+        texts = s.scalars(
+            select(func.unzstd(NewsContent.body)).order_by(NewsContent.news_id.desc()).limit(samples)
+        ).all()
+    try:
+        d = zstd.train_dictionary(DICT_SIZE, [t.encode("utf-8") for t in texts])
+    except zstd.ZstdError as e:
+        print(f"[content] không train được từ điển từ {len(texts)} bài: {e}")
+        return {"samples": len(texts), "dict_id": None}
+    os.makedirs(CONTENT_DICT_DIR, exist_ok=True)
+    with open(os.path.join(CONTENT_DICT_DIR, f"{d.dict_id()}.dict"), "wb") as f:
+        f.write(d.as_bytes())
+    _current = d.dict_id()
+    out = {"samples": len(texts), "dict_id": _current, "recompressed": 0}
+    if not recompress:
+        return out
+    with SessionLocal() as s:
+        last = -1
+        while rows := s.execute(
+            select(NewsContent.news_id, NewsContent.body)
+            .where(NewsContent.news_id > last).order_by(NewsContent.news_id).limit(1000)
+        ).all():
+            s.execute(
+                update(NewsContent.__table__).where(NewsContent.news_id == bindparam("_id"))
+                .values(body=bindparam("_body")),
+                [{"_id": i, "_body": compress(decompress(b))} for i, b in rows],
+            )
+            s.commit()
+            out["recompressed"] += len(rows)
+            last = rows[-1][0]
+    return out
+
+def archive_content(days=CONTENT_RETENTION_DAYS, batch=1000) -> int:
+    """Chuyển nội dung bài đăng cách đây hơn `days` ngày ra ARCHIVE_DIR, trả về số bài.
+
+    Mỗi lô ghi thêm một frame vào file của tháng (published_at) và fsync trước khi xoá
+    khỏi DB: crash giữa chừng chỉ có thể làm một bài xuất hiện hai lần trong archive.
+    """
+    if days <= 0:
+        return 0
+    from sqlalchemy import select, delete
+    from .db import SessionLocal, init_db
+    from .models import News, NewsContent
+    init_db()
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    cctx = zstd.ZstdCompressor(level=ARCHIVE_ZSTD_LEVEL)
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    n = 0
+    with SessionLocal() as s:
+        while rows := s.execute(
+            select(News.id, News.url, News.title, News.source, News.published_at, NewsContent.body)
+            .join(NewsContent, NewsContent.news_id == News.id)
+            .where(News.published_at < cutoff)
+            .order_by(News.id)
+            .limit(batch)
+        ).all():
+            months: dict = {}
+            for r in rows:
+                months.setdefault(f"{r.published_at:%Y-%m}", []).append(json.dumps({
+                    "id": r.id, "url": r.url, "title": r.title, "source": r.source,
+                    "published_at": r.published_at.isoformat(), "content_text": decompress(r.body),
+                }, ensure_ascii=False) + "\n")
+            for month, lines in months.items():
+                with open(os.path.join(ARCHIVE_DIR, f"content-{month}.jsonl.zst"), "ab") as f:
+                    f.write(cctx.compress("".join(lines).encode("utf-8")))
+                    f.flush()
+                    os.fsync(f.fileno())
+            s.execute(delete(NewsContent).where(NewsContent.news_id.in_([r.id for r in rows])))
+            s.commit()
+            n += len(rows)
+    return n
+
+def iter_archive(path):
+    """Đọc lại một file archive (nhiều frame nối nhau), mỗi dòng một dict."""
+    with open(path, "rb") as f:
+        reader = zstd.ZstdDecompressor().stream_reader(f, read_across_frames=True)
+        for line in io.TextIOWrapper(reader, encoding="utf-8"):
+            yield json.loads(line)
+
+def stats() -> dict:
+    from sqlalchemy import select, func
+    from .db import SessionLocal
+    from .models import News, NewsContent
+    with SessionLocal() as s:
+        rows, packed = s.execute(select(func.count(), func.coalesce(func.sum(func.length(NewsContent.body)), 0))).one()
+        chars = s.scalar(
+            select(func.coalesce(func.sum(News.content_len), 0)).join(NewsContent, NewsContent.news_id == News.id)
+        )
+    return {"rows": rows, "chars": chars, "bytes": packed, "ratio": round(chars / packed, 2) if packed else None,
+            "dict_id": current_dict()}
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p_train = sub.add_parser("train", help="train từ điển zstd từ các bài mới nhất")
+    p_train.add_argument("--samples", type=int, default=2000)
+    p_train.add_argument("--no-recompress", action="store_true")
+    p_archive = sub.add_parser("archive", help="chuyển nội dung bài cũ ra file nén theo tháng")
+    p_archive.add_argument("--days", type=float, default=CONTENT_RETENTION_DAYS)
+    p_archive.add_argument("--vacuum", action="store_true", help="VACUUM sau đó để thu nhỏ file DB")
+    sub.add_parser("stats")
+    args = ap.parse_args()
+
+    if args.cmd == "train":
+        print(train_dict(args.samples, not args.no_recompress))
+    elif args.cmd == "archive":
+        t0 = time.perf_counter()
+        print(f"[content] archived {archive_content(args.days)} articles in {time.perf_counter() - t0:.2f}s")
+        if args.vacuum:
+            from .db import engine
+            with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                conn.exec_driver_sql("VACUUM")
+    print(stats())
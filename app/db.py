@@ -1,10 +1,203 @@
-from sqlalchemy import create_engine
+import os
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 
-from .config import DB_PATH
+from .config import DB_PATH, SQLITE_PRAGMAS, SQLITE_BUSY_TIMEOUT_MS, SQLITE_CACHE_MB, SQLITE_MMAP_MB
+from .metrics import instrument_engine
+from . import content
 
-engine = create_engine(f"sqlite:///{DB_PATH}", echo=False, future=True)
+os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+engine = create_engine(
+    f"sqlite:///{DB_PATH}", echo=False, future=True,
+    connect_args={"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+instrument_engine(engine, "write")
+
+def apply_pragmas(dbapi_conn, _record=None):
+    # WAL: reader không bị chặn bởi writer (cron pipeline) và ngược lại
+    cur = dbapi_conn.cursor()
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute("PRAGMA synchronous=NORMAL")
+    cur.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cur.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_MB * 1024}")
+    cur.execute(f"PRAGMA mmap_size={SQLITE_MMAP_MB * 1024 * 1024}")
+    cur.execute("PRAGMA temp_store=MEMORY")
+    cur.close()
+
+if SQLITE_PRAGMAS:
+    event.listen(engine, "connect", apply_pragmas)
+event.listen(engine, "connect", content.register)  # unzstd(body) cho trigger FTS / query
 
 class Base(DeclarativeBase):
     pass
+
+# ---- Migration theo PRAGMA user_version: mỗi hàm chạy đúng một lần trên mỗi DB ----
+
+def _m1_unique_links(conn):
+    # summaries.news_id trở thành unique: giữ summary mới nhất của mỗi bài, trỏ picks về đó
+    conn.exec_driver_sql("""
+        UPDATE picks SET summary_id = (
+            SELECT MAX(s2.id) FROM summaries s2
+            WHERE s2.news_id = (SELECT s1.news_id FROM summaries s1 WHERE s1.id = picks.summary_id)
+        ) WHERE summary_id IN (SELECT id FROM summaries)
+    """)
+    conn.exec_driver_sql("DELETE FROM summaries WHERE id NOT IN (SELECT MAX(id) FROM summaries GROUP BY news_id)")
+    # (date_str, rank) unique: bỏ pick trùng hạng, giữ bản ghi sau cùng
+    conn.exec_driver_sql("DELETE FROM picks WHERE id NOT IN (SELECT MAX(id) FROM picks GROUP BY date_str, rank)")
+    # index cũ (không unique) cùng tên → xoá để init_db tạo lại bản unique
+    for _, name, unique, *_ in conn.exec_driver_sql("PRAGMA index_list(summaries)").all():
+        if name == "ix_summaries_news_id" and not unique:
+            conn.exec_driver_sql("DROP INDEX ix_summaries_news_id")
+    # đã có index ghép với cùng cột đầu (ix_news_published_id, ux_picks_date_rank)
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_news_published_at")
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_picks_date_str")
+
+def _m2_source_keyset(conn):
+    # ix_news_source bị thay bởi ix_news_source_published_id (cùng cột đầu)
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_news_source")
+
+def _columns(conn, table):
+    return {r[1] for r in conn.exec_driver_sql(f"PRAGMA table_info({table})")}
+
+# Chỉ mục full-text (FTS5, external content) trên view search_docs = news ⟕ news_content ⟕
+# summaries, rowid = news.id. unicode61 remove_diacritics 2 → "tri tue nhan tao" khớp "trí tuệ
+# nhân tạo". Trigger giữ chỉ mục đồng bộ; lệnh 'delete' của FTS5 phải nhận đúng giá trị đã
+# index. Nội dung bài nén zstd, đọc qua unzstd() (app/content.py).
+_SEARCH_DOC = "(SELECT {c} FROM summaries WHERE news_id = {nid})"
+_CONTENT_DOC = "(SELECT unzstd(body) FROM news_content WHERE news_id = {nid})"
+_SEARCH_TRIGGERS = ("news_ai", "news_ad", "news_au", "content_ai", "content_ad", "content_au",
+                    "summaries_ai", "summaries_ad", "summaries_au")
+
+def _drop_search(conn):
+    for name in _SEARCH_TRIGGERS:
+        conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS search_{name}")
+    conn.exec_driver_sql("DROP VIEW IF EXISTS search_docs")
+
+def _create_search(conn):
+    conn.exec_driver_sql("""
+        CREATE VIEW IF NOT EXISTS search_docs AS
+        SELECT n.id AS id, n.title AS title, unzstd(c.body) AS content_text,
+               s.title_vi AS title_vi, s.bullets_json AS bullets_json
+        FROM news n
+        LEFT JOIN news_content c ON c.news_id = n.id
+        LEFT JOIN summaries s ON s.news_id = n.id
+    """)
+    conn.exec_driver_sql("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5(
+            title, content_text, title_vi, bullets_json,
+            content='search_docs', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+    """)
+    sv = lambda nid: f"{_SEARCH_DOC.format(c='title_vi', nid=nid)}, {_SEARCH_DOC.format(c='bullets_json', nid=nid)}"
+    cv = lambda nid: _CONTENT_DOC.format(nid=nid)
+    ins = "INSERT INTO search_fts(rowid, title, content_text, title_vi, bullets_json)"
+    dele = "INSERT INTO search_fts(search_fts, rowid, title, content_text, title_vi, bullets_json)"
+    triggers = {
+        # bài mới chưa có nội dung (news_content ghi sau, qua content_ai) → INSERT vào news
+        # không cần unzstd(), chèn được từ kết nối sqlite3 thường
+        "news_ai": f"AFTER INSERT ON news BEGIN {ins} VALUES (new.id, new.title, NULL, {sv('new.id')}); END",
+        "news_ad": f"AFTER DELETE ON news BEGIN {dele} VALUES ('delete', old.id, old.title, {cv('old.id')}, {sv('old.id')}); END",
+        "news_au": f"""AFTER UPDATE OF title ON news BEGIN
+            {dele} VALUES ('delete', old.id, old.title, {cv('old.id')}, {sv('old.id')});
+            {ins} VALUES (new.id, new.title, {cv('new.id')}, {sv('new.id')}); END""",
+        "content_ai": f"""AFTER INSERT ON news_content BEGIN
+            {dele} SELECT 'delete', id, title, NULL, {sv('news.id')} FROM news WHERE id = new.news_id;
+            {ins} SELECT id, title, unzstd(new.body), {sv('news.id')} FROM news WHERE id = new.news_id; END""",
+        "content_ad": f"""AFTER DELETE ON news_content BEGIN
+            {dele} SELECT 'delete', id, title, unzstd(old.body), {sv('news.id')} FROM news WHERE id = old.news_id;
+            {ins} SELECT id, title, NULL, {sv('news.id')} FROM news WHERE id = old.news_id; END""",
+        # nén lại bằng từ điển mới không đổi nội dung → không đụng tới chỉ mục
+        "content_au": f"""AFTER UPDATE OF body ON news_content WHEN unzstd(old.body) IS NOT unzstd(new.body) BEGIN
+            {dele} SELECT 'delete', id, title, unzstd(old.body), {sv('news.id')} FROM news WHERE id = old.news_id;
+            {ins} SELECT id, title, unzstd(new.body), {sv('news.id')} FROM news WHERE id = new.news_id; END""",
+        "summaries_ai": f"""AFTER INSERT ON summaries BEGIN
+            {dele} SELECT 'delete', id, title, {cv('news.id')}, NULL, NULL FROM news WHERE id = new.news_id;
+            {ins} SELECT id, title, {cv('news.id')}, new.title_vi, new.bullets_json FROM news WHERE id = new.news_id; END""",
+        "summaries_ad": f"""AFTER DELETE ON summaries BEGIN
+            {dele} SELECT 'delete', id, title, {cv('news.id')}, old.title_vi, old.bullets_json FROM news WHERE id = old.news_id;
+            {ins} SELECT id, title, {cv('news.id')}, NULL, NULL FROM news WHERE id = old.news_id; END""",
+        "summaries_au": f"""AFTER UPDATE OF news_id, title_vi, bullets_json ON summaries BEGIN
+            {dele} SELECT 'delete', id, title, {cv('news.id')}, old.title_vi, old.bullets_json FROM news WHERE id = old.news_id;
+            {ins} SELECT id, title, {cv('news.id')}, NULL, NULL FROM news WHERE id = old.news_id AND old.news_id != new.news_id;
+            {dele} SELECT 'delete', id, title, {cv('news.id')}, NULL, NULL FROM news WHERE id = new.news_id AND old.news_id != new.news_id;
+            {ins} SELECT id, title, {cv('news.id')}, new.title_vi, new.bullets_json FROM news WHERE id = new.news_id; END""",
+    }
+    for name, body in triggers.items():
+        conn.exec_driver_sql(f"CREATE TRIGGER IF NOT EXISTS search_{name} {body}")
+    conn.exec_driver_sql("INSERT INTO search_fts(search_fts) VALUES ('rebuild')")
+
+def _m3_search(conn):
+    _create_search(conn)
+
+def _m4_content_len(conn):
+    if "content_text" in _columns(conn, "news"):
+        conn.exec_driver_sql("UPDATE news SET content_len = length(content_text) WHERE content_text IS NOT NULL")
+
+def _m5_content_store(conn):
+    # news.content_text → news_content (nén zstd); news chỉ còn content_len + content_hash
+    if "content_text" not in _columns(conn, "news"):
+        return
+    _drop_search(conn)  # view / trigger cũ tham chiếu news.content_text
+    last = 0
+    while rows := conn.exec_driver_sql(
+        "SELECT id, content_text FROM news WHERE id > ? AND content_text IS NOT NULL ORDER BY id LIMIT 1000", (last,)
+    ).all():
+        conn.exec_driver_sql("INSERT OR REPLACE INTO news_content (news_id, body) VALUES (?, ?)",
+                             [(i, content.compress(t)) for i, t in rows])
+        conn.exec_driver_sql("UPDATE news SET content_len = ?, content_hash = ? WHERE id = ?",
+                             [(len(t), content.content_hash(t), i) for i, t in rows])
+        last = rows[-1][0]
+    try:
+        conn.exec_driver_sql("ALTER TABLE news DROP COLUMN content_text")
+    except OperationalError:
+        # SQLite < 3.35 chưa có DROP COLUMN: để cột rỗng, VACUUM sẽ thu hồi chỗ
+        conn.exec_driver_sql("UPDATE news SET content_text = NULL")
+    _create_search(conn)
+
+def _m6_topic_cluster(conn):
+    # nhãn nhóm chủ đề của ranker.diversify từng ghi vào topic_tags (ingest không gắn tag nào)
+    # → chuyển sang topic_cluster để không còn được cộng điểm ở lượt xếp hạng sau
+    conn.exec_driver_sql("UPDATE news SET topic_cluster = topic_tags, topic_tags = NULL WHERE topic_tags IS NOT NULL")
+
+def _m7_empty_simhash(conn):
+    # bài không băm được (simhash = 0, dedupe.NO_SIMHASH) từng bị gom chung một cụm
+    # → gỡ band và cluster_id, dedupe_content từ nay bỏ qua các bài này
+    where = "simhash = 0 OR cluster_id IN (SELECT id FROM news WHERE simhash = 0)"
+    conn.exec_driver_sql(f"DELETE FROM content_bands WHERE news_id IN (SELECT id FROM news WHERE {where})")
+    conn.exec_driver_sql(f"UPDATE news SET cluster_id = NULL WHERE {where}")
+
+def _m8_url_slash(conn):
+    # ingest.normalize_url từng giữ slash cuối path khi có query ("/a/?x=1") → bỏ như các URL
+    # khác; URL đã có dạng mới (bài trùng) thì giữ nguyên (OR IGNORE)
+    conn.exec_driver_sql("""
+        UPDATE OR IGNORE news SET url = substr(url, 1, instr(url, '?') - 2) || substr(url, instr(url, '?'))
+        WHERE instr(url, '?') > 0 AND substr(url, instr(url, '?') - 1, 1) = '/'
+    """)
+
+MIGRATIONS = [_m1_unique_links, _m2_source_keyset, _m3_search, _m4_content_len, _m5_content_store, _m6_topic_cluster,
+              _m7_empty_simhash, _m8_url_slash]
+
+def init_db():
+    """Tạo bảng còn thiếu, thêm cột mới, chạy migration rồi tạo index còn thiếu."""
+    from . import models  # noqa: F401 – đăng ký mọi bảng vào Base.metadata
+    Base.metadata.create_all(bind=engine)
+    insp = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            have = {c["name"] for c in insp.get_columns(table.name)}
+            for col in table.columns:
+                if col.name not in have:
+                    conn.exec_driver_sql(
+                        f"ALTER TABLE {table.name} ADD COLUMN {col.name} {col.type.compile(engine.dialect)}"
+                    )
+        version = conn.exec_driver_sql("PRAGMA user_version").scalar()
+        for v, migrate in enumerate(MIGRATIONS, start=1):
+            if version < v:
+                migrate(conn)
+                conn.exec_driver_sql(f"PRAGMA user_version={v}")
+        for table in Base.metadata.sorted_tables:
+            for idx in table.indexes:
+                idx.create(conn, checkfirst=True)
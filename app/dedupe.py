@@ -1,29 +1,184 @@
-from sqlalchemy import select, delete
-from rapidfuzz import fuzz
-from .db import SessionLocal
-from .models import News
+import re
+from collections import Counter, defaultdict
+from sqlalchemy import select, delete, insert, update, func, and_, or_, bindparam
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from rapidfuzz import fuzz, process
+from .config import DEDUPE_BATCH, DEDUPE_MAX_DF, DEDUPE_MAX_CANDIDATES, SIMHASH_MAX_DISTANCE
+from .db import SessionLocal, init_db
+from .models import News, NewsContent, TitleIndex, TitleToken, TitleTerm, ContentBand
+from .utils import simhash, simhash_bands, hamming
+
+# Dedupe tăng dần: mỗi lần chạy chỉ so các bài mới (id > bài cuối đã index) với
+# chỉ mục token đã lưu (title_tokens / title_terms). Cặp ứng viên phải chung ít
+# nhất một token có df <= DEDUPE_MAX_DF; chỉ các cặp đó mới được chấm bằng
+# fuzz.token_set_ratio (rapidfuzz cpdist, đa luồng). Bài giữ lại luôn là bài có
+# id nhỏ hơn, giống bản so cặp O(n²) trước đây.
+
+_TOKEN = re.compile(r"\w+")
+CHUNK = 500
+
+def _tokens(title: str):
+    return {t[:64] for t in _TOKEN.findall((title or "").lower()) if len(t) > 1}
+
+def _chunks(seq, n=CHUNK):
+    seq = list(seq)
+    for i in range(0, len(seq), n):
+        yield seq[i:i + n]
+
+def _top(counter: Counter):
+    return [k for k, _ in counter.most_common(DEDUPE_MAX_CANDIDATES)]
+
+def _dedupe_batch(s, rows, threshold):
+    toks = [_tokens(title) for _, title in rows]
+    vocab = set().union(*toks)
+    df = Counter(t for ts in toks for t in ts)
+    stored = {}
+    for chunk in _chunks(vocab):
+        stored.update(s.execute(select(TitleTerm.token, TitleTerm.df).where(TitleTerm.token.in_(chunk))).all())
+    df.update(stored)
+    blocking = [{t for t in ts if df[t] <= DEDUPE_MAX_DF} for ts in toks]
+
+    # 1) ứng viên trong chỉ mục đã lưu
+    postings = defaultdict(list)
+    for chunk in _chunks({t for ts in blocking for t in ts if t in stored}):
+        q = select(TitleToken.token, TitleToken.news_id).where(TitleToken.token.in_(chunk))
+        for tok, nid in s.execute(q):
+            postings[tok].append(nid)
+    stored_cands = []
+    for ts in blocking:
+        c = Counter()
+        for t in ts:
+            c.update(postings.get(t, ()))
+        stored_cands.append(_top(c))
+    titles = {}
+    for chunk in _chunks({nid for cs in stored_cands for nid in cs}):
+        titles.update(s.execute(select(TitleIndex.news_id, TitleIndex.title).where(TitleIndex.news_id.in_(chunk))).all())
+
+    # 2) gom mọi cặp ứng viên (kể cả trong cùng lô, j < i) rồi chấm một lượt
+    queries, choices, owners = [], [], []
+    local = defaultdict(list)
+    for i, ts in enumerate(blocking):
+        title = rows[i][1]
+        for nid in stored_cands[i]:
+            queries.append(title); choices.append(titles[nid]); owners.append((i, -1))
+        c = Counter()
+        for t in ts:
+            c.update(local[t])
+            local[t].append(i)
+        for j in _top(c):
+            queries.append(title); choices.append(rows[j][1]); owners.append((i, j))
+
+    hits = defaultdict(list)
+    if queries:
+        scores = process.cpdist(queries, choices, scorer=fuzz.token_set_ratio, score_cutoff=threshold, workers=-1)
+        for (i, j), score in zip(owners, scores):
+            if score >= threshold:
+                hits[i].append(j)
+
+    # 3) duyệt theo id tăng dần: bỏ bài nếu trùng một bài cũ hơn còn được giữ
+    dropped = set()
+    for i in range(len(rows)):
+        if any(j == -1 or j not in dropped for j in hits.get(i, ())):
+            dropped.add(i)
+
+    kept = [i for i in range(len(rows)) if i not in dropped]
+    if kept:
+        s.execute(insert(TitleIndex.__table__), [{"news_id": rows[i][0], "title": rows[i][1]} for i in kept])
+        # tiêu đề rỗng / chỉ dấu câu, emoji, token 1 ký tự → không có token; executemany với
+        # list rỗng thành INSERT ... DEFAULT VALUES
+        postings = [{"token": t, "news_id": rows[i][0]} for i in kept for t in toks[i]]
+        if postings:
+            s.execute(insert(TitleToken.__table__), postings)
+        kept_df = Counter(t for i in kept for t in toks[i])
+        if kept_df:
+            stmt = sqlite_insert(TitleTerm)
+            s.execute(
+                stmt.on_conflict_do_update(index_elements=[TitleTerm.token], set_={"df": TitleTerm.df + stmt.excluded.df}),
+                [{"token": t, "df": n} for t, n in kept_df.items()],
+            )
+    for chunk in _chunks(rows[i][0] for i in dropped):
+        s.execute(delete(NewsContent).where(NewsContent.news_id.in_(chunk)))
+        s.execute(delete(News).where(News.id.in_(chunk)))
+    return len(dropped)
 
 def dedupe_titles(threshold=90):
+    init_db()
+    removed = 0
+    with SessionLocal() as s:
+        while True:
+            last = s.scalar(select(func.max(TitleIndex.news_id))) or 0
+            rows = s.execute(
+                select(News.id, News.title).where(News.id > last).order_by(News.id).limit(DEDUPE_BATCH)
+            ).all()
+            if not rows:
+                break
+            removed += _dedupe_batch(s, rows, threshold)
+            s.commit()
+    return removed
+
+# Dedupe nội dung: bài có nội dung gần giống nhau (SimHash lệch <= SIMHASH_MAX_DISTANCE
+# bit) được gom vào cùng cluster; cluster_id = id bài đại diện (bài sớm nhất). Với
+# 4 band × 16 bit, hai hash lệch <= 3 bit chắc chắn trùng ít nhất một band, nên mỗi bài
+# mới chỉ cần tra các band của nó trong content_bands.
+# Bài không có chữ nào để băm được ghi NO_SIMHASH (khác NULL = chưa tính) và không được
+# gom cụm hay ghi band: các bài rỗng không phải bản trùng của nhau.
+NO_SIMHASH = 0
+
+def _backfill_simhash(s):
+    while True:
+        rows = s.execute(
+            select(News.id, func.unzstd(NewsContent.body))
+            .join(NewsContent, NewsContent.news_id == News.id)
+            .where(News.simhash.is_(None))
+            .limit(DEDUPE_BATCH)
+        ).all()
+        if not rows:
+            return
+        s.execute(update(News.__table__).where(News.id == bindparam("_id")).values(simhash=bindparam("_h")),
+                  [{"_id": i, "_h": simhash(t) or NO_SIMHASH} for i, t in rows])
+        s.commit()
+
+def _cluster_of(s, h, max_distance):
+    bands = simhash_bands(h)
+    q = (
+        select(News.id, News.simhash, News.cluster_id)
+        .join(ContentBand, ContentBand.news_id == News.id)
+        .where(or_(*(and_(ContentBand.band == i, ContentBand.value == v) for i, v in enumerate(bands))))
+    )
+    best = None
+    for nid, other, cluster in s.execute(q):
+        d = hamming(h, other)
+        if d <= max_distance and (best is None or (d, cluster) < best):
+            best = (d, cluster)
+    return best[1] if best else None, bands
+
+def dedupe_content(max_distance=SIMHASH_MAX_DISTANCE):
+    init_db()
+    clustered = 0
     with SessionLocal() as s:
-        items = s.execute(select(News)).scalars().all()
-        to_delete = set()
-        for i in range(len(items)):
-            if items[i].id in to_delete: 
-                continue
-            for j in range(i+1, len(items)):
-                if items[j].id in to_delete:
-                    continue
-                score = fuzz.token_set_ratio(items[i].title, items[j].title)
-                if score >= threshold:
-                    # keep earlier published (lower id)
-                    keep = items[i] if items[i].id < items[j].id else items[j]
-                    drop = items[j] if keep is items[i] else items[i]
-                    to_delete.add(drop.id)
-        if to_delete:
-            s.execute(delete(News).where(News.id.in_(list(to_delete))))
+        _backfill_simhash(s)
+        while True:
+            rows = s.execute(
+                select(News.id, News.simhash)
+                .where(News.simhash.is_not(None), News.simhash != NO_SIMHASH, News.cluster_id.is_(None))
+                .order_by(News.id)
+                .limit(DEDUPE_BATCH)
+            ).all()
+            if not rows:
+                break
+            for nid, h in rows:
+                cluster, bands = _cluster_of(s, h, max_distance)
+                if cluster is None:
+                    cluster = nid
+                else:
+                    clustered += 1
+                s.execute(update(News.__table__).where(News.id == nid).values(cluster_id=cluster))
+                s.execute(insert(ContentBand.__table__), [{"band": i, "value": v, "news_id": nid} for i, v in enumerate(bands)])
             s.commit()
-        return len(to_delete)
+    return clustered
 
 if __name__ == "__main__":
     n = dedupe_titles()
     print(f"Removed {n} duplicates")
+    n = dedupe_content()
+    print(f"Clustered {n} near-duplicate articles")
@@ -0,0 +1,121 @@
+import os, re, zlib
+import numpy as np
+from sqlalchemy import select, update, func, or_, bindparam
+from .config import EMBED_PATH, EMBED_DIM, DEDUPE_BATCH
+from .db import SessionLocal, init_db
+from .models import News, NewsContent
+
+# Embedding offline cho bài viết: hashing vectorizer trên unigram (không cần mạng hay
+# model; bigram làm loãng độ giống giữa các bài viết cùng một sự kiện), lưu float16 trong một file memmap, dòng thứ i = vector của news.id = i.
+# Vector đã chuẩn hoá L2 nên cosine = tích vô hướng. Đổi cách vector hoá → tăng
+# EMBED_VERSION để embed_missing() tính lại.
+
+EMBED_VERSION = 1
+CONTENT_CHARS = 2000
+_TOKEN = re.compile(r"\w+")
+STOPWORDS = frozenset("""
+ai a an and are as at be been but by can could did do does for from had has have he her his how i if in
+into is it its just may more most new not of on or our out over said say says she so than that the
+their them then there these they this those to up us was we were what when which while who will
+with would you your also about after all any because before being both each few further here
+only other same some such through under very via it's và của là có cho được với các những một
+trong khi đã này để người từ không theo về như trên sẽ cũng tại đến
+""".split())
+
+def text_features(text: str):
+    return [t for t in _TOKEN.findall(text.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+def embed_text(title: str, content: str | None, dim: int = EMBED_DIM) -> np.ndarray:
+    counts: dict[int, float] = {}
+    # tiêu đề đếm 2 lần
+    for f in text_features(f"{title} {title} {(content or '')[:CONTENT_CHARS]}"):
+        h = zlib.crc32(f.encode())
+        counts[h] = counts.get(h, 0.0) + 1.0
+    v = np.zeros(dim, dtype=np.float32)
+    if counts:
+        hs = np.fromiter(counts, dtype=np.uint64, count=len(counts))
+        tf = 1.0 + np.log(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+        sign = np.where((hs >> np.uint64(31)) & np.uint64(1), -1.0, 1.0).astype(np.float32)
+        np.add.at(v, (hs % np.uint64(dim)).astype(np.intp), sign * tf)
+        n = np.linalg.norm(v)
+        if n > 0:
+            v /= n
+    return v
+
+class VectorStore:
+    """Mảng (capacity, dim) float16 trên đĩa, truy cập theo news.id; tự nới khi id vượt capacity."""
+
+    def __init__(self, path: str = EMBED_PATH, dim: int = EMBED_DIM):
+        self.path, self.dim = path, dim
+        self._mm = None
+
+    @property
+    def _row_bytes(self):
+        return self.dim * np.dtype(np.float16).itemsize
+
+    def _rows(self):
+        return os.path.getsize(self.path) // self._row_bytes if os.path.exists(self.path) else 0
+
+    def _map(self, min_rows=0):
+        rows = self._rows()
+        if rows < min_rows:
+            rows = max(min_rows, rows * 2, 1024)
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "ab") as f:
+                f.truncate(rows * self._row_bytes)  # sparse: phần mới toàn 0
+            self._mm = None
+        if self._mm is None or len(self._mm) != rows:
+            self._mm = np.memmap(self.path, dtype=np.float16, mode="r+", shape=(rows, self.dim)) if rows else None
+        return self._mm
+
+    def put(self, ids, vecs):
+        ids = np.asarray(ids, dtype=np.intp)
+        mm = self._map(int(ids.max()) + 1)
+        mm[ids] = np.asarray(vecs, dtype=np.float16)
+        mm.flush()
+
+    def get(self, ids) -> np.ndarray:
+        """Vector float32 (len(ids), dim); id chưa có vector → hàng 0."""
+        ids = np.asarray(ids, dtype=np.intp)
+        out = np.zeros((len(ids), self.dim), dtype=np.float32)
+        mm = self._map()
+        if mm is not None and len(ids):
+            ok = ids < len(mm)
+            out[ok] = mm[ids[ok]]
+        return out
+
+def cosine_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Cosine theo lô giữa các hàng của a và b (vector đã chuẩn hoá → a @ b.T)."""
+    return a @ b.T
+
+def embed_missing(store: VectorStore | None = None) -> int:
+    """Tính vector cho các bài đã có nội dung nhưng chưa có vector EMBED_VERSION hiện tại."""
+    init_db()
+    store = store or VectorStore()
+    n = 0
+    with SessionLocal() as s:
+        last = 0
+        while True:
+            rows = s.execute(
+                select(News.id, News.title, func.unzstd(NewsContent.body).label("content_text"))
+                .outerjoin(NewsContent, NewsContent.news_id == News.id)
+                .where(
+                    News.id > last, News.content_len.is_not(None),
+                    or_(News.embed_version.is_(None), News.embed_version != EMBED_VERSION),
+                )
+                .order_by(News.id)
+                .limit(DEDUPE_BATCH)
+            ).all()
+            if not rows:
+                break
+            store.put([r.id for r in rows], np.stack([embed_text(r.title, r.content_text) for r in rows]))
+            s.execute(
+                update(News.__table__).where(News.id == bindparam("_id")).values(embed_version=EMBED_VERSION),
+                [{"_id": r.id} for r in rows],
+            )
+            s.commit()
+            last, n = rows[-1].id, n + len(rows)
+    return n
+
+if __name__ == "__main__":
+    print(f"Embedded {embed_missing()} articles")
@@ -1,27 +1,147 @@
-import trafilatura, httpx, asyncio
-from sqlalchemy import select
+import trafilatura, httpx, asyncio, time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from sqlalchemy import select, update, bindparam
+from sqlalchemy.dialects.sqlite import insert
+from .config import (
+    EXTRACT_CONCURRENCY, EXTRACT_PER_DOMAIN, EXTRACT_WORKERS, EXTRACT_BATCH, EXTRACT_TIMEOUT,
+)
 from .db import SessionLocal
-from .models import News
+from .models import News, NewsContent
+from .content import compress, content_hash
+from .utils import og_image_from_html, simhash, HostLimiter
+from . import metrics
 
-async def fetch_and_extract(session, url):
+PAGE_SIZE = 1000
+MIN_TEXT_LEN = 200  # nội dung ngắn hơn coi như extract thất bại (trang lỗi, paywall ...)
+
+def parse_html(html: str, url: str):
+    """Phần tốn CPU, chạy trong process pool: trafilatura + og:image + SimHash."""
+    text = trafilatura.extract(html, include_comments=False, include_tables=False)
+    # og:image lấy luôn từ HTML vừa tải, không fetch lại trang
+    return text, og_image_from_html(html, url), simhash(text) if text else None
+
+async def fetch_and_extract(session, url, limiter=None, pool=None):
     try:
-        resp = await session.get(url, timeout=20)
+        async with limiter.slot(url) if limiter is not None else nullcontext():
+            with metrics.timer("http_fetch_seconds", kind="page"):
+                resp = await session.get(url, timeout=EXTRACT_TIMEOUT)
+        metrics.inc("http_fetch_total", kind="page", status=resp.status_code)
+        metrics.inc("http_fetch_bytes_total", len(resp.content), kind="page")
         resp.raise_for_status()
-        return trafilatura.extract(resp.text, include_comments=False, include_tables=False)
-    except Exception:
-        return None
+        html, final_url = resp.text, str(resp.url)
+    except httpx.HTTPError as e:
+        if not isinstance(e, httpx.HTTPStatusError):
+            metrics.inc("http_fetch_total", kind="page", status="error")
+        return None, None, None
+    except Exception as e:
+        # URL hỏng (httpx.InvalidURL: ký tự điều khiển ...) không phải HTTPError: lỗi của một
+        # bài không được làm hỏng cả stage extract (và mọi lượt resume sau đó)
+        metrics.inc("http_fetch_total", kind="page", status="error")
+        print(f"[extract] fetch failed {url!r} → {e.__class__.__name__}: {e}")
+        return None, None, None
+    loop = asyncio.get_running_loop()
+    try:
+        # gồm cả thời gian chờ process rảnh trong pool
+        with metrics.timer("extract_parse_seconds"):
+            return await loop.run_in_executor(pool, parse_html, html, final_url)
+    except Exception as e:
+        print(f"[extract] parse failed {url} → {e.__class__.__name__}")
+        return None, None, None
+
+def pending_rows(s, after_id, ids=None):
+    q = (
+        select(News.id, News.url, News.og_image.is_(None))
+        .where(News.content_len.is_(None), News.id > after_id)
+        .order_by(News.id)
+        .limit(PAGE_SIZE)
+    )
+    return s.execute(q if ids is None else q.where(News.id.in_(ids))).all()
+
+def write_batch(s, texts, images):
+    if texts:
+        stmt = insert(NewsContent)
+        s.execute(
+            stmt.on_conflict_do_update(index_elements=[NewsContent.news_id], set_={"body": stmt.excluded.body}),
+            [{"news_id": t["_id"], "body": compress(t["_text"])} for t in texts],
+        )
+        s.execute(
+            update(News.__table__)
+            .where(News.id == bindparam("_id"))
+            .values(content_len=bindparam("_len"), content_hash=bindparam("_hash"), simhash=bindparam("_simhash")),
+            [{**t, "_hash": content_hash(t["_text"])} for t in texts],
+        )
+    if images:
+        s.execute(
+            update(News.__table__)
+            .where(News.id == bindparam("_id"), News.og_image.is_(None))
+            .values(og_image=bindparam("_img")),
+            images,
+        )
+    s.commit()
+
+async def extract_missing_text(ids=None, pool=None):
+    """Tải + trích nội dung cho mọi bài chưa có nội dung (content_len NULL).
 
-async def extract_missing_text():
+    ids: chỉ xét các bài này (job extract của app.jobs); pool: process pool parse dùng lại,
+    mặc định mở pool EXTRACT_WORKERS process cho lần gọi này.
+    Mỗi bài một task, tối đa PAGE_SIZE bài đang chờ / đang tải (backpressure); HostLimiter
+    giới hạn EXTRACT_CONCURRENCY / EXTRACT_PER_DOMAIN nên bài của host đang đầy không chặn
+    host khác (ingest ghi bài theo từng feed → các bài liền id thường cùng host). Parse
+    trong process pool, commit theo lô EXTRACT_BATCH nên crash giữa chừng không mất phần đã xong.
+    """
     cnt = 0
-    async with httpx.AsyncClient() as client:
-        with SessionLocal() as s:
-            q = s.execute(select(News).where(News.content_text.is_(None))).scalars().all()
-            for n in q:
-                content = await fetch_and_extract(client, n.url)
-                if content and len(content) > 200:
-                    n.content_text = content
-                    s.add(n); cnt += 1
-            s.commit()
+    texts, images = [], []
+    inflight = asyncio.Semaphore(PAGE_SIZE)
+    tasks, failed = set(), []
+    limiter = HostLimiter(EXTRACT_CONCURRENCY, EXTRACT_PER_DOMAIN)
+    limits = httpx.Limits(
+        max_connections=EXTRACT_CONCURRENCY,
+        max_keepalive_connections=EXTRACT_CONCURRENCY,
+        keepalive_expiry=30,
+    )
+    t0 = time.perf_counter()
+
+    own_pool = ProcessPoolExecutor(max_workers=EXTRACT_WORKERS or None) if pool is None else nullcontext(pool)
+    with SessionLocal() as s, own_pool as pool:
+        async with httpx.AsyncClient(http2=True, limits=limits, follow_redirects=True) as client:
+
+            async def one(news_id, url, need_image):
+                nonlocal cnt
+                try:
+                    content, og_image, fingerprint = await fetch_and_extract(client, url, limiter, pool)
+                    if og_image and need_image:
+                        images.append({"_id": news_id, "_img": og_image})
+                    if content and len(content) > MIN_TEXT_LEN:
+                        texts.append({"_id": news_id, "_text": content, "_len": len(content), "_simhash": fingerprint})
+                        cnt += 1
+                    if len(texts) + len(images) >= EXTRACT_BATCH:
+                        write_batch(s, texts, images)
+                        texts.clear(); images.clear()
+                finally:
+                    inflight.release()
+
+            def done(t):
+                tasks.discard(t)
+                if not t.cancelled() and t.exception() is not None:
+                    failed.append(t.exception())
+
+            last_id, total = 0, 0
+            while not failed and (rows := pending_rows(s, last_id, ids)):
+                for row in rows:
+                    await inflight.acquire()
+                    t = asyncio.create_task(one(*row))
+                    tasks.add(t)
+                    t.add_done_callback(done)
+                last_id = rows[-1][0]
+                total += len(rows)
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if failed:
+                raise failed[0]
+
+        write_batch(s, texts, images)
+
+    print(f"[extract] {cnt}/{total} extracted in {time.perf_counter() - t0:.2f}s")
     return cnt
 
 if __name__ == "__main__":
@@ -1,13 +1,16 @@
 # app/ingest.py
-import feedparser, yaml, os, re
+import asyncio, feedparser, httpx, yaml, os, re, time
 from datetime import datetime, timezone
+from urllib.parse import urlsplit, urlunsplit
 from dateutil import parser as dateparser
 from sqlalchemy import select
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.sqlite import insert
 
-from .db import engine, SessionLocal, Base
-from .models import News
-from .utils import get_og_image
+from .config import FEED_CONCURRENCY, FEED_PER_HOST, FEED_TIMEOUT
+from .db import SessionLocal, init_db
+from .models import News, FeedState
+from .utils import HostLimiter
+from . import metrics
 
 ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 SOURCES = os.path.join(os.path.dirname(__file__), "sources.yaml")
@@ -23,86 +26,190 @@ KEYWORDS = [
     "anthropic","openai","deepmind","meta ai","google ai","microsoft"
 ]
 
+# một regex cho cả danh sách: quét tiêu đề một lần thay vì một lần mỗi từ khoá
+# (vẫn khớp chuỗi con như trước, không theo ranh giới từ)
+KEYWORDS_RE = re.compile("|".join(re.escape(k) for k in KEYWORDS))
+
 def is_relevant(title: str):
-    t = title.lower()
-    return any(k in t for k in KEYWORDS)
+    return KEYWORDS_RE.search(title.lower()) is not None
+
+# topic_tags gắn lúc ingest từ tiêu đề: tag → từ khoá (đầu từ, khớp cả số nhiều "agents" ...);
+# tag trùng tên với ranker.TOPIC_WEIGHT thì được cộng điểm
+TOPIC_KEYWORDS = {
+    "llm": ["llm", "large language model", "language model", "gpt", "chatbot", "claude", "gemini", "llama"],
+    "agent": ["agent", "agentic"],
+    "research": ["research", "paper", "arxiv", "study", "benchmark", "dataset"],
+    "open-source": ["open source", "open-source", "open weight", "open-weight", "hugging face"],
+    "multimodal": ["multimodal", "vision", "image", "video", "speech", "audio", "diffusion"],
+    "policy": ["policy", "regulation", "regulator", "law", "copyright", "ai act", "lawsuit", "safety"],
+    "hardware": ["gpu", "chip", "tpu", "nvidia", "semiconductor", "data center", "datacenter"],
+}
+_TOPIC_OF = {kw: tag for tag, kws in TOPIC_KEYWORDS.items() for kw in kws}
+TOPIC_RE = re.compile(r"\b(" + "|".join(re.escape(k) for k in sorted(_TOPIC_OF, key=len, reverse=True)) + ")")
+
+def topic_tags(title: str):
+    """Các tag chủ đề của tiêu đề, nối bằng dấu phẩy (None nếu không có)."""
+    tags = sorted({_TOPIC_OF[m] for m in TOPIC_RE.findall(title.lower())})
+    return ",".join(tags) or None
+
+# tham số query chỉ để theo dõi click, bỏ khi chuẩn hoá
+TRACKING_PARAMS = re.compile(r"^(utm_\w*|fbclid|gclid|mc_cid|mc_eid|ref_src)$", re.I)
+INSERT_CHUNK = 1000  # số bài mỗi lệnh INSERT ... ON CONFLICT DO NOTHING
 
 def normalize_url(url: str) -> str:
-    # chuẩn hoá query: bỏ utm_*
-    url = re.sub(r"[?&](utm_[^=]+=[^&]+)", "", url)
-    # hợp nhất domain arXiv
-    url = url.replace("export.arxiv.org", "arxiv.org")
-    # bỏ slash cuối
-    if url.endswith("/"):
-        url = url[:-1]
-    return url
+    """Dạng chuẩn của URL, là khoá chống trùng (news.url unique).
+
+    scheme/host viết thường, bỏ port mặc định, bỏ #fragment và tham số theo dõi (utm_* ...),
+    bỏ ?/& thừa, hợp nhất domain arXiv, bỏ slash cuối path (có query hay không). Path và các
+    tham số khác giữ nguyên. URL hỏng (vd. host "exa]mple.com") → ValueError từ urlsplit.
+    """
+    parts = urlsplit(url.strip())
+    scheme, host = parts.scheme.lower(), parts.netloc.lower()
+    default_port = {"http": ":80", "https": ":443"}.get(scheme)
+    if default_port and host.endswith(default_port):
+        host = host[:-len(default_port)]
+    if host == "export.arxiv.org":
+        host = "arxiv.org"
+    query = "&".join(
+        q for q in parts.query.split("&")
+        if q and not TRACKING_PARAMS.match(q.split("=", 1)[0])
+    )
+    return urlunsplit((scheme, host, parts.path.rstrip("/"), query, ""))
+
+async def fetch_feed(client, limiter, f, st, stats):
+    """Tải một feed, gửi If-None-Match/If-Modified-Since từ lần trước (st: FeedState | None)."""
+    headers = {}
+    if st is not None:
+        if st.etag:
+            headers["If-None-Match"] = st.etag
+        if st.last_modified:
+            headers["If-Modified-Since"] = st.last_modified
+    try:
+        async with limiter.slot(f["url"]):
+            with metrics.timer("http_fetch_seconds", kind="feed"):
+                resp = await client.get(f["url"], headers=headers)
+        metrics.inc("http_fetch_total", kind="feed", status=resp.status_code)
+        metrics.inc("http_fetch_bytes_total", len(resp.content), kind="feed")
+        if resp.status_code == 304:
+            stats["not_modified"] += 1
+        else:
+            resp.raise_for_status()
+            stats["fetched"] += 1
+        return resp
+    except httpx.HTTPError as e:
+        stats["errors"] += 1
+        if not isinstance(e, httpx.HTTPStatusError):
+            metrics.inc("http_fetch_total", kind="feed", status="error")
+        print(f"[ingest] {f['url']} → {e.__class__.__name__}")
+        return None
+
+def new_stats(feeds):
+    return {"feeds": len(feeds), "fetched": 0, "not_modified": 0, "errors": 0, "fetch_s": 0.0,
+            "parsed": 0, "entries": 0, "bad_links": 0, "parse_s": 0.0}
+
+async def fetch_feeds(feeds, states):
+    """Tải song song các feed.
+
+    Trả về list (feed, response | None) theo đúng thứ tự `feeds` và dict thống kê.
+    """
+    stats = new_stats(feeds)
+    limiter = HostLimiter(FEED_CONCURRENCY, FEED_PER_HOST)
+
+    async def one(client, f):
+        return f, await fetch_feed(client, limiter, f, states.get(f["url"]), stats)
+
+    t0 = time.perf_counter()
+    async with httpx.AsyncClient(timeout=FEED_TIMEOUT, follow_redirects=True) as client:
+        results = await asyncio.gather(*(one(client, f) for f in feeds))
+    stats["fetch_s"] = time.perf_counter() - t0
+    return results, stats
+
+def insert_news(s, rows) -> list[int]:
+    """Ghi lô bài mới: INSERT ... ON CONFLICT(url) DO NOTHING.
+
+    Unique index trên news.url lo việc chống trùng (cả với bài đã có trong DB lẫn trùng
+    trong cùng lô), không cần nạp trước mọi URL. Trả về id các bài thực sự được thêm.
+    """
+    if not rows:
+        return []
+    stmt = insert(News).on_conflict_do_nothing(index_elements=[News.url]).returning(News.id)
+    return list(s.execute(stmt, rows).scalars())
+
+def store_feed(s, f, resp, states, stats):
+    """Cập nhật FeedState, parse feed và ghi các bài mới (chưa commit).
+
+    Bài được ghi theo lô INSERT_CHUNK nên bộ nhớ không tăng theo số entry.
+    Trả về list id các bài vừa thêm.
+    """
+    st = states.get(f["url"]) or FeedState(url=f["url"])
+    states[f["url"]] = st
+    st.checked_at = datetime.utcnow()
+    s.add(st)
+    if resp.status_code == 304:
+        # feed không đổi → bỏ qua parse
+        return []
+    st.etag = resp.headers.get("etag")
+    st.last_modified = resp.headers.get("last-modified")
+
+    t0 = time.perf_counter()
+    d = feedparser.parse(resp.content, response_headers=dict(resp.headers))
+    stats["parse_s"] += time.perf_counter() - t0
+    stats["parsed"] += 1
+    stats["entries"] += len(d.entries)
+    source = f.get("name", d.feed.get("title", "unknown"))
+
+    added, rows = [], []
+    for e in d.entries:
+        title = (e.get("title") or "").strip()
+        link = (e.get("link") or "").strip()
+        if not title or not link:
+            continue
+        if not is_relevant(title):
+            continue
+
+        # published
+        published = e.get("published") or e.get("updated") or ""
+        try:
+            published_at = dateparser.parse(published)
+        except Exception:
+            published_at = datetime.now(timezone.utc)
+
+        try:
+            url = normalize_url(link)
+        except ValueError as ex:
+            # một link hỏng không được làm hỏng cả lượt ingest
+            stats["bad_links"] += 1
+            print(f"[ingest] {source}: skip bad link {link[:200]!r} ({ex})")
+            continue
+        rows.append({"url": url, "title": title, "source": source, "published_at": published_at,
+                     "topic_tags": topic_tags(title)})
+        if len(rows) >= INSERT_CHUNK:
+            added += insert_news(s, rows)
+            rows = []
+    added += insert_news(s, rows)
+    return added
+
+def print_stats(stats):
+    print(
+        f"[ingest] feeds={stats['feeds']} fetched={stats['fetched']} 304={stats['not_modified']} "
+        f"errors={stats['errors']} parsed={stats['parsed']} entries={stats['entries']} bad_links={stats['bad_links']} "
+        f"fetch={stats['fetch_s']:.2f}s parse={stats['parse_s']:.2f}s"
+    )
 
 def ingest_once():
-    Base.metadata.create_all(bind=engine)
+    init_db()
     feeds = load_sources()
     added = 0
 
     with SessionLocal() as s:
-        # 1) Tải sẵn các URL đã có trong DB
-        existing = set(u for (u,) in s.execute(select(News.url)).all())
-        # 2) Bộ nhớ tạm cho URL được thêm trong phiên này (chưa commit)
-        seen = set()
-
-        for f in feeds:
-            d = feedparser.parse(f["url"])
-            for e in d.entries:
-                title = (e.get("title") or "").strip()
-                link = (e.get("link") or "").strip()
-                if not title or not link:
-                    continue
-                if not is_relevant(title):
-                    continue
-
-                url = normalize_url(link)
-
-                # 3) Chặn trùng trước khi add
-                if url in existing or url in seen:
-                    continue
-
-                # published
-                published = e.get("published") or e.get("updated") or ""
-                try:
-                    published_at = dateparser.parse(published)
-                except Exception:
-                    published_at = datetime.now(timezone.utc)
-
-                source = f.get("name", d.feed.get("title", "unknown"))
-                og_image = get_og_image(url)
-
-                news = News(
-                    url=url, title=title, source=source,
-                    published_at=published_at,
-                    og_image=og_image, lang=None, content_text=None
-                )
-                s.add(news)
-                # đánh dấu vào bộ nhớ tạm
-                seen.add(url)
-
-        # 4) Commit an toàn – nếu lỡ vẫn trùng (do DB đã có mà existing chưa bắt được), rollback từng mục
-        try:
-            s.commit()
-            added = len(seen)
-        except IntegrityError:
-            s.rollback()
-            # Commit lại từng bản ghi để bỏ qua cái lỗi
-            for url in list(seen):
-                try:
-                    # nếu đã tồn tại thì bỏ
-                    if s.execute(select(News).where(News.url == url)).scalar_one_or_none():
-                        seen.remove(url)
-                        continue
-                    # không có thì add lại (trường hợp rollback đã xoá pending)
-                    # (ở đây đơn giản bỏ qua việc add lại chi tiết; thực tế hiếm gặp)
-                except Exception:
-                    pass
-            # commit cuối (không thêm gì mới nữa)
-            s.commit()
-
+        states = {st.url: st for st in s.execute(select(FeedState)).scalars()}
+        results, stats = asyncio.run(fetch_feeds(feeds, states))
+        for f, resp in results:
+            if resp is not None:
+                added += len(store_feed(s, f, resp, states, stats))
+        s.commit()
+
+    print_stats(stats)
     return added
 
 if __name__ == "__main__":
@@ -0,0 +1,263 @@
+import asyncio, json, os, socket, subprocess, sys, threading, time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, delete, func, or_, and_, bindparam
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from .config import (
+    JOB_LEASE_S, JOB_MAX_ATTEMPTS, JOB_MIN_ITEMS, PIPELINE_WORKERS, EXTRACT_WORKERS, EXTRACT_CONCURRENCY, SUMMARY_CONCURRENCY,
+)
+from .db import SessionLocal
+from .models import Job, Lock
+from . import metrics
+
+# Job queue trên SQLite cho các stage chia được thành từng bài: extract (một job / bài) và
+# summarize (một job / pick của lượt chạy). Nhiều process worker cùng DB:
+#   - claim: một câu UPDATE ... WHERE id IN (SELECT ... LIMIT n) RETURNING — SQLite chỉ có
+#     một writer nên hai worker không bao giờ nhận cùng một job;
+#   - worker gia hạn lease_until (heartbeat) trong lúc chạy; worker chết thì sau JOB_LEASE_S
+#     job được worker khác nhận lại;
+#   - job lỗi được xếp lại với backoff, quá JOB_MAX_ATTEMPTS lần thì thành failed.
+# Handler phải idempotent (job có thể chạy lại sau khi lease hết hạn): extract ghi đè nội
+# dung, summarize bỏ qua pick đã có summary.
+# Worker dùng chung file DB nên phải chạy cùng máy với DB (WAL không dùng được qua NFS).
+# Chi phí: claim / finish theo lô CLAIM_BATCH job mỗi câu lệnh, nhưng mỗi process worker
+# tốn ~0.5s khởi động → chỉ đáng khi stage đủ lớn (JOB_MIN_ITEMS) và việc mỗi job đủ nặng
+# (tải + parse trang, gọi LLM); xem kịch bản jobs của bench/run.py.
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+POLL_S = 0.5
+RETRY_S = 5  # backoff: 5s, 20s, 80s ...
+# số job mỗi lần claim: extract đủ lấp EXTRACT_CONCURRENCY kết nối, summarize một lô LLM
+CLAIM_BATCH = {"extract": EXTRACT_CONCURRENCY * 2, "summarize": SUMMARY_CONCURRENCY}
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def enqueue(kind: str, items: dict) -> int:
+    """Thêm job {key: payload}. Job cùng key đã done / failed được xếp lại từ đầu, job đang
+    chờ hoặc đang chạy giữ nguyên."""
+    now = datetime.utcnow()
+    rows = [{"kind": kind, "key": str(k), "payload": json.dumps(p), "status": "queued", "attempts": 0,
+             "run_after": now, "updated_at": now} for k, p in items.items()]
+    stmt = sqlite_insert(Job)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Job.kind, Job.key],
+        set_={"payload": stmt.excluded.payload, "status": "queued", "attempts": 0, "run_after": now,
+              "error": None, "updated_at": now},
+        where=or_(Job.status == "done", Job.status == "failed"),  # IN (...) không dùng được với executemany
+    )
+    with SessionLocal() as s:
+        for i in range(0, len(rows), 1000):
+            s.execute(stmt, rows[i:i + 1000])
+        s.commit()
+    return len(rows)
+
+def claim(kind: str, n: int, worker: str = WORKER_ID) -> list:
+    """Nhận tối đa n job sẵn sàng (kể cả job có lease đã hết hạn), trả về [(id, payload)]."""
+    now = datetime.utcnow()
+    ready = or_(
+        and_(Job.status == "queued", Job.run_after <= now),
+        and_(Job.status == "running", Job.lease_until < now, Job.attempts < JOB_MAX_ATTEMPTS),
+    )
+    pick = select(Job.id).where(Job.kind == kind, ready).order_by(Job.id).limit(n)
+    with SessionLocal() as s:
+        rows = s.execute(
+            update(Job.__table__).where(Job.id.in_(pick))
+            .values(status="running", worker=worker, attempts=Job.attempts + 1,
+                    lease_until=now + timedelta(seconds=JOB_LEASE_S), updated_at=now)
+            .returning(Job.id, Job.payload)
+        ).all()
+        s.commit()
+    return [(i, json.loads(p)) for i, p in rows]
+
+def heartbeat(ids, worker: str = WORKER_ID):
+    now = datetime.utcnow()
+    with SessionLocal() as s:
+        s.execute(
+            update(Job.__table__).where(Job.id.in_(ids), Job.worker == worker, Job.status == "running")
+            .values(lease_until=now + timedelta(seconds=JOB_LEASE_S), updated_at=now)
+        )
+        s.commit()
+
+def finish(kind: str, ids, worker: str = WORKER_ID):
+    with SessionLocal() as s:
+        s.execute(
+            update(Job.__table__).where(Job.id.in_(ids), Job.worker == worker, Job.status == "running")
+            .values(status="done", lease_until=None, error=None, updated_at=datetime.utcnow())
+        )
+        s.commit()
+    metrics.inc("jobs_total", len(ids), kind=kind, status="done")
+
+def fail(kind: str, ids, error: str, worker: str = WORKER_ID):
+    now = datetime.utcnow()
+    with SessionLocal() as s:
+        rows = s.execute(
+            select(Job.id, Job.attempts).where(Job.id.in_(ids), Job.worker == worker, Job.status == "running")
+        ).all()
+        if rows:
+            s.execute(
+                update(Job.__table__).where(Job.id == bindparam("_id"))
+                .values(status=bindparam("_status"), run_after=bindparam("_after"), lease_until=None,
+                        error=error[:500], updated_at=now),
+                [{"_id": i, "_status": "failed" if a >= JOB_MAX_ATTEMPTS else "queued",
+                  "_after": now + timedelta(seconds=RETRY_S * 4 ** (a - 1))} for i, a in rows],
+            )
+        s.commit()
+    for _, a in rows:
+        metrics.inc("jobs_total", kind=kind, status="failed" if a >= JOB_MAX_ATTEMPTS else "retry")
+
+def pending(kinds) -> int:
+    """Số job của `kinds` còn chờ / đang chạy; job hết lease đã quá số lần thử thành failed."""
+    now = datetime.utcnow()
+    with SessionLocal() as s:
+        s.execute(
+            update(Job.__table__)
+            .where(Job.kind.in_(kinds), Job.status == "running", Job.lease_until < now,
+                   Job.attempts >= JOB_MAX_ATTEMPTS)
+            .values(status="failed", error="lease expired", lease_until=None, updated_at=now)
+        )
+        s.commit()
+        return s.scalar(select(func.count()).where(Job.kind.in_(kinds), Job.status.in_(("queued", "running"))))
+
+@contextmanager
+def _keepalive(renew, interval):
+    # gọi renew() mỗi `interval` giây trong thread riêng cho tới khi ra khỏi khối with
+    stop = threading.Event()
+
+    def loop():
+        while not stop.wait(interval):
+            try:
+                renew()
+            except Exception as e:
+                print(f"[jobs] heartbeat failed: {e!r}")
+
+    t = threading.Thread(target=loop, daemon=True)
+    t.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        t.join()
+
+@contextmanager
+def lock(name: str, owner: str = WORKER_ID, ttl: float = JOB_LEASE_S):
+    """Khoá `name` giữa các process: yield True nếu giữ được, False nếu process khác đang giữ.
+
+    Lease được gia hạn trong lúc giữ; process chết thì khoá tự hết hạn sau ttl giây.
+    """
+    def acquire():
+        now = datetime.utcnow()
+        stmt = sqlite_insert(Lock).values(name=name, owner=owner, expires_at=now + timedelta(seconds=ttl))
+        with SessionLocal() as s:
+            got = s.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[Lock.name],
+                    set_={"owner": stmt.excluded.owner, "expires_at": stmt.excluded.expires_at},
+                    where=or_(Lock.expires_at < now, Lock.owner == owner),
+                ).returning(Lock.owner)
+            ).first()
+            s.commit()
+        return got is not None
+
+    if not acquire():
+        yield False
+        return
+    try:
+        with _keepalive(acquire, ttl / 3):
+            yield True
+    finally:
+        with SessionLocal() as s:
+            s.execute(delete(Lock).where(Lock.name == name, Lock.owner == owner))
+            s.commit()
+
+# ---- handler: nhận list payload của các job vừa claim ----
+
+_pool = None
+
+def _parse_pool():
+    # process pool trafilatura của worker, giữ qua các lô; PIPELINE_WORKERS worker chia nhau số CPU
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=EXTRACT_WORKERS or max(1, (os.cpu_count() or 1) // max(1, PIPELINE_WORKERS)))
+    return _pool
+
+def _do_extract(payloads):
+    from .extract import extract_missing_text
+    asyncio.run(extract_missing_text(ids=[p["news_id"] for p in payloads], pool=_parse_pool()))
+
+def _do_summarize(payloads):
+    from .pipeline import summarize_staged
+    runs: dict = {}
+    for p in payloads:
+        runs.setdefault(p["run_id"], []).append(p["rank"])
+    for run_id, ranks in runs.items():
+        summarize_staged(run_id, ranks)
+
+HANDLERS = {"extract": _do_extract, "summarize": _do_summarize}
+
+def run_worker(kinds=tuple(HANDLERS), exit_when_idle=False, worker: str = WORKER_ID) -> dict:
+    """Nhận và chạy job cho tới khi bị dừng; exit_when_idle: thoát khi không còn job nào của
+    `kinds` đang chờ / đang chạy (kể cả ở worker khác)."""
+    global _pool
+    out = {"done": 0, "failed": 0}
+    try:
+        while True:
+            busy = False
+            for kind in kinds:
+                jobs = claim(kind, CLAIM_BATCH.get(kind, 1), worker)
+                if not jobs:
+                    continue
+                busy = True
+                ids = [i for i, _ in jobs]
+                try:
+                    with _keepalive(lambda: heartbeat(ids, worker), JOB_LEASE_S / 3), \
+                            metrics.timer("job_seconds", kind=kind):
+                        HANDLERS[kind]([p for _, p in jobs])
+                except Exception as e:
+                    print(f"[jobs] {kind} ×{len(ids)} failed: {e!r}")
+                    fail(kind, ids, f"{e.__class__.__name__}: {e}", worker)
+                    out["failed"] += len(ids)
+                else:
+                    finish(kind, ids, worker)
+                    out["done"] += len(ids)
+            if not busy:
+                if exit_when_idle and not pending(kinds):
+                    break
+                time.sleep(POLL_S)
+    finally:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
+    return out
+
+def use_queue(n: int) -> bool:
+    """Stage n việc có đi qua job queue không (PIPELINE_WORKERS > 0 và n >= JOB_MIN_ITEMS)."""
+    return PIPELINE_WORKERS > 0 and n >= JOB_MIN_ITEMS
+
+def run_stage(kind: str, items: dict, workers: int = PIPELINE_WORKERS) -> dict:
+    """Một stage pipeline qua job queue: xếp `items` vào hàng, mở thêm tối đa workers-1
+    process worker (không quá số CPU và số lô CLAIM_BATCH — parse trang tốn CPU, thêm
+    process trên cùng số lõi chỉ tốn khởi động) và process này cũng làm worker tới khi hết
+    job của `kind`. Worker chạy sẵn (python -m app worker) vẫn nhận việc như thường.
+
+    Trả về số job theo trạng thái; job done (và failed quá 7 ngày) được xoá sau đó.
+    """
+    enqueue(kind, items)
+    procs = [
+        subprocess.Popen([sys.executable, "-m", "app", "worker", "--kinds", kind, "--exit-when-idle"], cwd=PROJECT_DIR)
+        for _ in range(max(0, min(workers, os.cpu_count() or 1, -(-len(items) // CLAIM_BATCH.get(kind, 1))) - 1))
+    ]
+    try:
+        run_worker((kind,), exit_when_idle=True)
+    finally:
+        for p in procs:
+            p.wait()
+    with SessionLocal() as s:
+        counts = dict(s.execute(
+            select(Job.status, func.count()).where(Job.kind == kind).group_by(Job.status)
+        ).all())
+        s.execute(delete(Job).where(Job.kind == kind, or_(
+            Job.status == "done",
+            and_(Job.status == "failed", Job.updated_at < datetime.utcnow() - timedelta(days=7)),
+        )))
+        s.commit()
+    return counts
@@ -0,0 +1,80 @@
+import asyncio, httpx
+from .config import (
+    OPENAI_API_KEY, OPENAI_BASE_URL, OPENAI_TIMEOUT, GEMINI_BASE_URL, GEMINI_TIMEOUT, SUMMARY_CONCURRENCY,
+)
+
+# Client dùng chung suốt vòng đời process (keep-alive + HTTP/2) cho các provider LLM,
+# thay vì dựng client / bắt tay TLS mới cho từng bài.
+
+_LIMITS = httpx.Limits(
+    max_connections=max(10, SUMMARY_CONCURRENCY * 2),
+    max_keepalive_connections=max(10, SUMMARY_CONCURRENCY * 2),
+    keepalive_expiry=120,
+)
+
+_sync: dict = {}
+_async: dict = {}
+
+
+def _new_http(timeout: float) -> httpx.Client:
+    return httpx.Client(http2=True, limits=_LIMITS, timeout=timeout)
+
+
+def _new_async_http(timeout: float) -> httpx.AsyncClient:
+    return httpx.AsyncClient(http2=True, limits=_LIMITS, timeout=timeout)
+
+
+def gemini_http() -> httpx.Client:
+    if "gemini" not in _sync:
+        _sync["gemini"] = _new_http(GEMINI_TIMEOUT)
+    return _sync["gemini"]
+
+
+def openai_client():
+    if "openai" not in _sync:
+        from openai import OpenAI
+        # retry do scheduler quản lý (tôn trọng Retry-After), SDK không tự retry
+        _sync["openai"] = OpenAI(
+            api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL or None, max_retries=0,
+            timeout=OPENAI_TIMEOUT, http_client=_new_http(OPENAI_TIMEOUT),
+        )
+    return _sync["openai"]
+
+
+def _per_loop(name: str, factory):
+    # AsyncClient gắn với event loop tạo ra nó; mỗi asyncio.run() có loop mới
+    loop = asyncio.get_running_loop()
+    cached = _async.get(name)
+    if cached is None or cached[0] is not loop:
+        cached = _async[name] = (loop, factory())
+    return cached[1]
+
+
+def gemini_async_http() -> httpx.AsyncClient:
+    return _per_loop("gemini", lambda: _new_async_http(GEMINI_TIMEOUT))
+
+
+def openai_async_client():
+    def factory():
+        from openai import AsyncOpenAI
+        return AsyncOpenAI(
+            api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL or None, max_retries=0,
+            timeout=OPENAI_TIMEOUT, http_client=_new_async_http(OPENAI_TIMEOUT),
+        )
+    return _per_loop("openai", factory)
+
+
+def gemini_url(model: str) -> str:
+    return f"{GEMINI_BASE_URL.rstrip('/')}/v1/models/{model}:generateContent"
+
+
+async def aclose():
+    """Đóng các client async của loop hiện tại (gọi trước khi asyncio.run() kết thúc)."""
+    loop = asyncio.get_running_loop()
+    for name, (owner, client) in list(_async.items()):
+        if owner is loop:
+            if isinstance(client, httpx.AsyncClient):
+                await client.aclose()
+            else:
+                await client.close()
+            del _async[name]
@@ -0,0 +1,147 @@
+import threading, time
+from bisect import bisect_left
+from contextlib import contextmanager
+from sqlalchemy import event
+
+# Counter / histogram trong process, xuất theo text format của Prometheus (0.0.4) — đủ cho
+# /metrics và report của mỗi lượt pipeline, không cần thêm prometheus_client.
+# Pipeline (cron) và API là hai process: API xuất số của chính nó (process="api") kèm
+# snapshot đã lưu trong report của lượt pipeline gần nhất (process="pipeline").
+
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+METRICS = {
+    "pipeline_stage_seconds": ("gauge", "Thời gian chạy của từng stage pipeline"),
+    "http_fetch_total": ("counter", "Request HTTP ra ngoài (feed / trang bài) theo status, 'error' = lỗi mạng"),
+    "http_fetch_bytes_total": ("counter", "Số byte body đã tải"),
+    "http_fetch_seconds": ("histogram", "Thời gian tải một feed / trang"),
+    "extract_parse_seconds": ("histogram", "Thời gian parse một trang (trafilatura + og:image + SimHash)"),
+    "llm_request_seconds": ("histogram", "Độ trễ một request LLM (kể cả request lỗi)"),
+    "llm_tokens_total": ("counter", "Token LLM theo provider và loại (prompt / completion)"),
+    "llm_retries_total": ("counter", "Số lần retry sau 429"),
+    "llm_fallbacks_total": ("counter", "Provider lỗi, chuyển sang provider kế tiếp"),
+    "summaries_total": ("counter", "Bản tóm tắt theo nguồn (cache / provider / offline)"),
+    "db_query_seconds": ("histogram", "Thời gian một câu SQL theo engine và loại lệnh"),
+    "http_requests_total": ("counter", "Request vào API theo route và status"),
+    "http_request_seconds": ("histogram", "Thời gian xử lý request API theo route"),
+}
+
+_lock = threading.Lock()
+# (name, labels) → float (counter/gauge) hoặc [số mẫu rơi vào từng bucket..., sum, count]
+_values: dict = {}
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+def inc(name, value=1.0, **labels):
+    k = _key(name, labels)
+    with _lock:
+        _values[k] = _values.get(k, 0.0) + value
+
+def set_gauge(name, value, **labels):
+    with _lock:
+        _values[_key(name, labels)] = float(value)
+
+def observe(name, value, **labels):
+    k = _key(name, labels)
+    with _lock:
+        h = _values.get(k)
+        if h is None:
+            h = _values[k] = [0] * len(BUCKETS) + [0.0, 0]
+        i = bisect_left(BUCKETS, value)
+        if i < len(BUCKETS):
+            h[i] += 1
+        h[-2] += value
+        h[-1] += 1
+
+@contextmanager
+def timer(name, **labels):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - t0, **labels)
+
+def snapshot() -> list:
+    """[[name, labels, value]] — JSON được, dùng cho report của lượt pipeline."""
+    with _lock:
+        return [[name, dict(labels), list(v) if isinstance(v, list) else v] for (name, labels), v in _values.items()]
+
+def reset():
+    with _lock:
+        _values.clear()
+
+def _labels(labels: dict, extra=None) -> str:
+    items = {**labels, **(extra or {})}
+    if not items:
+        return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in sorted(items.items())) + "}"
+
+def render(*sources) -> str:
+    """sources: (snapshot, extra_labels) — gộp theo tên metric, mỗi metric một khối HELP/TYPE."""
+    by_name: dict = {}
+    for snap, extra in sources:
+        for name, labels, value in snap:
+            by_name.setdefault(name, []).append((labels, extra, value))
+    out = []
+    for name in sorted(by_name):
+        kind, help_ = METRICS.get(name, ("untyped", name))
+        out += [f"# HELP {name} {help_}", f"# TYPE {name} {kind}"]
+        for labels, extra, value in by_name[name]:
+            if kind != "histogram":
+                out.append(f"{name}{_labels(labels, extra)} {float(value)!r}")
+                continue
+            acc = 0
+            for b, n in zip(BUCKETS, value):
+                acc += n
+                out.append(f"{name}_bucket{_labels({**labels, 'le': f'{b:g}'}, extra)} {acc}")
+            out.append(f"{name}_bucket{_labels({**labels, 'le': '+Inf'}, extra)} {value[-1]}")
+            out.append(f"{name}_sum{_labels(labels, extra)} {float(value[-2])!r}")
+            out.append(f"{name}_count{_labels(labels, extra)} {value[-1]}")
+    return "\n".join(out) + "\n"
+
+def instrument_engine(engine, name: str):
+    """Đo thời gian mọi câu SQL của engine (sync Engine; với AsyncEngine truyền .sync_engine)."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("_query_t0", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _end(conn, cursor, statement, parameters, context, executemany):
+        t0 = conn.info["_query_t0"].pop()
+        op = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else "other"
+        observe("db_query_seconds", time.perf_counter() - t0, engine=name, op=op)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(ctx):
+        # câu lỗi không tới after_cursor_execute
+        stack = ctx.connection.info.get("_query_t0") if ctx.connection is not None else None
+        if stack:
+            stack.pop()
+
+class RequestMetrics:
+    """ASGI middleware: đếm request + thời gian xử lý theo route (mẫu path, không phải URL thật)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        t0, status = time.perf_counter(), 500
+
+        async def send_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", "other")
+            observe("http_request_seconds", time.perf_counter() - t0, route=path)
+            inc("http_requests_total", route=path, status=status)
@@ -1,26 +1,47 @@
-from sqlalchemy import String, Integer, DateTime, Text, JSON, Float, UniqueConstraint
+from sqlalchemy import String, Integer, DateTime, Text, JSON, Float, LargeBinary, Index, UniqueConstraint
 from sqlalchemy.orm import mapped_column, Mapped
 from datetime import datetime
 from .db import Base
 
 class News(Base):
     __tablename__ = "news"
+    __table_args__ = (
+        # rank_recent / API sắp theo published_at, phân trang theo (published_at, id)
+        Index("ix_news_published_id", "published_at", "id"),
+        # /api/news?source= phân trang theo (published_at, id) trong từng nguồn
+        Index("ix_news_source_published_id", "source", "published_at", "id"),
+        # covering index cho rank_recent: cửa sổ ứng viên đọc hoàn toàn từ index, không
+        # chạm tới dòng trong bảng
+        Index("ix_news_rank", "published_at", "content_len", "cluster_id", "source", "social_score", "topic_tags"),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     url: Mapped[str] = mapped_column(String(2048), unique=True, index=True)
     title: Mapped[str] = mapped_column(String(512))
-    source: Mapped[str] = mapped_column(String(128), index=True)
-    published_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+    source: Mapped[str] = mapped_column(String(128))  # index: ix_news_source_published_id
+    published_at: Mapped[datetime] = mapped_column(DateTime)  # index: ix_news_published_id
     og_image: Mapped[str | None] = mapped_column(String(2048), nullable=True)
-    content_text: Mapped[str | None] = mapped_column(Text, nullable=True)
+    # nội dung bài nằm trong news_content (nén zstd, app/content.py); NULL = chưa extract
+    content_len: Mapped[int | None] = mapped_column(Integer, nullable=True)  # len(nội dung), ranker lọc trong SQL
+    content_hash: Mapped[str | None] = mapped_column(String(16), nullable=True)  # blake2b 64-bit của nội dung
     lang: Mapped[str | None] = mapped_column(String(16), nullable=True)
     fetched_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
     social_score: Mapped[float] = mapped_column(Float, default=0.0)
-    topic_tags: Mapped[str | None] = mapped_column(String(256), nullable=True)  # comma-separated
+    topic_tags: Mapped[str | None] = mapped_column(String(256), nullable=True)  # comma-separated, ingest.topic_tags(tiêu đề)
+    # từ đặc trưng của nhóm chủ đề trong pool picks (ranker.diversify ghi, ranker không đọc)
+    topic_cluster: Mapped[str | None] = mapped_column(String(256), nullable=True)
+    simhash: Mapped[int | None] = mapped_column(Integer, nullable=True)  # SimHash 64-bit của nội dung
+    cluster_id: Mapped[int | None] = mapped_column(Integer, nullable=True, index=True)  # id bài đại diện
+    embed_version: Mapped[int | None] = mapped_column(Integer, nullable=True)  # vector trong EMBED_PATH (app/embed.py)
+
+class NewsContent(Base):
+    __tablename__ = "news_content"
+    news_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    body: Mapped[bytes] = mapped_column(LargeBinary)  # một frame zstd (UTF-8), đọc bằng unzstd(body) trong SQL
 
 class Summary(Base):
     __tablename__ = "summaries"
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    news_id: Mapped[int] = mapped_column(Integer, index=True)
+    news_id: Mapped[int] = mapped_column(Integer, unique=True, index=True)
     title_vi: Mapped[str] = mapped_column(String(256))
     bullets_json: Mapped[str] = mapped_column(Text)  # JSON list
     so_what_vn: Mapped[str] = mapped_column(Text)
@@ -31,8 +52,113 @@ class Summary(Base):
 
 class Picks(Base):
     __tablename__ = "picks"
+    __table_args__ = (Index("ux_picks_date_rank", "date_str", "rank", unique=True),)
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    date_str: Mapped[str] = mapped_column(String(16), index=True)  # YYYY-MM-DD
+    date_str: Mapped[str] = mapped_column(String(16))  # YYYY-MM-DD, index: ux_picks_date_rank
     rank: Mapped[int] = mapped_column(Integer)
     news_id: Mapped[int] = mapped_column(Integer, index=True)
     summary_id: Mapped[int] = mapped_column(Integer, index=True)
+
+class FeedState(Base):
+    __tablename__ = "feed_state"
+    url: Mapped[str] = mapped_column(String(2048), primary_key=True)
+    etag: Mapped[str | None] = mapped_column(String(256), nullable=True)
+    last_modified: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    checked_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+# --- Chỉ mục tiêu đề cho dedupe tăng dần (xem app/dedupe.py) ---
+class TitleIndex(Base):
+    __tablename__ = "title_index"
+    news_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    title: Mapped[str] = mapped_column(String(512))
+
+class TitleToken(Base):
+    __tablename__ = "title_tokens"
+    token: Mapped[str] = mapped_column(String(64), primary_key=True)
+    news_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+
+class TitleTerm(Base):
+    __tablename__ = "title_terms"
+    token: Mapped[str] = mapped_column(String(64), primary_key=True)
+    df: Mapped[int] = mapped_column(Integer, default=0)
+
+# --- Chỉ mục band của SimHash (4 band × 16 bit) cho dedupe theo nội dung ---
+class ContentBand(Base):
+    __tablename__ = "content_bands"
+    band: Mapped[int] = mapped_column(Integer, primary_key=True)
+    value: Mapped[int] = mapped_column(Integer, primary_key=True)
+    news_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+
+class SummaryCache(Base):
+    __tablename__ = "summary_cache"
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)  # sha256(prompt version, model, title, content)
+    model: Mapped[str] = mapped_column(String(64))
+    payload: Mapped[str] = mapped_column(Text)  # JSON trả về từ summarize_article
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+    used_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+
+# Response /api/picks/today đã serialize sẵn (JSON + gzip/brotli), ghi khi pipeline publish
+class PicksPage(Base):
+    __tablename__ = "picks_pages"
+    date_str: Mapped[str] = mapped_column(String(16), primary_key=True)
+    etag: Mapped[str] = mapped_column(String(80))
+    body: Mapped[bytes] = mapped_column(LargeBinary)
+    body_gzip: Mapped[bytes] = mapped_column(LargeBinary)
+    body_br: Mapped[bytes | None] = mapped_column(LargeBinary, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+# --- Trạng thái pipeline (xem app/pipeline.py): mỗi lượt chạy ghi stage đã xong, chạy lại thì tiếp tục ---
+class PipelineRun(Base):
+    __tablename__ = "pipeline_runs"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    date_str: Mapped[str] = mapped_column(String(16), index=True)
+    stage: Mapped[str | None] = mapped_column(String(32), nullable=True)  # stage cuối đã hoàn tất
+    stats: Mapped[str] = mapped_column(Text, default="{}")  # JSON
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    # JSON: thời gian từng stage + snapshot app.metrics của process chạy pipeline
+    report: Mapped[str | None] = mapped_column(Text, nullable=True)
+    started_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True, index=True)
+
+# Picks của một lượt chạy trước khi publish; publish chép sang picks trong một transaction
+class PickStaging(Base):
+    __tablename__ = "picks_staging"
+    run_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    rank: Mapped[int] = mapped_column(Integer, primary_key=True)
+    news_id: Mapped[int] = mapped_column(Integer)
+    summary_id: Mapped[int | None] = mapped_column(Integer, nullable=True)  # NULL = chưa tóm tắt
+
+# Hàng đợi việc cho các process worker (app/jobs.py): mỗi dòng một bài cần extract / một
+# pick cần tóm tắt. Worker nhận job bằng UPDATE ... RETURNING và giữ lease_until bằng
+# heartbeat; lease hết hạn (worker chết) thì worker khác nhận lại.
+class Job(Base):
+    __tablename__ = "jobs"
+    __table_args__ = (
+        UniqueConstraint("kind", "key", name="uq_jobs_kind_key"),
+        Index("ix_jobs_claim", "kind", "status", "run_after", "id"),
+    )
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    kind: Mapped[str] = mapped_column(String(16))  # extract | summarize
+    key: Mapped[str] = mapped_column(String(64))  # news_id / "<run_id>:<rank>"
+    payload: Mapped[str] = mapped_column(Text, default="{}")  # JSON
+    status: Mapped[str] = mapped_column(String(8), default="queued")  # queued | running | done | failed
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    run_after: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    lease_until: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    worker: Mapped[str | None] = mapped_column(String(64), nullable=True)  # host:pid
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+# Khoá có hạn (lease) giữa các process, vd. "pipeline": hai lượt cron chồng nhau không chạy cùng lúc
+class Lock(Base):
+    __tablename__ = "locks"
+    name: Mapped[str] = mapped_column(String(32), primary_key=True)
+    owner: Mapped[str] = mapped_column(String(64))
+    expires_at: Mapped[datetime] = mapped_column(DateTime)
+
+# Hạn mức provider LLM dùng chung giữa các process (ratelimit.SharedBucket), vd. "openai:rpm"
+class Quota(Base):
+    __tablename__ = "quotas"
+    name: Mapped[str] = mapped_column(String(32), primary_key=True)
+    tat: Mapped[float] = mapped_column(Float)  # epoch giây: lúc mọi token đã giữ chỗ được nạp lại
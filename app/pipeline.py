@@ -1,88 +1,255 @@
-from sqlalchemy import select
+from sqlalchemy import select, update, delete, insert, literal, func
 from datetime import datetime
-from dateutil import tz
-import json, time
-
-from .db import engine, SessionLocal, Base
-from .models import News, Summary, Picks
-from .config import DAILY_TOP_K, TIMEZONE
-from .ingest import ingest_once
-from .extract import extract_missing_text
-from .dedupe import dedupe_titles
-from .ranker import rank_recent
-from .summarizer import summarize_article
-
-def today_str():
-    tzinfo = tz.gettz(TIMEZONE)
-    return datetime.now(tz=tzinfo).strftime("%Y-%m-%d")
-
-def run_pipeline():
-    Base.metadata.create_all(bind=engine)
-
+import asyncio, json, sys, time
+
+from .db import SessionLocal, init_db
+from .models import News, NewsContent, Summary, Picks, PipelineRun, PickStaging
+from .config import DAILY_TOP_K, PICK_POOL, PIPELINE_STREAM, PIPELINE_WORKERS
+from .publish import materialize_picks, today_str
+from . import jobs, metrics
+
+# Pipeline = chuỗi stage ingest → extract → dedupe → rank → summarize → publish. Mỗi stage
+# chỉ xử lý phần chưa làm (bài chưa extract / chưa index / pick chưa tóm tắt ...) và lượt
+# chạy (pipeline_runs) ghi lại stage cuối đã xong, nên nếu crash thì lần chạy sau tiếp tục
+# từ stage kế tiếp. Picks được dựng trong picks_staging và chỉ chép sang picks (cùng
+# picks_pages) ở stage publish, trong một transaction → API không bao giờ thấy ngày ghi dở.
+# Module của từng stage (feedparser, trafilatura, numpy, client LLM ...) chỉ được import
+# trong stage đó: chạy lẻ một stage (python -m app rank) không phải nạp cả bộ.
+# PIPELINE_WORKERS > 0: extract và summarize đi qua job queue (app/jobs.py), chia cho nhiều
+# process worker (stage ít hơn JOB_MIN_ITEMS việc vẫn chạy tại chỗ). Cả lượt chạy giữ lock "pipeline": lượt cron thứ hai chồng lên thì bỏ qua.
+
+def stage_ingest(run_id):
     # 📰 1. Crawl dữ liệu gốc
-    n_new = ingest_once()
-
-    # 🧠 2. Extract nội dung (nếu có async)
-    n_ext = 0
-    try:
-        n_ext = __import__("asyncio").run(
-            __import__("app.extract", fromlist=["extract_missing_text"]).extract_missing_text()
-        )
-    except Exception:
-        pass
-
-    # 🧩 3. Loại trùng tiêu đề
-    n_dup = dedupe_titles()
-
-    # 🧮 4. Xếp hạng các bài gần đây
-    ranked = rank_recent(limit=120)
-
-    # ⚙️ 5. Lọc bài có nội dung (text dài > 200 ký tự)
-    ranked_with_text = [r for _, r in ranked if r.content_text and len(r.content_text) > 200]
-
-    # ✅ 6. Giới hạn chỉ lấy 50 bài đầu tiên để tóm tắt
-    limited = ranked_with_text[:50]
-
-    # 🔝 7. Sau đó chỉ chọn top DAILY_TOP_K (mặc định = 10)
-    top = limited[:DAILY_TOP_K]
-
+    from .ingest import ingest_once
+    return {"new_items": ingest_once()}
+
+def stage_extract(run_id):
+    # 🧠 2. Extract nội dung cho các bài chưa có nội dung
+    if PIPELINE_WORKERS:
+        with SessionLocal() as s:
+            ids = s.scalars(select(News.id).where(News.content_len.is_(None))).all()
+        if jobs.use_queue(len(ids)):
+            jobs.run_stage("extract", {i: {"news_id": i} for i in ids})
+            with SessionLocal() as s:
+                left = s.scalar(select(func.count()).where(News.content_len.is_(None)))
+            return {"extracted": len(ids) - left}
+    from .extract import extract_missing_text
+    return {"extracted": asyncio.run(extract_missing_text())}
+
+def stage_dedupe(run_id):
+    # 🧩 3. Loại trùng tiêu đề; gom bài trùng nội dung (bài đăng lại / viết lại tiêu đề)
+    #       → chỉ bài đại diện được xếp hạng
+    from .dedupe import dedupe_titles, dedupe_content
+    return {"deduped": dedupe_titles(), "clustered": dedupe_content()}
+
+def stage_stream(run_id):
+    # 🚰 1–3 ở chế độ --stream: ingest → extract → dedupe chạy gối nhau qua các queue có giới
+    #       hạn, bài vào top DAILY_TOP_K được tóm tắt sớm vào cache (xem app/stream.py)
+    from .stream import stream_run
+    return asyncio.run(stream_run())
+
+def stage_rank(run_id):
+    # 🧮 4. Xếp hạng các bài trong cửa sổ RANK_WINDOW_HOURS có nội dung > RANK_MIN_CONTENT_LEN
+    #       ký tự (lọc trong SQL), lấy PICK_POOL bài đầu rồi chọn DAILY_TOP_K (mặc định = 10)
+    #       bằng MMR để picks không bị một sự kiện chiếm hết; gắn topic_cluster theo nhóm
+    from .embed import embed_missing
+    from .ranker import rank_recent, diversify
+    embed_missing()
+    ids = diversify(rank_recent(limit=PICK_POOL), DAILY_TOP_K)
     with SessionLocal() as s:
-        picks_date = today_str()
-        # Xoá pick cũ trong DB
-        s.execute(__import__("sqlalchemy").text("DELETE FROM picks WHERE date_str = :d"), {"d": picks_date})
+        s.execute(delete(PickStaging).where(PickStaging.run_id == run_id))
+        if ids:
+            s.execute(insert(PickStaging), [{"run_id": run_id, "rank": i, "news_id": nid} for i, nid in enumerate(ids, 1)])
         s.commit()
-
-        created = 0
-        for idx, news in enumerate(top, start=1):
-            print(f"[{idx}/{len(top)}] 🧾 Summarizing: {news.title[:80]} ...")
-
-            # 🪶 8. Tóm tắt bằng GPT hoặc offline fallback
-            summ = summarize_article(news.url, news.title, news.source, news.content_text)
-
-            # 🕒 Thêm delay để tránh rate limit (nếu có key GPT)
-            time.sleep(2)
-
-            # 💾 Lưu vào DB
-            summary = Summary(
-                news_id=news.id,
-                title_vi=summ.get("title_vi", news.title)[:250],
-                bullets_json=json.dumps(summ.get("bullets", []), ensure_ascii=False),
-                so_what_vn=summ.get("so_what_vn", ""),
-                hashtags=",".join(summ.get("hashtags", []))[:120],
-                attribution=summ.get("attribution", news.source),
-                url=summ.get("url", news.url),
+    return {"ranked": len(ids)}
+
+def _save_summary(s, news, summ) -> int:
+    # 💾 mỗi bài một Summary (news_id unique): bài đã có Summary thì cập nhật. Nếu nội dung
+    #    đổi thì dựng lại picks_pages của các ngày đã publish summary này (cùng transaction),
+    #    để API không phục vụ body / ETag cũ của những ngày đó
+    summary = s.execute(
+        select(Summary).where(Summary.news_id == news.id).order_by(Summary.id.desc()).limit(1)
+    ).scalar_one_or_none() or Summary(news_id=news.id)
+    values = {
+        "title_vi": summ.get("title_vi", news.title)[:250],
+        "bullets_json": json.dumps(summ.get("bullets", []), ensure_ascii=False),
+        "so_what_vn": summ.get("so_what_vn", ""),
+        "hashtags": ",".join(summ.get("hashtags", []))[:120],
+        "attribution": summ.get("attribution", news.source),
+        "url": summ.get("url", news.url),
+    }
+    changed = summary.id is not None and any(getattr(summary, k) != v for k, v in values.items())
+    for k, v in values.items():
+        setattr(summary, k, v)
+    s.add(summary)
+    s.flush()
+    if changed:
+        for d in s.scalars(select(Picks.date_str).where(Picks.summary_id == summary.id).distinct()).all():
+            materialize_picks(s, d)
+    return summary.id
+
+def summarize_staged(run_id, ranks=None) -> int:
+    """Tóm tắt các pick chưa có summary của lượt chạy (chỉ các `ranks` nếu có), trả về số bài.
+
+    Một lần summarize_many cho cả lô, bài nào xong thì lưu + commit ngay → crash giữa chừng
+    không mất phần đã tóm tắt. Rate limiter nằm trong SQLite: mọi worker của job queue chia
+    chung OPENAI_RPM / TPM (và của Gemini) thay vì mỗi process một hạn mức.
+    """
+    from .summarizer import summarize_many, make_limiters
+    with SessionLocal() as s:
+        q = (
+            select(PickStaging.rank, News.id, News.url, News.title, News.source,
+                   func.unzstd(NewsContent.body).label("content_text"))
+            .join(News, News.id == PickStaging.news_id)
+            .outerjoin(NewsContent, NewsContent.news_id == News.id)
+            .where(PickStaging.run_id == run_id, PickStaging.summary_id.is_(None))
+            .order_by(PickStaging.rank)
+        )
+        rows = s.execute(q if ranks is None else q.where(PickStaging.rank.in_(ranks))).all()
+    if not rows:
+        return 0
+    for r in rows:
+        print(f"[{r.rank}] 🧾 Summarizing: {r.title[:80]} ...")
+    with SessionLocal() as s:
+        def save(i, summ):
+            s.execute(
+                update(PickStaging)
+                .where(PickStaging.run_id == run_id, PickStaging.rank == rows[i].rank)
+                .values(summary_id=_save_summary(s, rows[i], summ))
             )
-            s.add(summary)
-            s.flush()
+            s.commit()
+
+        asyncio.run(summarize_many([(r.url, r.title, r.source, r.content_text) for r in rows],
+                                   limiters=make_limiters(shared=True), on_result=save))
+    return len(rows)
+
+def stage_summarize(run_id):
+    # 🪶 5. Tóm tắt song song (GPT → Gemini → offline) các pick chưa có summary, commit theo
+    #       từng bài → crash giữa chừng không mất phần đã tóm tắt
+    from . import cache
+    ranks = []
+    if PIPELINE_WORKERS:
+        with SessionLocal() as s:
+            ranks = s.scalars(
+                select(PickStaging.rank).where(PickStaging.run_id == run_id, PickStaging.summary_id.is_(None))
+            ).all()
+    if jobs.use_queue(len(ranks)):
+        jobs.run_stage("summarize", {f"{run_id}:{r}": {"run_id": run_id, "rank": r} for r in ranks})
+        with SessionLocal() as s:
+            done = s.scalar(select(func.count()).where(
+                PickStaging.run_id == run_id, PickStaging.rank.in_(ranks), PickStaging.summary_id.is_not(None)
+            ))
+    else:
+        done = summarize_staged(run_id)
+    cache.evict()
+    return {"summarized": done}
+
+def stage_publish(run_id):
+    # 📦 6. Thay picks của ngày bằng picks_staging và serialize sẵn response API, cùng một transaction
+    with SessionLocal() as s:
+        run = s.get(PipelineRun, run_id)
+        staged = (
+            select(literal(run.date_str), PickStaging.rank, PickStaging.news_id, PickStaging.summary_id)
+            .where(PickStaging.run_id == run_id, PickStaging.summary_id.is_not(None))
+        )
+        n = s.scalar(select(func.count()).select_from(staged.subquery()))
+        if n:
+            s.execute(delete(Picks).where(Picks.date_str == run.date_str))
+            s.execute(insert(Picks).from_select(["date_str", "rank", "news_id", "summary_id"], staged))
+            materialize_picks(s, run.date_str)
+        else:
+            # không có pick mới → giữ nguyên picks đang hiển thị
+            print("⚠️ No staged picks, keeping the published ones")
+        s.execute(delete(PickStaging).where(PickStaging.run_id == run_id))
+        run.finished_at = datetime.utcnow()
+        s.commit()
+    return {"picks": n}
+
+STAGES = [
+    ("ingest", stage_ingest),
+    ("extract", stage_extract),
+    ("dedupe", stage_dedupe),
+    ("rank", stage_rank),
+    ("summarize", stage_summarize),
+    ("publish", stage_publish),
+]
+# stage stream thay cho ingest/extract/dedupe, checkpoint dưới tên "dedupe" để lượt chạy
+# dở vẫn resume được bằng chế độ nào cũng được
+STREAM_STAGES = [("dedupe", stage_stream)] + STAGES[3:]
+
+def _open_run(resume: bool):
+    """Lượt chạy dở gần nhất của hôm nay (nếu resume), còn lại bỏ dở → mở lượt mới."""
+    d = today_str()
+    with SessionLocal() as s:
+        pending = s.execute(
+            select(PipelineRun).where(PipelineRun.finished_at.is_(None)).order_by(PipelineRun.id.desc())
+        ).scalars().all()
+        run = pending[0] if pending and resume and pending[0].date_str == d else None
+        for old in pending:
+            if old is not run:
+                old.finished_at, old.error = datetime.utcnow(), old.error or "abandoned"
+                s.execute(delete(PickStaging).where(PickStaging.run_id == old.id))
+        if run is None:
+            run = PipelineRun(date_str=d, stats="{}")
+            s.add(run)
+        s.commit()
+        return run.id, run.stage, json.loads(run.stats or "{}")
 
-            s.add(Picks(date_str=picks_date, rank=idx, news_id=news.id, summary_id=summary.id))
-            created += 1
+def _checkpoint(run_id, stage=None, stats=None, error=None):
+    with SessionLocal() as s:
+        run = s.get(PipelineRun, run_id)
+        if stage:
+            run.stage, run.stats, run.error = stage, json.dumps(stats), None
+        if error:
+            run.error = error
+        run.updated_at = datetime.utcnow()
+        s.commit()
 
+def _report(run_id, stats):
+    # report JSON của lượt chạy: thời gian từng stage (kể cả các stage đã chạy ở lần trước
+    # nếu resume) + snapshot metrics của process này; API xuất lại ở /metrics
+    for name, sec in stats.get("stage_s", {}).items():
+        metrics.set_gauge("pipeline_stage_seconds", sec, stage=name)
+    report = {"run_id": run_id, "stages": stats.get("stage_s", {}), "stats": stats, "metrics": metrics.snapshot()}
+    with SessionLocal() as s:
+        s.get(PipelineRun, run_id).report = json.dumps(report, ensure_ascii=False)
         s.commit()
 
-    print(f"✅ Pipeline done: {created} picks saved.")
-    return {"new_items": n_new, "extracted": n_ext, "deduped": n_dup, "picks": created}
+def run_pipeline(resume: bool = True, stream: bool = PIPELINE_STREAM):
+    init_db()
+    with jobs.lock("pipeline") as locked:
+        if not locked:
+            print("⏭️ Another pipeline run holds the lock, skipping")
+            return {"skipped": "locked"}
+        return _run(resume, stream)
+
+def _run(resume, stream):
+    run_id, done, stats = _open_run(resume)
+    names = [name for name, _ in STAGES]
+    start = names.index(done) + 1 if done else 0
+    if start:
+        print(f"↩️ Resuming run #{run_id} after stage '{done}'")
+
+    for name, stage in STREAM_STAGES if stream else STAGES:
+        if names.index(name) < start:
+            continue
+        t0 = time.perf_counter()
+        try:
+            stats.update(stage(run_id))
+        except Exception as e:
+            _checkpoint(run_id, error=f"{name}: {e.__class__.__name__}: {e}")
+            _report(run_id, stats)
+            print(f"❌ Stage '{name}' failed, re-run to resume from here: {e!r}")
+            raise
+        stats.setdefault("stage_s", {})[name] = round(time.perf_counter() - t0, 3)
+        print(f"⏱️ {name}: {stats['stage_s'][name]:.2f}s")
+        _checkpoint(run_id, name, stats)
+    _report(run_id, stats)
+
+    print(f"✅ Pipeline done: {stats.get('picks', 0)} picks saved.")
+    return stats
 
 if __name__ == "__main__":
-    res = run_pipeline()
-    print(res)
\ No newline at end of file
+    # tương đương python -m app run [--fresh] [--stream] [--profile]
+    from .__main__ import main
+    sys.exit(main(["run", *sys.argv[1:]]))
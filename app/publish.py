@@ -0,0 +1,128 @@
+import asyncio, gzip, hashlib, json, time
+from datetime import datetime
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from dateutil import tz
+from fastapi import Request, Response
+
+from .config import TIMEZONE
+from .models import News, Summary, Picks, PicksPage
+from .readdb import fetch_all, fetch_one
+
+try:
+    import brotli
+except ImportError:  # brotli là tuỳ chọn – thiếu thì chỉ phục vụ gzip
+    brotli = None
+
+# Picks của một ngày chỉ đổi khi pipeline chạy, nên pipeline serialize sẵn response
+# (picks_pages) và API chỉ việc trả bytes từ cache trong process.
+
+PICKS_CHECK_INTERVAL = 1.0  # giây giữa hai lần hỏi DB xem picks_pages có etag mới chưa
+
+def today_str():
+    tzinfo = tz.gettz(TIMEZONE)
+    return datetime.now(tz=tzinfo).strftime("%Y-%m-%d")
+
+def picks_query(d: str):
+    return (
+        select(Picks.rank, Summary.title_vi, Summary.bullets_json, Summary.hashtags, News.source, News.url)
+        .join(Summary, Summary.id == Picks.summary_id)
+        .join(News, News.id == Picks.news_id)
+        .where(Picks.date_str == d)
+        .order_by(Picks.rank.asc())
+    )
+
+def build_picks_payload(s, d: str) -> dict:
+    return payload_from_rows(d, s.execute(picks_query(d)).all())
+
+def payload_from_rows(d: str, rows) -> dict:
+    out = []
+    for rank, title_vi, bullets_json, hashtags, source, url in rows:
+        out.append({
+            "rank": rank,
+            "title_vi": title_vi,
+            "bullets": json.loads(bullets_json),
+            "hashtags": hashtags.split(",") if hashtags else [],
+            "source": source,
+            "url": url,
+        })
+    return {"date": d, "top_posts": out}
+
+def render_page(d: str, payload: dict) -> dict:
+    body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return {
+        "date_str": d,
+        "etag": '"%s"' % hashlib.sha256(body).hexdigest()[:32],
+        "body": body,
+        "body_gzip": gzip.compress(body, 9, mtime=0),
+        "body_br": brotli.compress(body, quality=11) if brotli else None,
+    }
+
+def materialize_picks(s, d: str):
+    """Ghi response đã serialize của ngày d vào picks_pages (trong transaction của caller)."""
+    page = render_page(d, build_picks_payload(s, d))
+    stmt = sqlite_insert(PicksPage).values(**page, created_at=datetime.utcnow())
+    s.execute(stmt.on_conflict_do_update(
+        index_elements=[PicksPage.date_str],
+        set_={k: stmt.excluded[k] for k in ("etag", "body", "body_gzip", "body_br", "created_at")},
+    ))
+    return page
+
+class PicksPageCache:
+    """Cache trong process các response theo ngày; mỗi PICKS_CHECK_INTERVAL giây hỏi
+    etag trong DB một lần (PK lookup) để biết pipeline đã publish bản mới chưa."""
+
+    def __init__(self, interval: float = PICKS_CHECK_INTERVAL):
+        self.interval = interval
+        self._pages: dict = {}  # date → (checked_at, page)
+        self._inflight: dict = {}  # date → Task đang kiểm tra DB
+
+    async def get(self, d: str) -> dict:
+        cached = self._pages.get(d)
+        if cached and time.monotonic() - cached[0] < self.interval:
+            return cached[1]
+        # các request đến cùng lúc dùng chung một lượt hỏi DB
+        task = self._inflight.get(d)
+        if task is None:
+            task = self._inflight[d] = asyncio.ensure_future(self._refresh(d, cached))
+            task.add_done_callback(lambda _: self._inflight.pop(d, None))
+        return await asyncio.shield(task)
+
+    async def _refresh(self, d: str, cached) -> dict:
+        now = time.monotonic()
+        etag = await fetch_one(select(PicksPage.etag).where(PicksPage.date_str == d))
+        etag = etag[0] if etag else None
+        if cached and etag is not None and cached[1]["etag"] == etag:
+            page = cached[1]
+        elif etag is not None:
+            row = await fetch_one(
+                select(PicksPage.date_str, PicksPage.etag, PicksPage.body, PicksPage.body_gzip, PicksPage.body_br)
+                .where(PicksPage.date_str == d)
+            )
+            page = dict(row._mapping)
+        else:
+            # pipeline chưa materialize ngày này → dựng trực tiếp từ các bảng
+            page = render_page(d, payload_from_rows(d, await fetch_all(picks_query(d))))
+        if len(self._pages) >= 32 and d not in self._pages:
+            self._pages.clear()
+        self._pages[d] = (now, page)
+        return page
+
+def _etag_matches(header: str | None, etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(t.strip().removeprefix("W/") == etag for t in header.split(","))
+
+def page_response(page: dict, request: Request) -> Response:
+    headers = {"ETag": page["etag"], "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if _etag_matches(request.headers.get("if-none-match"), page["etag"]):
+        return Response(status_code=304, headers=headers)
+    accept = request.headers.get("accept-encoding", "")
+    body = page["body"]
+    if page.get("body_br") and "br" in accept:
+        body, headers["Content-Encoding"] = page["body_br"], "br"
+    elif "gzip" in accept:
+        body, headers["Content-Encoding"] = page["body_gzip"], "gzip"
+    return Response(content=body, media_type="application/json", headers=headers)
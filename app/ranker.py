@@ -1,7 +1,11 @@
 import math
-from datetime import datetime, timezone
-from sqlalchemy import select
-from .db import SessionLocal
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from sqlalchemy import select, update, or_, func, bindparam
+from .config import RANK_WINDOW_HOURS, RANK_MAX_CANDIDATES, RANK_MIN_CONTENT_LEN, MMR_LAMBDA, TOPIC_SIM
+from .db import engine
+from .embed import VectorStore, cosine_matrix, text_features
 from .models import News
 
 SOURCE_WEIGHT = {
@@ -18,8 +22,24 @@ SOURCE_WEIGHT = {
     "VentureBeat AI": 0.7,
     "Wired AI": 0.7
 }
+DEFAULT_SOURCE_WEIGHT = 0.6
 
-def freshness_score(published_at, tau_hours=24):
+# topic_tags (comma-separated) → điểm cộng; bài nhiều tag lấy tag nặng nhất
+TOPIC_WEIGHT = {
+    "llm": 0.05,
+    "agent": 0.05,
+    "research": 0.04,
+    "open-source": 0.04,
+    "multimodal": 0.03,
+    "policy": 0.03,
+    "hardware": 0.03,
+}
+# social_score bão hoà dần: 0 → +0, SOCIAL_SCALE → +~0.063, rất lớn → +SOCIAL_WEIGHT
+SOCIAL_WEIGHT = 0.1
+SOCIAL_SCALE = 50.0
+TAU_HOURS = 24
+
+def freshness_score(published_at, tau_hours=TAU_HOURS):
     # Nếu thời điểm bài viết không có tz -> gắn UTC
     if published_at is None:
         published_at = datetime.now(timezone.utc)
@@ -30,15 +50,133 @@ def freshness_score(published_at, tau_hours=24):
     dt = (now - published_at).total_seconds() / 3600.0
     return math.exp(-dt / max(1.0, tau_hours))
 
-def rank_recent(limit=50):
-    with SessionLocal() as s:
-        rows = s.execute(select(News).order_by(News.published_at.desc()).limit(limit)).scalars().all()
-        ranked = []
-        for r in rows:
-            f = freshness_score(r.published_at or datetime.now(timezone.utc))
-            sw = SOURCE_WEIGHT.get(r.source, 0.6)
-            # simple base score; could add social signals
-            score = 0.6*f + 0.4*sw
-            ranked.append((score, r))
-        ranked.sort(key=lambda x: x[0], reverse=True)
-        return ranked
+def _topic_bonus(tags):
+    if not tags:
+        return 0.0
+    return max((TOPIC_WEIGHT.get(t.strip().lower(), 0.0) for t in tags.split(",")), default=0.0)
+
+def score_arrays(age_hours, sources, social, tags, tau_hours=TAU_HOURS):
+    """Điểm cho cả cửa sổ ứng viên một lượt (NumPy); age_hours tính sẵn trong SQL."""
+    f = np.exp(-np.maximum(age_hours, 0.0) / max(1.0, tau_hours))
+    sw = np.fromiter(map(SOURCE_WEIGHT.get, sources, [DEFAULT_SOURCE_WEIGHT] * len(sources)), float, len(sources))
+    soc = SOCIAL_WEIGHT * (1.0 - np.exp(-np.maximum(social, 0.0) / SOCIAL_SCALE))
+    # số chuỗi topic_tags khác nhau ít → tính một lần mỗi chuỗi
+    bonus = {t: _topic_bonus(t) for t in set(tags)}
+    topic = np.fromiter(map(bonus.__getitem__, tags), float, len(tags))
+    return 0.6 * f + 0.4 * sw + soc + topic
+
+def top_k(scores, k):
+    """Chỉ số của k điểm cao nhất, giảm dần (argpartition O(n) rồi sort k phần tử)."""
+    if k >= len(scores):
+        return np.argsort(-scores, kind="stable")
+    idx = np.argpartition(-scores, k - 1)[:k]
+    return idx[np.argsort(-scores[idx], kind="stable")]
+
+def rank_recent(limit=50, window_hours=RANK_WINDOW_HOURS, min_len=RANK_MIN_CONTENT_LEN,
+                max_candidates=RANK_MAX_CANDIDATES, ids=None):
+    """Top `limit` bài trong `window_hours` giờ gần nhất có nội dung > min_len ký tự.
+
+    Lọc thời gian / độ dài / cluster nằm trong SQL (range scan trên covering index
+    ix_news_rank), chỉ đọc các cột dùng để chấm điểm. Trả về [(score, news_id)] giảm dần.
+    `ids`: chỉ chấm các bài này (pipeline streaming chấm từng lô bài mới).
+    """
+    since = datetime.utcnow() - timedelta(hours=window_hours)
+    age = (func.julianday(func.datetime("now")) - func.julianday(News.published_at)) * 24.0
+    q = (
+        select(News.id, News.source, age.label("age_h"), News.social_score, News.topic_tags)
+        .where(
+            News.published_at >= since,
+            News.content_len > min_len,
+            # chỉ lấy bài đại diện của mỗi cluster nội dung (xem dedupe_content)
+            or_(News.cluster_id.is_(None), News.cluster_id == News.id),
+        )
+        .order_by(News.published_at.desc())
+        .limit(max_candidates)
+    )
+    if ids is not None:
+        q = q.where(News.id.in_(ids))
+    with engine.connect() as conn:
+        rows = conn.execute(q).all()
+    if not rows:
+        return []
+    ids, sources, ages, social, tags = zip(*rows)
+    scores = score_arrays(
+        np.asarray(ages, dtype=float), sources, np.asarray(social, dtype=float), tags,
+    )
+    return [(float(scores[i]), ids[i]) for i in top_k(scores, limit)]
+
+# ---- Đa dạng hoá picks: MMR + gom chủ đề trên pool các bài điểm cao nhất ----
+
+def mmr_select(scores, vecs, k, lam=MMR_LAMBDA):
+    """Chọn k chỉ số theo Maximal Marginal Relevance.
+
+    Mỗi bước lấy bài có lam * điểm (chuẩn hoá 0..1) - (1 - lam) * cosine lớn nhất với
+    các bài đã chọn; vecs chuẩn hoá L2, hàng 0 (chưa có vector) không bị phạt.
+    """
+    scores = np.asarray(scores, dtype=np.float32)
+    n = len(scores)
+    rel = (scores - scores.min()) / (np.ptp(scores) or 1.0) if n else scores
+    max_sim = np.zeros(n, dtype=np.float32)
+    taken = np.zeros(n, dtype=bool)
+    chosen = []
+    for _ in range(min(k, n)):
+        gain = lam * rel - (1.0 - lam) * max_sim
+        gain[taken] = -np.inf
+        i = int(np.argmax(gain))
+        chosen.append(i)
+        taken[i] = True
+        np.maximum(max_sim, vecs @ vecs[i], out=max_sim)
+    return chosen
+
+def topic_groups(vecs, threshold=TOPIC_SIM):
+    """Gom nhóm tham lam theo thứ tự đầu vào: bài vào nhóm có trưởng nhóm giống nhất (cosine
+    >= threshold), nếu không thì mở nhóm mới. Trả về nhãn nhóm cho từng hàng."""
+    sims = cosine_matrix(vecs, vecs)
+    leaders, labels = [], np.empty(len(vecs), dtype=np.intp)
+    for i in range(len(vecs)):
+        if leaders:
+            j = int(np.argmax(sims[i, leaders]))
+            if sims[i, leaders[j]] >= threshold:
+                labels[i] = j
+                continue
+        leaders.append(i)
+        labels[i] = len(leaders) - 1
+    return labels
+
+def _topic_terms(titles, labels, n_terms=3):
+    # từ đặc trưng của nhóm: tần suất trong nhóm × idf trong pool
+    docs = [{f for f in text_features(t) if not f.isdigit()} for t in titles]
+    df = Counter(f for d in docs for f in d)
+    out = {}
+    for g in set(labels.tolist()):
+        members = [docs[i] for i in np.flatnonzero(labels == g)]
+        if len(members) < 2:
+            continue
+        tf = Counter(f for d in members for f in d)
+        weight = {f: c * math.log(1 + len(docs) / df[f]) for f, c in tf.items() if c >= 2}
+        out[g] = [f for f, _ in sorted(weight.items(), key=lambda x: (-x[1], x[0]))[:n_terms]]
+    return out
+
+def diversify(ranked, k, store: VectorStore | None = None, lam=MMR_LAMBDA):
+    """Từ [(score, news_id)] (giảm dần) chọn k bài bằng MMR và ghi topic_cluster cho các
+    bài trong pool (từ đặc trưng của nhóm chủ đề có từ 2 bài, NULL nếu không thuộc nhóm nào).
+    Trả về danh sách news_id theo thứ tự chọn.
+
+    Nhãn nhóm không ghi vào topic_tags: score_arrays cộng điểm theo topic_tags, nhãn suy ra
+    từ chính pool sẽ làm lượt xếp hạng sau khác lượt trước trên cùng dữ liệu."""
+    if not ranked:
+        return []
+    scores = np.array([sc for sc, _ in ranked], dtype=np.float32)
+    ids = [nid for _, nid in ranked]
+    vecs = (store or VectorStore()).get(ids)
+
+    labels = topic_groups(vecs)
+    with engine.begin() as conn:
+        titles = dict(conn.execute(select(News.id, News.title).where(News.id.in_(ids))).all())
+        terms = _topic_terms([titles.get(i, "") for i in ids], labels)
+        conn.execute(
+            update(News.__table__).where(News.id == bindparam("_id")).values(topic_cluster=bindparam("_tags")),
+            [{"_id": ids[i], "_tags": ",".join(terms[g])[:256] if terms.get(g) else None}
+             for i, g in enumerate(labels.tolist())],
+        )
+    return [ids[i] for i in mmr_select(scores, vecs, k, lam)]
@@ -0,0 +1,94 @@
+import asyncio, time
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from .db import SessionLocal
+from .models import Quota
+
+
+class TokenBucket:
+    """Token bucket nạp đều `per_minute` token/phút, chứa tối đa `per_minute` token."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = max(1.0, float(per_minute))
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def take(self, n: float = 1.0):
+        n = min(float(n), self.capacity)
+        # lock → các request chờ theo thứ tự đến
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= n:
+                    self.tokens -= n
+                    return
+                await asyncio.sleep((n - self.tokens) / self.rate)
+
+
+class SharedBucket:
+    """Như TokenBucket nhưng trạng thái nằm trong bảng quotas → mọi process (worker của job
+    queue) dùng chung một hạn mức.
+
+    GCRA: chỉ lưu tat = lúc bucket đầy lại nếu không ai lấy thêm. Lấy n token là một câu
+    UPSERT dời tat thêm n khoảng nạp rồi chờ tới khi tat - capacity khoảng ≤ bây giờ;
+    token đã giữ chỗ không trả lại.
+    """
+
+    def __init__(self, name: str, per_minute: float):
+        self.name = name
+        self.capacity = max(1.0, float(per_minute))
+        self.interval = 60.0 / self.capacity  # giây nạp một token
+
+    def _reserve(self, cost: float, not_before: float = 0.0) -> float:
+        now = time.time()
+        start = max(now, not_before)
+        stmt = sqlite_insert(Quota).values(name=self.name, tat=start + cost)
+        with SessionLocal() as s:
+            tat = s.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[Quota.name], set_={"tat": func.max(Quota.tat, start) + cost},
+                ).returning(Quota.tat)
+            ).scalar_one()
+            s.commit()
+        return tat - self.capacity * self.interval - now
+
+    async def take(self, n: float = 1.0):
+        wait = await asyncio.to_thread(self._reserve, min(float(n), self.capacity) * self.interval)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def hold(self, seconds: float):
+        # 429: không process nào lấy được token trong `seconds` giây tới
+        self._reserve(0.0, time.time() + seconds + self.capacity * self.interval)
+
+
+class ProviderLimiter:
+    """Giới hạn requests/phút + tokens/phút cho một provider, và tạm dừng khi gặp 429.
+
+    name: hạn mức dùng chung giữa các process qua SQLite (SharedBucket "<name>:rpm" / ":tpm").
+    """
+
+    def __init__(self, rpm: float, tpm: float, name: str | None = None):
+        if name:
+            self.requests, self.tokens = SharedBucket(f"{name}:rpm", rpm), SharedBucket(f"{name}:tpm", tpm)
+        else:
+            self.requests, self.tokens = TokenBucket(rpm), TokenBucket(tpm)
+        self._resume_at = 0.0
+
+    def pause(self, seconds: float):
+        self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+        if isinstance(self.requests, SharedBucket):
+            self.requests.hold(seconds)
+
+    async def acquire(self, tokens: int):
+        while (wait := self._resume_at - time.monotonic()) > 0:
+            await asyncio.sleep(wait)
+        await self.requests.take(1)
+        await self.tokens.take(tokens)
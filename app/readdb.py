@@ -0,0 +1,45 @@
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from .config import DB_PATH, READ_POOL_SIZE, SQLITE_BUSY_TIMEOUT_MS, SQLITE_CACHE_MB, SQLITE_MMAP_MB
+from .metrics import instrument_engine
+from . import content
+
+# Đường đọc của API: pool kết nối aiosqlite mở ở chế độ read-only (mode=ro), query
+# Core chỉ lấy đúng cột cần, không qua ORM/identity map. Ghi vẫn đi qua app.db.
+
+read_engine = create_async_engine(
+    f"sqlite+aiosqlite:///file:{DB_PATH}?mode=ro&uri=true",
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=READ_POOL_SIZE,
+    max_overflow=0,
+    pool_pre_ping=False,
+    pool_reset_on_return=None,
+)
+instrument_engine(read_engine.sync_engine, "read")
+
+@event.listens_for(read_engine.sync_engine, "connect")
+def _read_pragmas(dbapi_conn, _record):
+    cur = dbapi_conn.cursor()
+    cur.execute("PRAGMA query_only=ON")
+    cur.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cur.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_MB * 1024}")
+    cur.execute(f"PRAGMA mmap_size={SQLITE_MMAP_MB * 1024 * 1024}")
+    cur.close()
+    content.register(dbapi_conn)
+
+async def fetch_all(stmt, params=None):
+    async with read_engine.connect() as conn:
+        return (await conn.execute(stmt, params or {})).all()
+
+async def fetch_one(stmt, params=None):
+    async with read_engine.connect() as conn:
+        return (await conn.execute(stmt, params or {})).first()
+
+async def stream(stmt, params=None, chunk=200):
+    """Trả từng lô `chunk` dòng qua cursor phía server, không nạp cả kết quả vào RAM."""
+    async with read_engine.connect() as conn:
+        result = await conn.stream(stmt.execution_options(yield_per=chunk), params or {})
+        async for rows in result.partitions():
+            yield rows
@@ -0,0 +1,80 @@
+import json, re
+from sqlalchemy import DateTime, text
+from .readdb import fetch_all
+
+# Tìm kiếm full-text trên search_fts (FTS5, tạo bởi migration 3 trong app/db.py), tiêu đề
+# nặng hơn nội dung khi xếp hạng bm25.
+# Chuỗi người dùng nhập được đổi thành các term đặt trong dấu nháy nối bằng AND — không
+# lộ cú pháp FTS5 ra ngoài nên không có lỗi cú pháp MATCH.
+# remove_diacritics không coi "đ" là "d" có dấu, nên term gõ không dấu có "d" được
+# mở thành (d | đ) ở mỗi vị trí: "diem" → "diem" OR "điem" (khớp "Điểm").
+
+MAX_RESULTS = 100
+# bm25 chỉ chấm SEARCH_WINDOW bài khớp mới nhất (rowid giảm dần, FTS5 dừng sớm):
+# từ phổ biến khớp hàng trăm nghìn bài vẫn trả lời trong vài ms, đổi lại kết quả
+# là các bài liên quan nhất trong số bài khớp gần đây nhất.
+SEARCH_WINDOW = 2000
+_TERM = re.compile(r"\w+")
+
+RANK_SQL = text("""
+    WITH cand AS (
+        SELECT rowid AS id, bm25(search_fts, 10.0, 1.0, 8.0, 3.0) AS score
+        FROM search_fts WHERE search_fts MATCH :q
+        ORDER BY rowid DESC LIMIT :window
+    ), top AS (
+        SELECT id, score FROM cand ORDER BY score LIMIT :k
+    )
+    SELECT n.id, n.title, n.source, n.url, n.published_at, s.title_vi, -top.score AS score
+    FROM top
+    JOIN news n ON n.id = top.id
+    LEFT JOIN summaries s ON s.news_id = n.id
+    ORDER BY top.score
+""").columns(published_at=DateTime)
+
+# snippet() chỉ chạy được trong truy vấn MATCH; lọc rowid bằng "+rowid IN" (không đẩy
+# xuống FTS5) để snippet chỉ được tính cho đúng các bài đã chọn trong khoảng [lo, hi]
+SNIPPET_SQL = text("""
+    SELECT rowid AS id, snippet(search_fts, -1, '<b>', '</b>', '…', 16) AS snippet
+    FROM search_fts
+    WHERE search_fts MATCH :q AND rowid BETWEEN :lo AND :hi
+      AND +rowid IN (SELECT value FROM json_each(:ids))
+""")
+
+MAX_D_VARIANTS = 3  # tối đa 2^3 biến thể mỗi term
+
+def _variants(term: str) -> list[str]:
+    out = [""]
+    for i, ch in enumerate(term):
+        if ch == "d" and term[:i].count("d") < MAX_D_VARIANTS:
+            out = [v + c for v in out for c in "dđ"]
+        else:
+            out = [v + ch for v in out]
+    return out
+
+def match_expr(q: str) -> str | None:
+    terms = _TERM.findall((q or "").lower())
+    if not terms:
+        return None
+    parts = []
+    for term in terms:
+        alts = [f'"{v}"' for v in _variants(term)]
+        parts.append(alts[0] if len(alts) == 1 else "(" + " OR ".join(alts) + ")")
+    return " AND ".join(parts)
+
+async def search(q: str, limit: int = 20) -> list[dict]:
+    expr = match_expr(q)
+    if expr is None:
+        return []
+    rows = await fetch_all(RANK_SQL, {"q": expr, "k": min(limit, MAX_RESULTS), "window": SEARCH_WINDOW})
+    if not rows:
+        return []
+    ids = [r.id for r in rows]
+    snippets = dict(await fetch_all(SNIPPET_SQL, {"q": expr, "lo": min(ids), "hi": max(ids), "ids": json.dumps(ids)}))
+    return [
+        {
+            "id": r.id, "title": r.title, "title_vi": r.title_vi, "source": r.source, "url": r.url,
+            "published_at": r.published_at.isoformat() if r.published_at else None,
+            "snippet": snippets.get(r.id), "score": round(r.score, 3),
+        }
+        for r in rows
+    ]
@@ -0,0 +1,244 @@
+import asyncio, heapq, time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import httpx
+from sqlalchemy import select, func
+from .config import (
+    FEED_CONCURRENCY, FEED_PER_HOST, FEED_TIMEOUT, EXTRACT_CONCURRENCY, EXTRACT_PER_DOMAIN, EXTRACT_WORKERS,
+    EXTRACT_BATCH, DAILY_TOP_K, SUMMARY_CONCURRENCY, STREAM_PREFETCH,
+)
+from .db import SessionLocal, init_db
+from .models import News, NewsContent, FeedState
+from .ingest import load_sources, fetch_feed, store_feed, new_stats, print_stats
+from .extract import fetch_and_extract, pending_rows, write_batch, MIN_TEXT_LEN, PAGE_SIZE
+from .dedupe import dedupe_titles, dedupe_content
+from .ranker import rank_recent
+from .summarizer import summarize_article_async, make_limiters
+from .utils import HostLimiter
+from . import llm
+
+# Chế độ streaming của pipeline (python -m app run --stream): thay vì chạy hết từng
+# stage rồi mới sang stage sau, các bước nối với nhau bằng asyncio.Queue có giới hạn
+#
+#   feed → lưu bài + dedupe tiêu đề → extract → dedupe nội dung + chấm điểm → tóm tắt
+#
+# Feed nào tải xong thì bài của nó đi tiếp ngay; queue đầy thì bước trước phải chờ
+# (backpressure) nên bộ nhớ không tăng theo số bài. Bước chấm điểm giữ heap DAILY_TOP_K bài
+# điểm cao nhất (khởi tạo bằng các bài sẵn có trong cửa sổ xếp hạng); bài nào lọt vào heap
+# được tóm tắt ngay, kết quả nằm trong summary_cache. Picks cuối cùng vẫn do stage rank →
+# summarize → publish chọn trên toàn bộ dữ liệu như chế độ batch, chỉ là phần lớn bản tóm
+# tắt đã có sẵn trong cache. Picks chỉ publish ở cuối lượt chạy: stream rút ngắn cả lượt,
+# không làm pick đầu tiên hiện sớm hơn. Bài lọt top rồi bị đẩy ra vẫn đã tốn một request
+# LLM → tóm tắt trước tối đa STREAM_PREFETCH bài mỗi lượt (chi phí thừa không quá chừng đó).
+# Mỗi lần đọc/ghi DB dùng session ngắn, không giữ transaction qua await: một snapshot
+# đọc cũ trong WAL sẽ làm lần ghi sau của chính session đó lỗi "database is locked".
+# Mọi việc chặn (SQLAlchemy, dedupe, chấm điểm, trích câu + cache của bước tóm tắt) chạy
+# trong một thread DB riêng: event loop vẫn tải feed / trang / gọi LLM trong lúc đó, và các
+# lần ghi SQLite nối tiếp nhau thay vì tranh khoá.
+
+async def _drain(queue, n):
+    """Chờ ít nhất một phần tử rồi lấy thêm những gì đang có sẵn (tối đa n).
+
+    Trả về (items, done); done = đã gặp None (bước trước đã xong).
+    """
+    items = [await queue.get()]
+    while len(items) < n and items[-1] is not None and not queue.empty():
+        items.append(queue.get_nowait())
+    done = items[-1] is None
+    return [i for i in items if i is not None], done
+
+# ---- phần chặn, chạy trong thread DB của stream_run ----
+
+def _store(f, resp, fstats):
+    with SessionLocal() as s:
+        ids = store_feed(s, f, resp, {f["url"]: s.get(FeedState, f["url"])}, fstats)
+        s.commit()
+    return ids
+
+def _unextracted(ids):
+    with SessionLocal() as s:
+        return s.execute(
+            select(News.id, News.url, News.og_image.is_(None))
+            .where(News.id.in_(ids), News.content_len.is_(None))
+        ).all()
+
+def _pending(last_id):
+    with SessionLocal() as s:
+        return pending_rows(s, last_id)
+
+def _write_and_rank(texts, images):
+    with SessionLocal() as s:
+        write_batch(s, texts, images)
+    if not texts:
+        return 0, []
+    return dedupe_content(), rank_recent(len(texts), ids=[t["_id"] for t in texts])
+
+def _article(nid):
+    with SessionLocal() as s:
+        return s.execute(
+            select(News.url, News.title, News.source, func.unzstd(NewsContent.body))
+            .join(NewsContent, NewsContent.news_id == News.id).where(News.id == nid)
+        ).one_or_none()
+
+async def stream_run() -> dict:
+    """Chạy ingest → extract → dedupe gối nhau và tóm tắt sớm các bài lọt top vào summary_cache.
+
+    Không ghi picks: stage rank → summarize → publish của pipeline chạy sau đó chọn và
+    publish picks trên toàn bộ dữ liệu, phần lớn bản tóm tắt lấy lại từ cache.
+    """
+    init_db()
+    t0 = time.perf_counter()
+    stats = {"new_items": 0, "extracted": 0, "deduped": 0, "clustered": 0, "prefetched": 0,
+             "first_summary_s": None}
+    new_q: asyncio.Queue = asyncio.Queue(maxsize=EXTRACT_BATCH)                # id bài mới
+    extract_q: asyncio.Queue = asyncio.Queue(maxsize=EXTRACT_CONCURRENCY * 2)  # (id, url, need_image)
+    done_q: asyncio.Queue = asyncio.Queue(maxsize=EXTRACT_BATCH)               # kết quả extract
+    summary_q: asyncio.Queue = asyncio.Queue(maxsize=SUMMARY_CONCURRENCY * 2)  # id bài cần tóm tắt
+
+    # min-heap (score, news_id) của DAILY_TOP_K bài điểm cao nhất đến lúc này
+    top = rank_recent(DAILY_TOP_K)
+    heapq.heapify(top)
+    in_top = {nid for _, nid in top}
+
+    loop = asyncio.get_running_loop()
+    db = ThreadPoolExecutor(max_workers=1, thread_name_prefix="stream-db")
+
+    def in_db(fn, *args):
+        return loop.run_in_executor(db, fn, *args)
+
+    feeds = load_sources()
+    fstats = new_stats(feeds)
+    with SessionLocal() as s:
+        states = {st.url: st for st in s.execute(select(FeedState)).scalars()}
+
+    async def ingest(client):
+        limiter = HostLimiter(FEED_CONCURRENCY, FEED_PER_HOST)
+
+        async def one(f):
+            resp = await fetch_feed(client, limiter, f, states.get(f["url"]), fstats)
+            if resp is None:
+                return
+            ids = await in_db(_store, f, resp, fstats)
+            stats["new_items"] += len(ids)
+            for nid in ids:
+                await new_q.put(nid)
+
+        await asyncio.gather(*(one(f) for f in feeds))
+        fstats["fetch_s"] = time.perf_counter() - t0
+        print_stats(fstats)
+        await new_q.put(None)
+
+    async def titles():
+        # dedupe tiêu đề trước khi extract → không tải trang của bài trùng
+        sent, done = set(), False
+        while not done:
+            ids, done = await _drain(new_q, EXTRACT_BATCH)
+            if not ids:
+                continue
+            stats["deduped"] += await in_db(dedupe_titles)
+            for row in await in_db(_unextracted, ids):
+                sent.add(row[0])
+                await extract_q.put(tuple(row))
+        # bài cũ chưa extract được (lần trước lỗi / timeout) đi sau bài mới
+        last_id = 0
+        while True:
+            rows = await in_db(_pending, last_id)
+            if not rows:
+                break
+            for row in rows:
+                if row[0] not in sent:
+                    await extract_q.put(tuple(row))
+            last_id = rows[-1][0]
+        await extract_q.put(None)
+
+    async def extract(client, pool):
+        # mỗi bài một task như extract_missing_text: bài của host đang đầy không chặn host khác
+        limiter = HostLimiter(EXTRACT_CONCURRENCY, EXTRACT_PER_DOMAIN)
+        inflight = asyncio.Semaphore(PAGE_SIZE)
+
+        async def one(news_id, url, need_image):
+            try:
+                await done_q.put((news_id, need_image, *await fetch_and_extract(client, url, limiter, pool)))
+            finally:
+                inflight.release()
+
+        tasks = []
+        while (item := await extract_q.get()) is not None:
+            await inflight.acquire()
+            tasks.append(asyncio.create_task(one(*item)))
+            if len(tasks) >= PAGE_SIZE:
+                for t in tasks:
+                    if t.done():
+                        t.result()  # ném lại lỗi nếu có
+                tasks = [t for t in tasks if not t.done()]
+        await asyncio.gather(*tasks)
+        await done_q.put(None)
+
+    async def score():
+        done = False
+        while not done:
+            items, done = await _drain(done_q, EXTRACT_BATCH)
+            texts = [{"_id": nid, "_text": content, "_len": len(content), "_simhash": fingerprint}
+                     for nid, _, content, _, fingerprint in items if content and len(content) > MIN_TEXT_LEN]
+            images = [{"_id": nid, "_img": og_image} for nid, need, _, og_image, _ in items if og_image and need]
+            clustered, ranked = await in_db(_write_and_rank, texts, images)
+            if not texts:
+                continue
+            stats["extracted"] += len(texts)
+            stats["clustered"] += clustered
+            for sc, nid in ranked:
+                if len(top) < DAILY_TOP_K:
+                    heapq.heappush(top, (sc, nid))
+                elif sc > top[0][0]:
+                    in_top.discard(heapq.heapreplace(top, (sc, nid))[1])
+                else:
+                    continue
+                in_top.add(nid)
+                await summary_q.put(nid)
+        for _ in range(SUMMARY_CONCURRENCY):
+            await summary_q.put(None)
+
+    async def summarize():
+        limiters = make_limiters()
+        started = [0]  # số bài đã bắt đầu tóm tắt trước (≤ STREAM_PREFETCH)
+
+        async def worker():
+            while (nid := await summary_q.get()) is not None:
+                if nid not in in_top or started[0] >= STREAM_PREFETCH:
+                    continue  # đã bị bài điểm cao hơn đẩy khỏi heap khi còn nằm trong queue / hết hạn mức
+                row = await in_db(_article, nid)
+                if row is None:
+                    continue
+                started[0] += 1
+                await summarize_article_async(*row, limiters=limiters, run=in_db)
+                stats["prefetched"] += 1
+                if stats["first_summary_s"] is None:
+                    stats["first_summary_s"] = round(time.perf_counter() - t0, 2)
+
+        await asyncio.gather(*(worker() for _ in range(SUMMARY_CONCURRENCY)))
+
+    limits = httpx.Limits(
+        max_connections=EXTRACT_CONCURRENCY,
+        max_keepalive_connections=EXTRACT_CONCURRENCY,
+        keepalive_expiry=30,
+    )
+    with ProcessPoolExecutor(max_workers=EXTRACT_WORKERS or None) as pool:
+        async with httpx.AsyncClient(timeout=FEED_TIMEOUT, follow_redirects=True) as feed_client, \
+                httpx.AsyncClient(http2=True, limits=limits, follow_redirects=True) as page_client:
+            tasks = [asyncio.ensure_future(c) for c in (
+                ingest(feed_client), titles(), extract(page_client, pool), score(), summarize(),
+            )]
+            try:
+                await asyncio.gather(*tasks)
+            except BaseException:
+                # một bước lỗi → huỷ các bước còn lại (nếu không chúng chờ queue mãi)
+                for t in tasks:
+                    t.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                raise
+            finally:
+                await llm.aclose()
+                db.shutdown()
+
+    stats["stream_s"] = round(time.perf_counter() - t0, 2)
+    print(f"[stream] {stats}")
+    return stats
@@ -1,63 +1,206 @@
-import os, json, re
-from collections import Counter
+import os, json, re, asyncio, hashlib, zlib
+import numpy as np
 from typing import Dict, List
-from .config import OPENAI_API_KEY, OPENAI_MODEL, OUTPUT_LANG
+from .config import (
+    OPENAI_API_KEY, OPENAI_MODEL, OUTPUT_LANG, SUMMARY_CONCURRENCY, SUMMARY_BATCH_SIZE, LLM_MAX_RETRIES,
+    OPENAI_RPM, OPENAI_TPM, GEMINI_RPM, GEMINI_TPM, SUMMARY_INPUT_TOKENS,
+)
+from .embed import text_features
+from .ratelimit import ProviderLimiter
+from . import cache, llm, metrics
 
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+GEMINI_MODEL = "gemini-1.5-flash"
+# Tăng khi sửa prompt → các mục cache cũ không còn khớp key
+PROMPT_VERSION = "2"
 
-# ----------------- OFFLINE FALLBACK -----------------
-STOPWORDS = {
-    "the","a","an","and","or","but","if","then","else","for","to","of","in","on","at","by",
-    "with","about","as","is","are","was","were","be","been","being","this","that","it","its",
-    "from","into","over","under","after","before","between","within","without","we","you",
-    "they","their","our","i","he","she","them","his","her","my","me","us"
-}
-
-def _sentences(text: str):
-    text = re.sub(r"\s+", " ", (text or "").strip())
-    return re.split(r"(?<=[.!?])\s+", text) if text else []
-
-def _keywords(text: str, topk=5):
-    words = [w for w in re.findall(r"[A-Za-z]{3,}", (text or "").lower()) if w not in STOPWORDS]
-    freq = Counter(words)
-    return [w for w,_ in freq.most_common(topk)]
+class RateLimited(Exception):
+    """Provider trả 429 (hết hạn mức tạm thời); retry_after tính bằng giây nếu server có gửi."""
+    def __init__(self, provider: str, retry_after: float | None = None):
+        super().__init__(f"{provider} rate limited (retry after {retry_after}s)")
+        self.provider = provider
+        self.retry_after = retry_after
+
+def _retry_after(headers) -> float | None:
+    try:
+        return float(headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+# ----------------- EXTRACTIVE: trích câu quan trọng -----------------
+# Trước khi gọi LLM, bài được rút còn các câu nhiều thông tin nhất trong SUMMARY_INPUT_TOKENS
+# token (~3 ký tự/token) thay vì 4000 ký tự đầu (hay là byline, cookie, menu ...); bản
+# offline dựng bullet từ chính các câu này.
+#   - tách câu (không cắt sau "Mr." / "U.S." ...), bỏ câu rác: quá ngắn / dài, cookie, subscribe ...
+#   - ma trận thưa câu × từ dạng COO trên numpy cho cả lô bài: trọng số (1 + log tf) · idf,
+#     idf theo số câu trong bài chứa từ, từ được đánh số bằng crc32
+#   - điểm câu = TextRank (đồ thị cosine giữa các câu của bài) × cosine với tâm bài
+#     + TITLE_WEIGHT × cosine với tiêu đề + thưởng nhẹ cho câu lead
+#   - chọn tham lam theo điểm cho tới hết ngân sách, bỏ câu gần trùng câu đã chọn, giữ thứ tự gốc
+# Mọi thống kê chỉ tính trong từng bài và thứ tự cộng không phụ thuộc lô, nên trích theo lô
+# (summarize_many) hay từng bài (stream) ra đúng cùng một văn bản → cùng cache key.
+
+MAX_SENTENCES = 200
+MAX_SENTENCE_CHARS = 1000
+TITLE_WEIGHT = 0.5
+LEAD_BONUS = (0.15, 0.1, 0.05)
+DAMPING = 0.85
+NEAR_DUP = 0.8  # cosine giữa hai câu → coi là lặp ý
+_V = 1 << 32    # số "từ" (crc32), khoá (câu, từ) = câu · _V + từ
+
+_SPLIT = re.compile(r"(?<=[.!?…])\s+|(?<=[.!?…][\"'”’)\]])\s+|\s*\n\s*")
+# từ cuối của đoạn trước là viết tắt ("U.S.", "Mr.") → chưa hết câu
+_ABBREV = re.compile(r"\(?(?:[A-Za-z]\.)+|(?:mr|mrs|ms|dr|prof|st|jr|sr|inc|ltd|corp|co|vs|etc|no|fig|approx)\.", re.I)
+# so trên câu đã viết thường
+_JUNK = re.compile(
+    r"cookie|subscribe|newsletter|sign (?:up|in)|log in|all rights reserved|copyright|©|advertisement"
+    r"|click here|read more|follow us|share this|terms of (?:use|service)|privacy policy|javascript"
+    r"|your browser|đăng ký|đăng nhập|bản quyền|quảng cáo| [|•] "  # menu "Home | World | Tech"
+)
+_BYLINE = re.compile(r"By [A-Z][a-z]+ [A-Z][a-z]+(?:\s*[|,–-]|$)")
+
+def split_sentences(text: str) -> List[str]:
+    out = []
+    for part in _SPLIT.split(text or ""):
+        part = " ".join(part.split())
+        if not part:
+            continue
+        # "Mr. Smith", "the U.S. and", câu bị ngắt giữa chừng (bắt đầu bằng chữ thường)
+        if out and (part[0].islower() or _ABBREV.fullmatch(out[-1][out[-1].rfind(" ") + 1:])):
+            out[-1] += " " + part
+        else:
+            out.append(part)
+    return out
 
+def _clean(sentences: List[str]) -> List[str]:
+    return [
+        x for x in sentences
+        if x.count(" ") >= 3 and len(x) <= MAX_SENTENCE_CHARS and not _JUNK.search(x.lower()) and not _BYLINE.match(x)
+    ][:MAX_SENTENCES]
+
+def _textrank(m: np.ndarray):
+    """m: (câu, từ) đã chuẩn hoá L2 → (độ trung tâm, trung bình 1; ma trận cosine câu × câu)."""
+    sim = m @ m.T
+    n = len(sim)
+    g = sim.copy()
+    np.fill_diagonal(g, 0.0)
+    out = g.sum(axis=1, keepdims=True)
+    p = np.divide(g, out, out=np.zeros_like(g), where=out > 0)
+    r = np.full(n, 1.0 / n)
+    for _ in range(50):
+        nxt = (1 - DAMPING) / n + DAMPING * (p.T @ r)
+        if np.abs(nxt - r).sum() < 1e-6:
+            r = nxt
+            break
+        r = nxt
+    return r * n, sim
+
+def extract_many(docs, budget_tokens: int = SUMMARY_INPUT_TOKENS, k: int | None = None) -> List[Dict]:
+    """Trích câu cho cả lô docs = [(title, content), ...].
+
+    Mỗi bài một dict: sentences (câu đã lọc, thứ tự gốc), ranked (chỉ số câu theo điểm giảm
+    dần), picked (chỉ số câu chọn trong ngân sách / tối đa k câu, thứ tự gốc), keywords.
+    """
+    sents = [_clean(split_sentences(content)) for _, content in docs]
+    ids: Dict[str, int] = {}  # từ → crc32, tính một lần mỗi lô
+    rows, cols, sent_doc, title_keys = [], [], [], []
+    for d, (title, _) in enumerate(docs):
+        for x in sents[d]:
+            hs = [ids.get(t) or ids.setdefault(t, zlib.crc32(t.encode())) for t in text_features(x)]
+            rows += [len(sent_doc)] * len(hs)
+            cols += hs
+            sent_doc.append(d)
+        title_keys += [d * _V + zlib.crc32(t.encode()) for t in set(text_features(title or ""))]
+    words = {h: t for t, h in ids.items()}
+
+    nd, ns = len(docs), len(sent_doc)
+    sent_doc = np.array(sent_doc, dtype=np.int64)
+    # tf: gộp các cặp (câu, từ) trùng; key đã sắp theo câu → các câu của một bài nằm liền nhau
+    key, tf = np.unique(np.array(rows, dtype=np.int64) * _V + np.array(cols, dtype=np.int64), return_counts=True)
+    r, c = key // _V, key % _V
+    dr = sent_doc[r] if ns else r
+    # idf trong bài: số câu của bài chứa từ
+    dkey, dinv, sf = np.unique(dr * _V + c, return_inverse=True, return_counts=True)
+    n_sent = np.bincount(sent_doc, minlength=nd)
+    w = (1 + np.log(tf)) * (np.log((1 + n_sent[dr]) / (1 + sf[dinv])) + 1)
+    w /= np.sqrt(np.bincount(r, w * w, minlength=ns))[r]
+    # cosine với tâm bài (tổng các vector câu) và với tiêu đề
+    cent = np.bincount(dinv, w, minlength=len(dkey))
+    cnorm = np.sqrt(np.bincount(dkey // _V, cent * cent, minlength=nd))
+    centroid = np.bincount(r, w * cent[dinv], minlength=ns) / np.maximum(cnorm[sent_doc], 1e-9)
+    n_title = np.bincount(np.array(title_keys, dtype=np.int64) // _V, minlength=nd)
+    in_title = np.isin(dr * _V + c, np.array(title_keys, dtype=np.int64))
+    title_sim = np.bincount(r, w * in_title, minlength=ns) / np.sqrt(np.maximum(n_title[sent_doc], 1))
+
+    budget = budget_tokens * 3
+    first = np.concatenate(([0], np.cumsum(n_sent)))
+    lo_e, hi_e = np.searchsorted(dr, np.arange(nd)), np.searchsorted(dr, np.arange(nd), side="right")
+    lo_k, hi_k = np.searchsorted(dkey // _V, np.arange(nd)), np.searchsorted(dkey // _V, np.arange(nd), side="right")
+    out = []
+    for d in range(nd):
+        n = int(n_sent[d])
+        if n == 0:
+            out.append({"sentences": [], "ranked": [], "picked": [], "keywords": []})
+            continue
+        e = slice(lo_e[d], hi_e[d])
+        terms, local = np.unique(c[e], return_inverse=True)
+        m = np.zeros((n, len(terms)))
+        m[r[e] - first[d], local] = w[e]
+        rank, sim = _textrank(m)
+        score = rank * centroid[first[d]:first[d] + n] + TITLE_WEIGHT * title_sim[first[d]:first[d] + n]
+        score[:len(LEAD_BONUS)] += LEAD_BONUS[:n]
+        ranked = [int(i) for i in np.argsort(-score, kind="stable")]
+
+        picked, used = [], 0
+        for i in ranked:
+            size = len(sents[d][i]) + 1
+            if used + size > budget or (picked and sim[i, picked].max() > NEAR_DUP):
+                continue
+            picked.append(i)
+            used += size
+            if k is not None and len(picked) >= k:
+                break
+        kw = np.argsort(-cent[lo_k[d]:hi_k[d]], kind="stable")[:8]
+        out.append({
+            "sentences": sents[d], "ranked": ranked, "picked": sorted(picked),
+            "keywords": [words[int(h)] for h in dkey[lo_k[d]:hi_k[d]][kw] % _V],
+        })
+    return out
+
+def condense(title: str, content: str, budget_tokens: int = SUMMARY_INPUT_TOKENS) -> str:
+    return condense_many([(title, content)], budget_tokens)[0]
+
+def condense_many(docs, budget_tokens: int = SUMMARY_INPUT_TOKENS) -> List[str]:
+    """Văn bản gửi LLM cho từng (title, content): các câu được chọn, mỗi câu một dòng.
+
+    Bài không tách được câu nào → cắt budget ký tự đầu như trước.
+    """
+    out = []
+    for (_, content), ex in zip(docs, extract_many(docs, budget_tokens)):
+        if ex["picked"]:
+            out.append("\n".join(ex["sentences"][i] for i in ex["picked"]))
+        else:
+            out.append(" ".join((content or "").split())[:budget_tokens * 3])
+    return out
+
+# ----------------- OFFLINE FALLBACK -----------------
 def _offline_summary(url: str, title: str, source: str, content: str) -> Dict:
-    bullets = _sentences(content or "")[:4]
-    kws = _keywords((title or "") + " " + (content or ""), 5)
+    ex = extract_many([(title, content)], k=4)[0]
+    bullets = [ex["sentences"][i][:300] for i in ex["picked"]]
     return {
         "title_vi": f"[TÓM TẮT] {(title or '')[:80]}",
         "bullets": bullets or ["(Không trích được nội dung)"],
         "so_what_vn": "Gợi ý: xem khả năng ứng dụng tại VN (doanh nghiệp/giáo dục/chính sách).",
-        "hashtags": ["#AInews"] + [f"#{k.capitalize()}" for k in kws[:3]],
+        "hashtags": ["#AInews"] + [f"#{w.capitalize()}" for w in ex["keywords"] if w.isalpha()][:3],
         "attribution": source or "",
         "url": url or ""
     }
 
-# ----------------- OPENAI (nếu còn dùng) -----------------
-def _openai_summary(url: str, title: str, source: str, content: str) -> Dict:
-    from openai import OpenAI
-    client = OpenAI(api_key=OPENAI_API_KEY)
-    system = f"""Bạn là biên tập viên công nghệ. Hãy tóm tắt bài viết về AI sang {OUTPUT_LANG}.
+OPENAI_SYSTEM = f"""Bạn là biên tập viên công nghệ. Hãy tóm tắt bài viết về AI sang {OUTPUT_LANG}.
 ⚠️ Toàn bộ đầu ra phải bằng tiếng Việt tự nhiên.
 Trả JSON với các trường: title_vi, bullets, so_what_vn, hashtags, attribution, url."""
-    user = f"[TITLE]: {title}\n[SOURCE]: {source}\n[URL]: {url}\n[CONTENT]:\n{(content or '')[:4000]}"
-    resp = client.chat.completions.create(
-        model=OPENAI_MODEL,
-        messages=[{"role":"system","content":system},{"role":"user","content":user}],
-        temperature=0.3,
-        response_format={"type":"json_object"},
-    )
-    return json.loads(resp.choices[0].message.content)
 
-# ----------------- GOOGLE GEMINI (REST v1 – KHÔNG DÙNG SDK) -----------------
-def _google_summary_rest(url: str, title: str, source: str, content: str) -> Dict:
-    if not GOOGLE_API_KEY:
-        raise RuntimeError("GOOGLE_API_KEY is missing")
-    import requests
-
-    endpoint = "https://generativelanguage.googleapis.com/v1/models/gemini-1.5-flash:generateContent"
-    system_prompt = f"""Bạn là biên tập viên công nghệ. Hãy tóm tắt bài viết về AI sang {OUTPUT_LANG}.
+GEMINI_SYSTEM = f"""Bạn là biên tập viên công nghệ. Hãy tóm tắt bài viết về AI sang {OUTPUT_LANG}.
 ⚠️ Toàn bộ kết quả phải bằng tiếng Việt tự nhiên.
 Yêu cầu:
 - Tiêu đề {OUTPUT_LANG} (60–90 ký tự), chính xác & hấp dẫn.
@@ -65,9 +208,72 @@ Yêu cầu:
 - 1–2 câu 'So what' cho Việt Nam.
 - 3 hashtag ngắn (ví dụ: #AInews, #LLM, #RAG).
 Trả JSON: title_vi, bullets, so_what_vn, hashtags, attribution, url."""
-    user_prompt = f"[TITLE]: {title}\n[SOURCE]: {source}\n[URL]: {url}\n[CONTENT]:\n{(content or '')[:4000]}"
 
-    payload = {
+BATCH_SYSTEM = GEMINI_SYSTEM.rsplit("\n", 1)[0] + """
+Đầu vào gồm nhiều bài, mỗi bài bắt đầu bằng [ID]. Tóm tắt TỪNG bài độc lập.
+Trả JSON object: {"items": [{"id", "title_vi", "bullets", "so_what_vn", "hashtags", "attribution", "url"}, ...]}
+với đúng một phần tử cho mỗi [ID]."""
+
+def _user_prompt(url: str, title: str, source: str, content: str) -> str:
+    return f"[TITLE]: {title}\n[SOURCE]: {source}\n[URL]: {url}\n[CONTENT]:\n{(content or '')[:4000]}"
+
+def _batch_prompt(articles) -> str:
+    return "\n\n=====\n\n".join(f"[ID]: {i}\n" + _user_prompt(*a) for i, a in enumerate(articles))
+
+# ----------------- OPENAI (nếu còn dùng) -----------------
+def _openai_request(system: str, user: str) -> Dict:
+    return dict(
+        model=OPENAI_MODEL,
+        messages=[{"role":"system","content":system},{"role":"user","content":user}],
+        temperature=0.3,
+        response_format={"type":"json_object"},
+    )
+
+def _openai_rate_limited(e) -> Exception:
+    # hết quota hẳn thì retry vô ích → rơi xuống provider kế tiếp
+    if getattr(e, "code", None) == "insufficient_quota":
+        return e
+    return RateLimited("openai", _retry_after(e.response.headers))
+
+def _count_tokens(provider: str, prompt, completion):
+    metrics.inc("llm_tokens_total", prompt or 0, provider=provider, kind="prompt")
+    metrics.inc("llm_tokens_total", completion or 0, provider=provider, kind="completion")
+
+def _openai_text(resp) -> str:
+    if resp.usage is not None:
+        _count_tokens("openai", resp.usage.prompt_tokens, resp.usage.completion_tokens)
+    return resp.choices[0].message.content
+
+def _openai_chat(system: str, user: str) -> str:
+    from openai import RateLimitError
+    try:
+        with metrics.timer("llm_request_seconds", provider="openai"):
+            resp = llm.openai_client().chat.completions.create(**_openai_request(system, user))
+    except RateLimitError as e:
+        raise _openai_rate_limited(e) from e
+    return _openai_text(resp)
+
+async def _openai_chat_async(system: str, user: str) -> str:
+    from openai import RateLimitError
+    try:
+        with metrics.timer("llm_request_seconds", provider="openai"):
+            resp = await llm.openai_async_client().chat.completions.create(**_openai_request(system, user))
+    except RateLimitError as e:
+        raise _openai_rate_limited(e) from e
+    return _openai_text(resp)
+
+def _openai_summary(url: str, title: str, source: str, content: str) -> Dict:
+    return json.loads(_openai_chat(OPENAI_SYSTEM, _user_prompt(url, title, source, content)))
+
+async def _openai_summary_async(url: str, title: str, source: str, content: str) -> Dict:
+    return json.loads(await _openai_chat_async(OPENAI_SYSTEM, _user_prompt(url, title, source, content)))
+
+async def _openai_batch_async(articles) -> Dict:
+    return json.loads(await _openai_chat_async(BATCH_SYSTEM, _batch_prompt(articles)))
+
+# ----------------- GOOGLE GEMINI (REST v1 – KHÔNG DÙNG SDK) -----------------
+def _gemini_payload(system_prompt: str, user_prompt: str) -> Dict:
+    return {
         "system_instruction": {"parts": [{"text": system_prompt}]},
         "contents": [{"role": "user", "parts": [{"text": user_prompt}]}],
         "generationConfig": {
@@ -76,15 +282,39 @@ Trả JSON: title_vi, bullets, so_what_vn, hashtags, attribution, url."""
             "response_mime_type": "application/json"
         }
     }
-    r = requests.post(endpoint, params={"key": GOOGLE_API_KEY}, json=payload, timeout=60)
+
+def _gemini_text(r) -> str:
+    if r.status_code == 429:
+        raise RateLimited("gemini", _retry_after(r.headers))
     if r.status_code != 200:
         raise RuntimeError(f"Gemini HTTP {r.status_code}: {r.text[:300]}")
     data = r.json()
+    usage = data.get("usageMetadata") or {}
+    _count_tokens("gemini", usage.get("promptTokenCount"), usage.get("candidatesTokenCount"))
     try:
-        text = data["candidates"][0]["content"]["parts"][0]["text"]
+        return data["candidates"][0]["content"]["parts"][0]["text"]
     except Exception:
         raise RuntimeError(f"Gemini response parse error: {json.dumps(data)[:300]}")
 
+def _gemini_generate(system_prompt: str, user_prompt: str) -> str:
+    if not GOOGLE_API_KEY:
+        raise RuntimeError("GOOGLE_API_KEY is missing")
+    with metrics.timer("llm_request_seconds", provider="gemini"):
+        r = llm.gemini_http().post(
+            llm.gemini_url(GEMINI_MODEL), params={"key": GOOGLE_API_KEY}, json=_gemini_payload(system_prompt, user_prompt)
+        )
+    return _gemini_text(r)
+
+async def _gemini_generate_async(system_prompt: str, user_prompt: str) -> str:
+    if not GOOGLE_API_KEY:
+        raise RuntimeError("GOOGLE_API_KEY is missing")
+    with metrics.timer("llm_request_seconds", provider="gemini"):
+        r = await llm.gemini_async_http().post(
+            llm.gemini_url(GEMINI_MODEL), params={"key": GOOGLE_API_KEY}, json=_gemini_payload(system_prompt, user_prompt)
+        )
+    return _gemini_text(r)
+
+def _gemini_summary(text: str, url: str, title: str, source: str) -> Dict:
     # Model đã được ép trả JSON string
     try:
         out = json.loads(text)
@@ -104,21 +334,323 @@ Trả JSON: title_vi, bullets, so_what_vn, hashtags, attribution, url."""
     out.setdefault("url", url or "")
     return out
 
+def _google_summary_rest(url: str, title: str, source: str, content: str) -> Dict:
+    text = _gemini_generate(GEMINI_SYSTEM, _user_prompt(url, title, source, content))
+    return _gemini_summary(text, url, title, source)
+
+async def _google_summary_async(url: str, title: str, source: str, content: str) -> Dict:
+    text = await _gemini_generate_async(GEMINI_SYSTEM, _user_prompt(url, title, source, content))
+    return _gemini_summary(text, url, title, source)
+
+async def _google_batch_async(articles) -> Dict:
+    return json.loads(await _gemini_generate_async(BATCH_SYSTEM, _batch_prompt(articles)))
+
+# ----------------- BATCH (nhiều bài / request) -----------------
+def _valid_item(item) -> bool:
+    return (
+        isinstance(item, dict)
+        and isinstance(item.get("title_vi"), str) and item["title_vi"].strip() != ""
+        and isinstance(item.get("bullets"), list) and len(item["bullets"]) > 0
+        and all(isinstance(b, str) for b in item["bullets"])
+        and isinstance(item.get("so_what_vn", ""), str)
+        and isinstance(item.get("hashtags", []), list)
+    )
+
+def _split_batch(data, n: int) -> List[Dict | None]:
+    """Tách kết quả batch theo id; phần tử thiếu/sai schema → None (sẽ tóm tắt lại riêng)."""
+    items = data.get("items") if isinstance(data, dict) else data
+    out = [None] * n
+    for item in items if isinstance(items, list) else []:
+        try:
+            i = int(item.pop("id"))
+        except (AttributeError, KeyError, TypeError, ValueError):
+            continue
+        if 0 <= i < n and out[i] is None and _valid_item(item):
+            out[i] = item
+    return out
+
+# ----------------- CACHE -----------------
+def cache_key(model: str, title: str, content: str) -> str:
+    # content = văn bản đã trích (condense), chuẩn hoá khoảng trắng, đúng như phần gửi cho LLM
+    text = re.sub(r"\s+", " ", (content or "")[:4000]).strip()
+    raw = json.dumps([PROMPT_VERSION, model, (title or "").strip(), text], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def _providers():
+    out = []
+    if OPENAI_API_KEY:
+        out.append(("openai", OPENAI_MODEL, _openai_summary))
+    if GOOGLE_API_KEY:
+        out.append(("gemini", GEMINI_MODEL, _google_summary_rest))
+    return out
+
+def _async_providers(batch: bool = False):
+    out = []
+    if OPENAI_API_KEY:
+        out.append(("openai", OPENAI_MODEL, _openai_batch_async if batch else _openai_summary_async))
+    if GOOGLE_API_KEY:
+        out.append(("gemini", GEMINI_MODEL, _google_batch_async if batch else _google_summary_async))
+    return out
+
+def _cache_keys(title: str, content: str):
+    return [cache_key(model, title, content) for _, model, _ in _providers()]
+
+def _cached(url: str, title: str, content: str, hits: Dict):
+    # ưu tiên theo đúng thứ tự provider
+    for key in _cache_keys(title, content):
+        if key in hits:
+            metrics.inc("summaries_total", source="cache")
+            return dict(hits[key], url=url or hits[key].get("url", ""))
+    return None
+
+def _offline(url: str, title: str, source: str, content: str) -> Dict:
+    metrics.inc("summaries_total", source="offline")
+    return _offline_summary(url, title, source, content)
+
 # ----------------- PUBLIC API -----------------
 def summarize_article(url: str, title: str, source: str, content: str) -> Dict:
-    # 1/ OpenAI (nếu có), 429/quota thì tự rơi xuống bước 2
-    if OPENAI_API_KEY:
+    content = condense(title, content)
+    hit = _cached(url, title, content, cache.get_many(_cache_keys(title, content)))
+    if hit is not None:
+        return hit
+
+    # OpenAI → Google REST v1 (không dùng SDK); 429/quota thì rơi xuống provider kế tiếp
+    for name, model, fn in _providers():
         try:
-            return _openai_summary(url, title, source, content)
+            out = fn(url, title, source, content)
+            cache.put(cache_key(model, title, content), model, out)
+            metrics.inc("summaries_total", source=name)
+            return out
         except Exception as e:
-            print(f"[summarizer] OpenAI failed → {e.__class__.__name__}. Trying Google REST...")
+            metrics.inc("llm_fallbacks_total", provider=name)
+            print(f"[summarizer] {name} failed → {e.__class__.__name__}. Trying next provider...")
 
-    # 2/ Google REST v1 (không dùng SDK)
-    if GOOGLE_API_KEY:
+    # Offline (không cache – rẻ, và để lần sau còn thử lại LLM)
+    return _offline(url, title, source, content)
+
+# ----------------- ASYNC SCHEDULER -----------------
+def _estimate_tokens(title: str, content: str) -> int:
+    # ~3 ký tự/token cho prompt (system + các câu trích) + ~700 token đầu ra
+    return (1200 + len(title or "") + min(len(content or ""), 4000)) // 3 + 700
+
+def make_limiters(shared: bool = False) -> Dict[str, ProviderLimiter]:
+    """shared: hạn mức nằm trong SQLite, chia chung giữa mọi process đang tóm tắt (job queue)."""
+    return {
+        "openai": ProviderLimiter(OPENAI_RPM, OPENAI_TPM, "openai" if shared else None),
+        "gemini": ProviderLimiter(GEMINI_RPM, GEMINI_TPM, "gemini" if shared else None),
+    }
+
+async def _call_with_backoff(name, fn, limiter: ProviderLimiter, tokens: int, *args):
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        await limiter.acquire(tokens)
+        try:
+            return await fn(*args)
+        except RateLimited as e:
+            if attempt == LLM_MAX_RETRIES:
+                raise
+            metrics.inc("llm_retries_total", provider=name)
+            delay = e.retry_after if e.retry_after is not None else min(60.0, 2.0 ** attempt)
+            # dừng cả provider, không chỉ request này
+            limiter.pause(delay)
+            print(f"[summarizer] {name} 429 → retry in {delay:.1f}s ({attempt + 1}/{LLM_MAX_RETRIES})")
+
+async def summarize_article_async(url: str, title: str, source: str, content: str, limiters=None,
+                                  run=asyncio.to_thread) -> Dict:
+    """Như summarize_article nhưng chạy trong event loop, có rate limit + backoff 429.
+
+    Phần chặn (trích câu, đọc / ghi cache) chạy qua run(fn, *args) → awaitable, mặc định
+    asyncio.to_thread; event loop chỉ chờ request LLM.
+    """
+    content = await run(condense, title, content)
+    hits = await run(cache.get_many, _cache_keys(title, content))
+    return await _summarize_async(url, title, source, content, limiters, hits, run)
+
+async def _summarize_async(url: str, title: str, source: str, content: str, limiters=None, hits=None,
+                           run=None) -> Dict:
+    # content: văn bản đã trích; run: như summarize_article_async, None = gọi thẳng
+    if hits is None:
+        hits = cache.get_many(_cache_keys(title, content))
+    hit = _cached(url, title, content, hits)
+    if hit is not None:
+        return hit
+    limiters = limiters or make_limiters()
+    tokens = _estimate_tokens(title, content)
+    for name, model, fn in _async_providers():
+        try:
+            out = await _call_with_backoff(name, fn, limiters[name], tokens, url, title, source, content)
+            if run is None:
+                cache.put(cache_key(model, title, content), model, out)
+            else:
+                await run(cache.put, cache_key(model, title, content), model, out)
+            metrics.inc("summaries_total", source=name)
+            return out
+        except Exception as e:
+            metrics.inc("llm_fallbacks_total", provider=name)
+            print(f"[summarizer] {name} failed → {e.__class__.__name__}. Trying next provider...")
+    if run is None:
+        return _offline(url, title, source, content)
+    return await run(_offline, url, title, source, content)
+
+async def _summarize_chunk(chunk, limiters, hits) -> List[Dict]:
+    """Gửi nhiều bài trong một request; bài nào kết quả lỗi/thiếu thì tóm tắt lại riêng."""
+    # system prompt chỉ gửi một lần cho cả chunk
+    tokens = sum(_estimate_tokens(title, content) - 400 for _, title, _, content in chunk) + 400
+    results = [None] * len(chunk)
+    for name, model, fn in _async_providers(batch=True):
         try:
-            return _google_summary_rest(url, title, source, content)
+            data = await _call_with_backoff(name, fn, limiters[name], tokens, chunk)
         except Exception as e:
-            print(f"[summarizer] Google REST failed → {e.__class__.__name__}. Using offline fallback...")
+            metrics.inc("llm_fallbacks_total", provider=name)
+            print(f"[summarizer] {name} batch failed → {e.__class__.__name__}. Trying next provider...")
+            continue
+        for k, item in enumerate(_split_batch(data, len(chunk))):
+            if item is not None:
+                url, title, source, content = chunk[k]
+                item.setdefault("attribution", source or "")
+                item["url"] = url or item.get("url", "")
+                cache.put(cache_key(model, title, content), model, item)
+                metrics.inc("summaries_total", source=name)
+                results[k] = item
+        break
+    missing = [k for k, r in enumerate(results) if r is None]
+    if missing:
+        print(f"[summarizer] batch: {len(missing)}/{len(chunk)} items invalid → summarizing individually")
+    for k in missing:
+        results[k] = await _summarize_async(*chunk[k], limiters=limiters, hits=hits)
+    return results
+
+async def summarize_many(articles, concurrency: int = SUMMARY_CONCURRENCY,
+                         batch_size: int = SUMMARY_BATCH_SIZE, limiters=None, on_result=None) -> List[Dict]:
+    """Tóm tắt song song list (url, title, source, content); kết quả giữ đúng thứ tự đầu vào.
+
+    batch_size > 1: gom tối đa batch_size bài chưa có trong cache vào một request LLM.
+    on_result(i, summary): gọi ngay khi bài thứ i xong (trong event loop), để lưu dần.
+    """
+    limiters = limiters or make_limiters()
+    done = on_result or (lambda i, r: None)
+    sem = asyncio.Semaphore(max(1, concurrency))
+    # trích câu cho cả lô một lần, từ đây content = văn bản gửi LLM
+    texts = condense_many([(title, content) for _, title, _, content in articles])
+    articles = [(url, title, source, text) for (url, title, source, _), text in zip(articles, texts)]
+    # tra cache cho cả lô bằng một query
+    hits = cache.get_many(k for _, title, _, content in articles for k in _cache_keys(title, content))
+
+    try:
+        if batch_size <= 1:
+            async def one(i, article):
+                async with sem:
+                    r = await _summarize_async(*article, limiters=limiters, hits=hits)
+                done(i, r)
+                return r
+
+            return await asyncio.gather(*(one(i, a) for i, a in enumerate(articles)))
+
+        results = [_cached(a[0], a[1], a[3], hits) for a in articles]
+        misses = [i for i, r in enumerate(results) if r is None]
+        for i, r in enumerate(results):
+            if r is not None:
+                done(i, r)
+
+        async def run_chunk(idx):
+            async with sem:
+                out = await _summarize_chunk([articles[i] for i in idx], limiters, hits)
+            for i, r in zip(idx, out):
+                results[i] = r
+                done(i, r)
+
+        await asyncio.gather(*(run_chunk(misses[i:i + batch_size]) for i in range(0, len(misses), batch_size)))
+        return results
+    finally:
+        await llm.aclose()
+
+# ----------------- OPENAI BATCH API (backfill không gấp, rẻ hơn ~50%) -----------------
+# Chỉ có cho provider chính (OpenAI): kết quả vào cache dưới khoá của OPENAI_MODEL. Bài mà
+# lượt chạy phải rơi xuống Gemini (OpenAI lỗi / 429 / không có key) vẫn gọi từng request,
+# giá đầy đủ — chưa có đường batch cho Gemini.
+def submit_openai_batch(articles) -> str | None:
+    """Đẩy list (url, title, source, content) lên OpenAI Batch API; trả batch id.
+
+    custom_id là cache_key của bài, nên collect_openai_batch chỉ cần ghi kết quả vào cache –
+    lần chạy pipeline sau sẽ lấy từ cache mà không gọi LLM. Giảm giá batch chỉ áp dụng cho
+    OpenAI; không có OPENAI_API_KEY thì không gửi gì (trả None).
+    """
+    if not OPENAI_API_KEY:
+        print("[summarizer] batch: OPENAI_API_KEY not set, Gemini has no batch path here")
+        return None
+    lines, seen = [], set()
+    texts = condense_many([(title, content) for _, title, _, content in articles])
+    for (url, title, source, _), content in zip(articles, texts):
+        key = cache_key(OPENAI_MODEL, title, content)
+        if key in seen:
+            continue
+        seen.add(key)
+        lines.append(json.dumps({
+            "custom_id": key,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": OPENAI_MODEL,
+                "messages": [{"role": "system", "content": OPENAI_SYSTEM},
+                             {"role": "user", "content": _user_prompt(url, title, source, content)}],
+                "temperature": 0.3,
+                "response_format": {"type": "json_object"},
+            },
+        }, ensure_ascii=False))
+    if not lines:
+        return None
+    client = llm.openai_client()
+    f = client.files.create(file=("summaries.jsonl", "\n".join(lines).encode("utf-8")), purpose="batch")
+    batch = client.batches.create(input_file_id=f.id, endpoint="/v1/chat/completions", completion_window="24h")
+    return batch.id
+
+def collect_openai_batch(batch_id: str) -> int | None:
+    """Ghi kết quả của batch đã xong vào cache; None nếu batch chưa xong."""
+    client = llm.openai_client()
+    batch = client.batches.retrieve(batch_id)
+    if batch.status != "completed":
+        print(f"[summarizer] batch {batch_id}: {batch.status}")
+        return None
+    stored = 0
+    for line in client.files.content(batch.output_file_id).text.splitlines():
+        rec = json.loads(line)
+        resp = rec.get("response") or {}
+        if resp.get("status_code") != 200:
+            continue
+        try:
+            item = json.loads(resp["body"]["choices"][0]["message"]["content"])
+        except (KeyError, IndexError, TypeError, ValueError):
+            continue
+        if _valid_item(item):
+            cache.put(rec["custom_id"], OPENAI_MODEL, item)
+            stored += 1
+    return stored
+
+if __name__ == "__main__":
+    # Backfill qua OpenAI Batch API (chỉ OpenAI, Gemini vẫn tóm tắt từng request lúc chạy):
+    #   python -m app.summarizer submit --days 7   → in batch id
+    #   python -m app.summarizer collect <batch_id> → ghi kết quả vào cache
+    import argparse
+    from datetime import datetime, timedelta
+    from sqlalchemy import select, func
+    from .db import SessionLocal
+    from .models import News, NewsContent
+
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p_submit = sub.add_parser("submit")
+    p_submit.add_argument("--days", type=float, default=7)
+    p_collect = sub.add_parser("collect")
+    p_collect.add_argument("batch_id")
+    args = ap.parse_args()
 
-    # 3/ Offline
-    return _offline_summary(url, title, source, content)
\ No newline at end of file
+    if args.cmd == "submit":
+        since = datetime.utcnow() - timedelta(days=args.days)
+        with SessionLocal() as s:
+            rows = s.execute(
+                select(News.url, News.title, News.source, func.unzstd(NewsContent.body))
+                .join(NewsContent, NewsContent.news_id == News.id)
+                .where(News.published_at >= since)
+            ).all()
+        print(submit_openai_batch([tuple(r) for r in rows]))
+    else:
+        print(collect_openai_batch(args.batch_id))
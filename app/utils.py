@@ -1,14 +1,100 @@
-import httpx, re
-from bs4 import BeautifulSoup
+import asyncio, re
+import numpy as np
+from collections import Counter
+from contextlib import asynccontextmanager
+from html.parser import HTMLParser
+from hashlib import blake2b
+from urllib.parse import urljoin, urlsplit
 
-def get_og_image(url: str):
+_HEAD_END = re.compile(r"</head\s*>|<body[\s>]", re.I)
+
+
+class _StopParsing(Exception):
+    pass
+
+
+class _OgImageParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.og_image = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "body":
+            raise _StopParsing
+        if tag != "meta":
+            return
+        a = dict(attrs)
+        prop = (a.get("property") or a.get("name") or "").lower()
+        if prop in ("og:image", "og:image:url", "og:image:secure_url") and a.get("content"):
+            self.og_image = a["content"].strip()
+            raise _StopParsing
+
+    def handle_endtag(self, tag):
+        if tag == "head":
+            raise _StopParsing
+
+
+def og_image_from_html(html: str, base_url: str | None = None):
+    """Lấy og:image từ HTML đã tải sẵn, chỉ parse phần <head>."""
+    if not html:
+        return None
+    m = _HEAD_END.search(html)
+    head = html[:m.start()] if m else html[:65536]
+    p = _OgImageParser()
     try:
-        r = httpx.get(url, timeout=15)
-        r.raise_for_status()
-        soup = BeautifulSoup(r.text, "html5lib")
-        tag = soup.find("meta", property="og:image")
-        if tag and tag.get("content"):
-            return tag["content"]
+        p.feed(head)
+    except _StopParsing:
+        pass
+    if not p.og_image:
         return None
-    except Exception:
+    return urljoin(base_url, p.og_image) if base_url else p.og_image
+
+
+_WORD = re.compile(r"\w+")
+SIMHASH_BANDS = 4
+SIMHASH_BAND_BITS = 16
+
+
+def simhash(text: str, shingle: int = 3):
+    """SimHash 64-bit (int có dấu, vừa cột INTEGER của SQLite) trên shingle 3 từ."""
+    words = _WORD.findall((text or "").lower())
+    if not words:
         return None
+    grams = Counter(" ".join(words[i:i + shingle]) for i in range(max(1, len(words) - shingle + 1)))
+    hashes = np.fromiter(
+        (int.from_bytes(blake2b(g.encode(), digest_size=8).digest(), "little") for g in grams),
+        dtype="<u8", count=len(grams),
+    )
+    weights = np.fromiter(grams.values(), dtype=np.int64, count=len(grams))
+    bits = np.unpackbits(hashes.view(np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+    votes = weights @ (bits.astype(np.int64) * 2 - 1)
+    return int(np.packbits(votes > 0, bitorder="little").view("<i8")[0])
+
+
+def simhash_bands(h: int):
+    u = h & 0xFFFFFFFFFFFFFFFF
+    mask = (1 << SIMHASH_BAND_BITS) - 1
+    return [(u >> (SIMHASH_BAND_BITS * i)) & mask for i in range(SIMHASH_BANDS)]
+
+
+def hamming(a: int, b: int) -> int:
+    return ((a ^ b) & 0xFFFFFFFFFFFFFFFF).bit_count()
+
+
+class HostLimiter:
+    """Giới hạn số request đồng thời: tổng cộng và trên từng host."""
+
+    def __init__(self, total: int, per_host: int):
+        self._total = asyncio.Semaphore(max(1, total))
+        self._per_host = max(1, per_host)
+        self._hosts: dict[str, asyncio.Semaphore] = {}
+
+    @asynccontextmanager
+    async def slot(self, url: str):
+        host = (urlsplit(url).hostname or "").lower()
+        sem = self._hosts.get(host)
+        if sem is None:
+            sem = self._hosts[host] = asyncio.Semaphore(self._per_host)
+        # chờ slot của host trước: task của host đang đầy không được giữ slot tổng khi chờ
+        async with sem, self._total:
+            yield
@@ -0,0 +1,105 @@
+"""Độ trễ API (p50/p99, lỗi "database is locked") khi pipeline đang ghi cùng lúc.
+
+    python -m bench.api_under_write --seconds 10
+
+Chạy hai lượt trên hai DB tạm: SQLITE_PRAGMAS=0 (mặc định của SQLite, journal
+rollback) và SQLITE_PRAGMAS=1 (WAL + synchronous=NORMAL + busy_timeout ...).
+Writer là một process riêng, mỗi transaction thêm 2000 bài và giữ khoá ghi ~200ms
+như khi pipeline commit một lô.
+"""
+import argparse, json, os, subprocess, sys, tempfile, time
+from datetime import datetime, timedelta
+
+def _seed(n):
+    from sqlalchemy import text
+    from app.content import compress
+    from app.db import SessionLocal, init_db
+    from app.models import News, Summary, Picks
+    from app.publish import today_str
+    from app.publish import materialize_picks
+    init_db()
+    now = datetime.utcnow()
+    with SessionLocal() as s:
+        s.execute(News.__table__.insert(), [
+            {"url": f"https://seed/{i}", "title": f"Seed AI {i}", "source": "bench",
+             "published_at": now - timedelta(minutes=i), "fetched_at": now, "social_score": 0.0,
+             "content_len": 2400}
+            for i in range(n)
+        ])
+        s.execute(text("INSERT INTO news_content (news_id, body) SELECT id, :b FROM news"),
+                  {"b": compress("lorem ipsum " * 200)})
+        for r in range(1, 11):
+            s.add(Summary(id=r, news_id=r, title_vi=f"Tin {r}", bullets_json='["a","b","c"]', so_what_vn="",
+                          hashtags="#AInews", attribution="bench", url=f"https://seed/{r}"))
+            s.add(Picks(date_str=today_str(), rank=r, news_id=r, summary_id=r))
+        s.flush()
+        materialize_picks(s, today_str())
+        s.commit()
+
+def _writer(seconds):
+    from sqlalchemy import text
+    from app.content import compress
+    from app.db import engine
+    end, k = time.time() + seconds, 0
+    body = compress("x" * 2000)
+    while time.time() < end:
+        with engine.begin() as conn:
+            last = conn.execute(text("SELECT COALESCE(MAX(id), 0) FROM news")).scalar()
+            conn.execute(text(
+                "INSERT INTO news (url, title, source, published_at, fetched_at, social_score, content_len) "
+                "VALUES (:u, 'w', 'bench', :t, :t, 0, 2000)"
+            ), [{"u": f"https://w/{k}/{i}", "t": datetime.utcnow()} for i in range(2000)])
+            conn.execute(text("INSERT INTO news_content (news_id, body) SELECT id, :b FROM news WHERE id > :last"),
+                         {"b": body, "last": last})
+            time.sleep(0.2)
+        k += 1
+
+def _reader(seconds):
+    from fastapi.testclient import TestClient
+    from app import api
+    api.picks_pages.interval = 0  # mỗi request đều chạm DB
+    client = TestClient(api.app).__enter__()  # chạy lifespan
+    lat, errors = [], 0
+    end = time.time() + seconds
+    while time.time() < end:
+        t0 = time.perf_counter()
+        try:
+            r = client.get("/api/picks/today")
+            ok = r.status_code == 200
+        except Exception:
+            ok = False
+        lat.append(time.perf_counter() - t0)
+        errors += not ok
+    lat.sort()
+    pct = lambda p: round(lat[min(len(lat) - 1, int(p * len(lat)))] * 1000, 2)
+    return {"requests": len(lat), "errors": errors, "p50_ms": pct(0.50), "p99_ms": pct(0.99), "max_ms": pct(1.0)}
+
+def run(seconds, seed):
+    _seed(seed)
+    writer = subprocess.Popen([sys.executable, "-m", "bench.api_under_write", "--role", "writer",
+                               "--seconds", str(seconds)], env=os.environ)
+    time.sleep(0.5)
+    res = _reader(seconds - 1)
+    writer.wait()
+    return res
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--seconds", type=float, default=10)
+    ap.add_argument("--seed", type=int, default=20000)
+    ap.add_argument("--role", choices=["main", "writer", "run"], default="main")
+    args = ap.parse_args(argv)
+    if args.role == "writer":
+        return _writer(args.seconds)
+    if args.role == "run":
+        res = run(args.seconds, args.seed)
+        print(json.dumps({"sqlite_pragmas": os.environ.get("SQLITE_PRAGMAS"), **res}), flush=True)
+        return
+    for pragmas in ("0", "1"):
+        env = dict(os.environ, SQLITE_PRAGMAS=pragmas,
+                   DB_PATH=os.path.join(tempfile.mkdtemp(prefix="bench_api_"), "bench.db"))
+        subprocess.run([sys.executable, "-m", "bench.api_under_write", "--role", "run",
+                        "--seconds", str(args.seconds), "--seed", str(args.seed)], env=env, check=True)
+
+if __name__ == "__main__":
+    main()
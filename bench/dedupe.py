@@ -0,0 +1,99 @@
+"""Benchmark dedupe_titles trên DB SQLite tạm với tiêu đề tổng hợp.
+
+    python -m bench.dedupe                 # 10k, 100k, 1M
+    python -m bench.dedupe 10000 --check   # so kết quả với bản so cặp O(n²)
+
+Mỗi kích thước đo: lần chạy đầu (xây chỉ mục cho toàn bảng) và một lần chạy tăng
+dần với 1000 bài mới.
+"""
+import argparse, json, os, random, sqlite3, subprocess, sys, tempfile, time
+
+def _vocab(rng, n=30000):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return [''.join(rng.choice(letters) for _ in range(rng.randint(3, 10))) for _ in range(n)]
+
+def synth_titles(n, seed=0, dup_rate=0.05):
+    """Tiêu đề giả: từ theo phân bố Zipf + một từ khoá AI; ~dup_rate là bản chỉnh nhẹ của bài trước."""
+    rng = random.Random(seed)
+    vocab = _vocab(rng)
+    cum, acc = [], 0.0
+    for r in range(len(vocab)):
+        acc += 1.0 / (r + 1)
+        cum.append(acc)
+    kws = ["AI", "OpenAI", "LLM", "GPT", "agent", "Anthropic", "DeepMind"]
+    out = []
+    for i in range(n):
+        if out and rng.random() < dup_rate:
+            words = rng.choice(out[-5000:]).split()
+            if len(words) > 4 and rng.random() < 0.5:
+                words.pop(rng.randrange(len(words)))
+            else:
+                words.insert(rng.randrange(len(words)), rng.choice(kws))
+        else:
+            words = rng.choices(vocab, cum_weights=cum, k=rng.randint(6, 12))
+            words.insert(rng.randrange(len(words)), rng.choice(kws))
+        out.append(" ".join(words))
+    return out
+
+def _seed(path, titles, start=0):
+    con = sqlite3.connect(path)
+    con.executemany(
+        "INSERT INTO news (url, title, source, published_at, fetched_at, social_score) "
+        "VALUES (?, ?, 'bench', '2025-01-01 00:00:00', '2025-01-01 00:00:00', 0)",
+        ((f"https://bench.local/{start + i}", t) for i, t in enumerate(titles)),
+    )
+    con.commit()
+    con.close()
+
+def _brute_force(titles, threshold=90):
+    from rapidfuzz import fuzz
+    dropped = set()
+    for i in range(len(titles)):
+        if i in dropped:
+            continue
+        for j in range(i + 1, len(titles)):
+            if j not in dropped and fuzz.token_set_ratio(titles[i], titles[j]) >= threshold:
+                dropped.add(j)
+    return len(dropped)
+
+def run(n, check=False):
+    # DB_PATH phải được đặt trước khi import app (xem main)
+    from app.db import engine, init_db
+    from app import dedupe
+    path = engine.url.database
+    init_db()
+
+    titles = synth_titles(n + 1000)
+    _seed(path, titles[:n])
+    t0 = time.perf_counter()
+    removed = dedupe.dedupe_titles()
+    full_s = time.perf_counter() - t0
+
+    _seed(path, titles[n:], start=n)
+    t0 = time.perf_counter()
+    removed_inc = dedupe.dedupe_titles()
+    inc_s = time.perf_counter() - t0
+
+    res = {"n": n, "full_s": round(full_s, 3), "removed": removed,
+           "incremental_1k_s": round(inc_s, 3), "removed_incremental": removed_inc}
+    if check:
+        res["brute_force_removed"] = _brute_force(titles)
+    return res
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("sizes", nargs="*", type=int, default=[10_000, 100_000, 1_000_000])
+    ap.add_argument("--check", action="store_true", help="so với bản O(n²) (chỉ nên dùng cho n nhỏ)")
+    ap.add_argument("--one", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+    if args.one:
+        print(json.dumps(run(args.sizes[0], args.check)), flush=True)
+        return
+    # mỗi kích thước chạy trong một process riêng với DB tạm riêng
+    for n in args.sizes:
+        env = dict(os.environ, DB_PATH=os.path.join(tempfile.mkdtemp(prefix="bench_dedupe_"), "bench.db"))
+        cmd = [sys.executable, "-m", "bench.dedupe", str(n), "--one"] + (["--check"] if args.check else [])
+        subprocess.run(cmd, env=env, check=True)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+"""Đo độ trễ + số kết nối TCP của lớp provider LLM trên server giả lập (bench/stub_llm.py).
+
+    python -m bench.llm_clients -n 40 --latency 0.1
+
+So sánh: sync với client dùng chung, sync dựng client mới mỗi lần (như code cũ),
+và summarize_many (async, chạy song song).
+"""
+import argparse, asyncio, json, os, tempfile, time
+
+from bench.stub_llm import start_stub
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-n", type=int, default=40)
+    ap.add_argument("--latency", type=float, default=0.1)
+    ap.add_argument("--provider", choices=["openai", "gemini"], default="openai")
+    args = ap.parse_args(argv)
+
+    server, base = start_stub(latency=args.latency)
+    os.environ["DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="bench_llm_"), "bench.db")
+    os.environ["OPENAI_BASE_URL"] = f"{base}/v1"
+    os.environ["GEMINI_BASE_URL"] = base
+    # đo client, không đo rate limiter
+    os.environ.setdefault("GEMINI_RPM", "100000")
+    if args.provider == "openai":
+        os.environ["OPENAI_API_KEY"] = "stub"
+        os.environ.pop("GOOGLE_API_KEY", None)
+    else:
+        os.environ["OPENAI_API_KEY"] = ""
+        os.environ["GOOGLE_API_KEY"] = "stub"
+
+    from app.db import init_db
+    from app import llm, summarizer
+    init_db()
+
+    def articles(tag):
+        # nội dung khác nhau để không trúng cache
+        return [(f"https://x/{tag}/{i}", f"Title {tag} {i}", "bench", f"{tag} body {i} " * 50) for i in range(args.n)]
+
+    def measure(name, fn):
+        c0, r0 = server.connections, server.requests
+        t0 = time.perf_counter()
+        fn()
+        dt = time.perf_counter() - t0
+        res = {"case": name, "n": args.n, "wall_s": round(dt, 3),
+               "per_call_ms": round(dt / args.n * 1000, 1),
+               "connections": server.connections - c0, "requests": server.requests - r0}
+        print(json.dumps(res))
+
+    measure("sync_pooled", lambda: [summarizer.summarize_article(*a) for a in articles("pooled")])
+
+    def fresh():
+        for a in articles("fresh"):
+            llm._sync.clear()  # bỏ client dùng chung → mỗi lần một kết nối mới
+            summarizer.summarize_article(*a)
+    measure("sync_fresh_client", fresh)
+
+    measure("async_summarize_many", lambda: asyncio.run(summarizer.summarize_many(articles("async"))))
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Load test một endpoint API trên một worker uvicorn: throughput + p50/p99.
+
+    python -m bench.load_api --seconds 10 --concurrency 64
+    python -m bench.load_api --path "/api/news?limit=100&before=2026-01-01"
+    python -m bench.load_api --url http://127.0.0.1:8000   # server có sẵn
+
+Mặc định seed một DB tạm (20k bài, 10 picks), chạy uvicorn 1 worker trong process
+riêng rồi bắn request qua các kết nối keep-alive. --check-interval 0 bắt mọi request
+đi xuống DB (không dùng page đã cache trong process).
+"""
+import argparse, asyncio, json, os, socket, subprocess, sys, tempfile, time
+from urllib.parse import urlsplit
+
+SERVER = (
+    "import sys, uvicorn; from app import api; "
+    "api.picks_pages.interval = float(sys.argv[1]); "
+    "uvicorn.run(api.app, host='127.0.0.1', port=int(sys.argv[2]), log_level='warning')"
+)
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _wait(url, timeout=30):
+    import httpx
+    end = time.time() + timeout
+    while time.time() < end:
+        try:
+            httpx.get(url + "/api/picks/today", timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise SystemExit(f"server at {url} did not start")
+
+async def _request(reader, writer, req):
+    writer.write(req)
+    head = await reader.readuntil(b"\r\n\r\n")
+    length, chunked = 0, False
+    for line in head.split(b"\r\n"):
+        name, _, value = line.partition(b":")
+        if name.lower() == b"content-length":
+            length = int(value)
+        elif name.lower() == b"transfer-encoding":
+            chunked = b"chunked" in value.lower()
+    if not chunked:
+        await reader.readexactly(length)
+    # StreamingResponse → chunked encoding
+    while chunked and (size := int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)):
+        await reader.readexactly(size + 2)
+    if chunked:
+        await reader.readuntil(b"\r\n")
+    return int(head.split(b" ", 2)[1])
+
+async def _load(url, path, seconds, concurrency):
+    # client HTTP/1.1 keep-alive tối giản trên asyncio streams: httpx.AsyncClient với
+    # nhiều kết nối tốn CPU hơn chính server khi cả hai chạy chung máy
+    host, port = urlsplit(url).hostname, urlsplit(url).port or 80
+    req = f"GET {path} HTTP/1.1\r\nHost: {host}\r\nAccept-Encoding: gzip\r\n\r\n".encode()
+    lat, errors = [], 0
+    end = time.perf_counter() + seconds
+
+    async def user():
+        nonlocal errors
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            while time.perf_counter() < end:
+                t0 = time.perf_counter()
+                try:
+                    errors += await _request(reader, writer, req) != 200
+                except (OSError, asyncio.IncompleteReadError):
+                    errors += 1
+                    writer.close()
+                    reader, writer = await asyncio.open_connection(host, port)
+                lat.append(time.perf_counter() - t0)
+        finally:
+            writer.close()
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - t0
+    lat.sort()
+    pct = lambda p: round(lat[min(len(lat) - 1, int(len(lat) * p))] * 1000, 2) if lat else None
+    return {
+        "requests": len(lat), "errors": errors, "rps": round(len(lat) / elapsed, 1),
+        "p50_ms": pct(0.50), "p99_ms": pct(0.99),
+    }
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--url", help="bench server có sẵn thay vì tự chạy uvicorn")
+    ap.add_argument("--path", default="/api/picks/today")
+    ap.add_argument("--seconds", type=float, default=10)
+    ap.add_argument("--concurrency", type=int, default=64)
+    ap.add_argument("--rows", type=int, default=20000)
+    ap.add_argument("--check-interval", type=float, default=0)
+    args = ap.parse_args()
+
+    proc = None
+    url = args.url
+    if url is None:
+        tmp = tempfile.mkdtemp()
+        env = dict(os.environ, DB_PATH=os.path.join(tmp, "load.db"))
+        subprocess.run([sys.executable, "-c", f"from bench.api_under_write import _seed; _seed({args.rows})"],
+                       env=env, check=True)
+        port = _free_port()
+        proc = subprocess.Popen([sys.executable, "-c", SERVER, str(args.check_interval), str(port)], env=env)
+        url = f"http://127.0.0.1:{port}"
+    try:
+        _wait(url)
+        asyncio.run(_load(url, args.path, 1, args.concurrency))  # warm-up
+        res = _load(url, args.path, args.seconds, args.concurrency)
+        print(json.dumps({"path": args.path, "concurrency": args.concurrency, **asyncio.run(res)}))
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""So sánh pipeline batch (từng stage chạy hết) với --stream trên feed / trang / LLM giả lập.
+
+    python -m bench.pipeline_stream
+    python -m bench.pipeline_stream --feeds 20 --entries 40 --page-latency 0.3 --llm-latency 0.8
+
+Feed / trang bài do bench/stub_site.py giả lập (mỗi feed một host loopback, độ trễ feed
+tăng dần từ --feed-latency tới 10 lần giá trị đó), LLM là bench/stub_llm.py. Mỗi chế độ
+chạy trên một DB tạm mới trong process riêng. first_summary_s = lúc bản tóm tắt đầu tiên xong, tính từ đầu lượt chạy.
+"""
+import argparse, json, os, subprocess, sys, tempfile, time
+
+from bench.stub_llm import start_stub
+from bench.stub_site import start_site, write_sources
+
+def run_one(stream):
+    # chạy trong process con: DB_PATH, endpoint LLM ... đã đặt qua env
+    from app import ingest, summarizer
+    from app import stream as stream_mod
+    from app.pipeline import run_pipeline
+    ingest.SOURCES = os.environ["BENCH_SOURCES"]
+    t0 = time.perf_counter()
+    first = []
+    orig = summarizer.summarize_article_async
+
+    async def timed(*args, **kw):
+        out = await orig(*args, **kw)
+        first.append(time.perf_counter() - t0)
+        return out
+
+    summarizer.summarize_article_async = stream_mod.summarize_article_async = timed
+    stats = run_pipeline(resume=False, stream=stream)
+    return {"mode": "stream" if stream else "batch", "wall_s": round(time.perf_counter() - t0, 2),
+            "first_summary_s": round(min(first), 2) if first else None,
+            "new_items": stats.get("new_items"), "extracted": stats.get("extracted"), "picks": stats.get("picks")}
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--feeds", type=int, default=14)
+    ap.add_argument("--entries", type=int, default=30)
+    ap.add_argument("--feed-latency", type=float, default=0.3)
+    ap.add_argument("--page-latency", type=float, default=0.3)
+    ap.add_argument("--llm-latency", type=float, default=0.8)
+    ap.add_argument("--modes", default="batch,stream")
+    ap.add_argument("--one", choices=["batch", "stream"], help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+    if args.one:
+        print(json.dumps(run_one(args.one == "stream")), flush=True)
+        return
+
+    site = start_site(feeds=args.feeds, entries=args.entries, feed_latency=args.feed_latency,
+                      page_latency=args.page_latency)
+    llm, base = start_stub(latency=args.llm_latency)
+    tmp = tempfile.mkdtemp(prefix="bench_stream_")
+    sources = write_sources(os.path.join(tmp, "sources.yaml"), site)
+    for mode in args.modes.split(","):
+        env = dict(os.environ, DB_PATH=os.path.join(tempfile.mkdtemp(dir=tmp), "bench.db"), BENCH_SOURCES=sources,
+                   OPENAI_API_KEY="stub", OPENAI_BASE_URL=f"{base}/v1", GOOGLE_API_KEY="")
+        r0 = llm.requests
+        out = subprocess.run([sys.executable, "-m", "bench.pipeline_stream", "--one", mode],
+                             env=env, check=True, capture_output=True, text=True).stdout
+        res = json.loads(out.strip().splitlines()[-1])
+        res["llm_requests"] = llm.requests - r0
+        print(json.dumps(res), flush=True)
+    site.shutdown()
+    llm.shutdown()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""Benchmark rank_recent (+ diversify/MMR) trên DB SQLite tạm với N bài trong cửa sổ ứng viên.
+
+Vector của bài là vector ngẫu nhiên đã chuẩn hoá ghi thẳng vào VectorStore; mmr_full
+chạy MMR trên toàn bộ ứng viên thay vì PICK_POOL.
+
+    python -m bench.ranker                 # 10k, 100k
+    python -m bench.ranker 500000
+"""
+import argparse, json, os, random, sqlite3, subprocess, sys, tempfile, time
+from datetime import datetime, timedelta
+
+def _seed(path, n):
+    from app.ranker import SOURCE_WEIGHT, TOPIC_WEIGHT
+    rng = random.Random(0)
+    sources = list(SOURCE_WEIGHT) + ["Blog A", "Blog B", "Blog C"]
+    tags = list(TOPIC_WEIGHT) + ["misc"]
+    now = datetime.utcnow()
+    con = sqlite3.connect(path)
+    con.executemany(
+        "INSERT INTO news (url, title, source, published_at, fetched_at, social_score, content_len, topic_tags) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (
+            (f"https://bench.local/{i}", f"t{i}", rng.choice(sources),
+             str(now - timedelta(minutes=rng.uniform(0, 60 * 70))), str(now),
+             rng.expovariate(1 / 20), rng.choice([150, 300, 5000]),
+             ",".join(rng.sample(tags, rng.randint(0, 2))))
+            for i in range(n)
+        ),
+    )
+    con.commit()
+    con.close()
+
+def _p50_ms(fn, repeat):
+    lat = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        lat.append(time.perf_counter() - t0)
+    lat.sort()
+    return round(lat[len(lat) // 2] * 1000, 1)
+
+def run(n, repeat):
+    # DB_PATH phải được đặt trước khi import app (xem main)
+    import numpy as np
+    from app.config import PICK_POOL, EMBED_DIM
+    from app.db import engine, init_db
+    from app.embed import VectorStore
+    from app.ranker import rank_recent, diversify, mmr_select
+    init_db()
+    _seed(engine.url.database, n)
+    store = VectorStore()
+    vecs = np.random.default_rng(0).standard_normal((n, EMBED_DIM)).astype(np.float32)
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+    store.put(np.arange(1, n + 1), vecs)
+
+    top = rank_recent(10)
+    everything = rank_recent(n)
+    scores = np.array([sc for sc, _ in everything], dtype=np.float32)
+    all_vecs = store.get([nid for _, nid in everything])
+    return {
+        "n": n, "candidates": len(everything),
+        "rank_p50_ms": _p50_ms(lambda: rank_recent(10), repeat),
+        "rank_diversify_p50_ms": _p50_ms(lambda: diversify(rank_recent(PICK_POOL), 10, store), repeat),
+        "mmr_full_p50_ms": _p50_ms(lambda: mmr_select(scores, all_vecs, 10), repeat),
+        "top_score": round(top[0][0], 4),
+    }
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("sizes", nargs="*", type=int, default=[10_000, 100_000])
+    ap.add_argument("--repeat", type=int, default=10)
+    ap.add_argument("--one", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+    if args.one:
+        print(json.dumps(run(args.sizes[0], args.repeat)), flush=True)
+        return
+    for n in args.sizes:
+        env = dict(os.environ, DB_PATH=os.path.join(tempfile.mkdtemp(prefix="bench_ranker_"), "bench.db"))
+        subprocess.run([sys.executable, "-m", "bench.ranker", str(n), "--one", "--repeat", str(args.repeat)],
+                       env=env, check=True)
+
+if __name__ == "__main__":
+    sys.exit(main())
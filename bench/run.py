@@ -0,0 +1,366 @@
+"""Bộ benchmark offline: feed / trang bài / LLM giả lập, DB seed sẵn, kết quả lưu JSON.
+
+    python -m bench.run                          # bộ nhanh (~1 phút)
+    python -m bench.run --full                   # 10k → 1M bài
+    python -m bench.run --only api,rank --compare bench/results/<file>.json
+
+Kịch bản: ingest (ingest_once lạnh + lần hai toàn 304), ingest_write (ghi N bài qua
+insert_news, 1/10 là URL đã có; maxrss gồm cả page cache SQLite, tối đa SQLITE_CACHE_MB),
+extract (extract_missing_text: bài liền id cùng host như ingest ghi, và host xen kẽ), dedupe (dedupe_titles đầy đủ + tăng dần), rank (rank_recent + diversify), condense (trích
+câu trước khi gọi LLM), summarize (summarize_many, có 429), api (load test các endpoint), startup (import app.api: thời
+gian, RSS, số thư viện pipeline bị nạp theo; spawn uvicorn → response đầu; python -m app --help),
+jobs (job queue app.jobs với 1, 2, 4 process worker: jobs/s, chi phí claim + finish mỗi job). Mỗi kịch bản × kích thước chạy
+trong một process riêng trên DB tạm mới; feed / trang bài do bench/stub_site.py và LLM
+do bench/stub_llm.py phục vụ từ process này.
+Kết quả ghi vào bench/results/<thời điểm>-<commit>.json; --compare in chênh lệch (%) của
+từng số đo với một file kết quả cũ (_s/_ms/_mb: thấp hơn là tốt, rps: cao hơn là tốt).
+"""
+import argparse, asyncio, json, os, platform, subprocess, sys, tempfile, time
+from datetime import datetime
+
+from bench.stub_llm import start_stub
+from bench.stub_site import start_site, write_sources, page_url
+
+RESULTS = os.path.join(os.path.dirname(__file__), "results")
+
+PROFILES = {
+    "quick": {
+        "ingest": [420], "ingest_write": [100_000], "extract": [300], "dedupe": [10_000], "rank": [10_000],
+        "condense": [1000], "summarize": [60], "api": [20_000], "startup": [5], "jobs": [2000],
+    },
+    "full": {
+        "ingest": [420, 2000], "ingest_write": [100_000, 1_000_000], "extract": [2000], "dedupe": [100_000, 1_000_000], "rank": [100_000],
+        "condense": [10_000], "summarize": [400], "api": [100_000, 1_000_000], "startup": [10], "jobs": [20_000],
+    },
+}
+FEEDS = 14
+EXTRACT_HOSTS = 20
+API_PATHS = ["/api/picks/today", "/api/news?limit=50", "/api/summaries?limit=10", "/api/search?q=OpenAI"]
+
+def _metric(snapshot, name, **labels):
+    return sum(v if not isinstance(v, list) else v[-1] for n, lab, v in snapshot
+               if n == name and all(lab.get(k) == str(x) or lab.get(k) == x for k, x in labels.items()))
+
+# ---- kịch bản: chạy trong process con, DB_PATH / endpoint giả lập đặt qua env ----
+
+def scenario_ingest(n, opts):
+    from app import ingest, metrics
+    ingest.SOURCES = os.environ["BENCH_SOURCES"]
+    t0 = time.perf_counter()
+    added = ingest.ingest_once()
+    cold = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    again = ingest.ingest_once()
+    warm = time.perf_counter() - t0
+    snap = metrics.snapshot()
+    return {"new_items": added, "cold_s": round(cold, 3), "warm_304_s": round(warm, 3), "second_run_new": again,
+            "not_modified": _metric(snap, "http_fetch_total", kind="feed", status=304)}
+
+def scenario_ingest_write(n, opts):
+    import resource
+    from app.db import SessionLocal, init_db
+    from app.ingest import INSERT_CHUNK, insert_news, normalize_url
+    from bench.dedupe import synth_titles
+    init_db()
+    titles = synth_titles(min(n, 20_000), seed=5, dup_rate=0)
+    now = datetime.utcnow()
+    added, rss0 = 0, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    t0 = time.perf_counter()
+    with SessionLocal() as s:
+        for lo in range(0, n, INSERT_CHUNK):
+            rows = [{"url": normalize_url(f"https://Bench.local/{i - i % 10 if i % 10 == 9 else i}/?utm_source=rss"),
+                     "title": titles[i % len(titles)], "source": "bench", "published_at": now}
+                    for i in range(lo, min(n, lo + INSERT_CHUNK))]
+            added += len(insert_news(s, rows))
+        s.commit()
+    dt = time.perf_counter() - t0
+    return {"inserted": added, "wall_s": round(dt, 3), "rows_rps": round(n / dt),
+            "maxrss_growth_mb": round((resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss0) / 1024, 1)}
+
+def scenario_extract(n, opts):
+    from app.db import engine, init_db
+    from app.extract import extract_missing_text
+    init_db()
+    port = int(os.environ["BENCH_SITE_PORT"])
+    per_host = -(-n // EXTRACT_HOSTS)
+    out = {}
+    # contiguous: bài liền id cùng host, như ingest ghi theo từng feed; interleaved: host xen kẽ
+    for case, url in (("", lambda i: page_url(port, i // per_host, i % per_host)),
+                      ("interleaved_", lambda i: page_url(port, i % EXTRACT_HOSTS, per_host + i // EXTRACT_HOSTS))):
+        with engine.begin() as conn:
+            conn.exec_driver_sql(
+                "INSERT INTO news (url, title, source, published_at, fetched_at, social_score) "
+                "VALUES (?, ?, 'bench', datetime('now'), datetime('now'), 0)",
+                [(url(i), f"AI bench {case}{i}") for i in range(n)],
+            )
+        t0 = time.perf_counter()
+        done = asyncio.run(extract_missing_text())
+        dt = time.perf_counter() - t0
+        out.update({f"{case}extracted": done, f"{case}wall_s": round(dt, 3), f"{case}pages_rps": round(n / dt, 1)})
+    return out
+
+def scenario_dedupe(n, opts):
+    from bench.dedupe import run
+    return run(n)
+
+def scenario_rank(n, opts):
+    from bench.ranker import run
+    return run(n, opts["repeat"])
+
+def _articles(n, chars=5000, seed=0):
+    # bài giả: câu ghép từ tiêu đề tổng hợp, kèm byline / cookie / newsletter như trang thật
+    import random
+    from bench.dedupe import synth_titles
+    rng = random.Random(seed)
+    titles = synth_titles(max(2000, n), seed=7, dup_rate=0)
+    out = []
+    for i in range(n):
+        body, size = [], 0
+        while size < chars:
+            body.append(" ".join(rng.sample(titles, 2)).capitalize() + ".")
+            size += len(body[-1]) + 1
+        out.append((f"https://bench.local/{i}", titles[i], "bench",
+                    "By Jane Doe | Oct 3\nAccept cookies to continue reading.\n" + " ".join(body)
+                    + "\nSubscribe to our newsletter for more AI news."))
+    return out
+
+def scenario_condense(n, opts):
+    from app.summarizer import condense_many
+    docs = [(title, content) for _, title, _, content in _articles(n)]
+    t0 = time.perf_counter()
+    texts = [t for i in range(0, n, 100) for t in condense_many(docs[i:i + 100])]
+    dt = time.perf_counter() - t0
+    return {"wall_s": round(dt, 3), "articles_rps": round(n / dt), "chars_in": sum(len(c) for _, c in docs) // n,
+            "chars_out": sum(map(len, texts)) // n}
+
+def scenario_summarize(n, opts):
+    from app.db import init_db
+    from app import metrics, summarizer
+    init_db()
+    articles = _articles(n)
+    t0 = time.perf_counter()
+    asyncio.run(summarizer.summarize_many(articles))
+    cold = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    asyncio.run(summarizer.summarize_many(articles))
+    cached = time.perf_counter() - t0
+    snap = metrics.snapshot()
+    return {"wall_s": round(cold, 3), "per_article_ms": round(cold / n * 1000, 1), "cached_wall_s": round(cached, 3),
+            "retries": _metric(snap, "llm_retries_total"), "llm_requests": _metric(snap, "llm_request_seconds"),
+            "prompt_tokens": _metric(snap, "llm_tokens_total", kind="prompt")}
+
+def scenario_api(n, opts):
+    from bench.seed import seed_news
+    from bench.load_api import SERVER, _free_port, _wait, _load
+    seeded = seed_news(n, content_words=30)
+    port = _free_port()
+    proc = subprocess.Popen([sys.executable, "-c", SERVER, "1", str(port)], env=os.environ)
+    url = f"http://127.0.0.1:{port}"
+    out = {"seed_s": seeded["seed_s"]}
+    try:
+        _wait(url)
+        for path in API_PATHS:
+            asyncio.run(_load(url, path, 0.5, opts["concurrency"]))  # warm-up
+            res = asyncio.run(_load(url, path, opts["seconds"], opts["concurrency"]))
+            key = path.split("?")[0].rsplit("/", 1)[-1]
+            out.update({f"{key}_rps": res["rps"], f"{key}_p50_ms": res["p50_ms"], f"{key}_p99_ms": res["p99_ms"],
+                        f"{key}_errors": res["errors"]})
+    finally:
+        proc.terminate()
+        proc.wait()
+    return out
+
+# process con: thời gian import app.api, RSS sau import và các thư viện nặng của pipeline lỡ bị nạp theo
+STARTUP_PROBE = (
+    "import json, resource, sys, time; t0 = time.perf_counter(); import app.api; "
+    "heavy = ('trafilatura', 'feedparser', 'bs4', 'yaml', 'numpy', 'httpx', 'openai', 'google'); "
+    "print(json.dumps({'import_ms': (time.perf_counter() - t0) * 1000, "
+    "'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, "
+    "'heavy': sorted(m for m in heavy if m in sys.modules)}))"
+)
+
+def scenario_startup(n, opts):
+    # API cold start: import + RSS (n lần, lấy trung vị), spawn uvicorn → response đầu tiên,
+    # và `python -m app --help` (CLI chỉ import lười)
+    import httpx
+    from statistics import median
+    from bench.load_api import SERVER, _free_port
+    probes = [json.loads(subprocess.run([sys.executable, "-c", STARTUP_PROBE], env=os.environ, check=True,
+                                        capture_output=True, text=True).stdout) for _ in range(n)]
+    first = []
+    for _ in range(n):
+        port = _free_port()
+        t0 = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, "-c", SERVER, "1", str(port)], env=os.environ)
+        try:
+            while True:
+                try:
+                    httpx.get(f"http://127.0.0.1:{port}/api/picks/today", timeout=1)
+                    break
+                except httpx.HTTPError:
+                    time.sleep(0.01)
+            first.append(time.perf_counter() - t0)
+        finally:
+            proc.terminate()
+            proc.wait()
+    cli = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, "-m", "app", "--help"], env=os.environ, check=True, capture_output=True)
+        cli.append(time.perf_counter() - t0)
+    return {"api_import_ms": round(median(p["import_ms"] for p in probes), 1),
+            "api_rss_mb": round(median(p["rss_mb"] for p in probes), 1),
+            "api_first_response_ms": round(median(first) * 1000), "cli_help_ms": round(median(cli) * 1000),
+            "heavy_modules": len(probes[0]["heavy"])}
+
+# process worker cho kịch bản jobs: handler "bench" đốt CPU work_ms mỗi job
+JOB_WORKER = (
+    "import sys, time; from app import jobs\n"
+    "def burn(payloads):\n"
+    "    for _ in payloads:\n"
+    "        end = time.perf_counter() + float(sys.argv[1]) / 1000\n"
+    "        while time.perf_counter() < end: pass\n"
+    "jobs.HANDLERS['bench'] = burn; jobs.CLAIM_BATCH['bench'] = int(sys.argv[2])\n"
+    "jobs.run_worker(('bench',), exit_when_idle=True)"
+)
+
+def scenario_jobs(n, opts):
+    # n job đốt CPU qua app.jobs với 1, 2, 4 ... process worker: jobs/s theo số worker,
+    # thời gian khởi động một worker (hàng đợi rỗng) và chi phí hàng đợi mỗi job (claim +
+    # finish, đã trừ khởi động và phần việc thật); overhead_ms = tổng chi phí mỗi job trừ việc thật
+    from statistics import median
+    from app.db import init_db
+    from app.jobs import enqueue
+    init_db()
+    cpus = os.cpu_count() or 1
+    starts = []
+    for _ in range(3):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, "-c", JOB_WORKER, "0", "1"], env=os.environ, check=True)
+        starts.append(time.perf_counter() - t0)
+    start = median(starts)
+    out = {"cpus": cpus, "worker_start_ms": round(start * 1000)}
+    for w in opts["workers"]:
+        enqueue("bench", {f"{w}:{i}": {} for i in range(n)})
+        t0 = time.perf_counter()
+        procs = [subprocess.Popen([sys.executable, "-c", JOB_WORKER, str(opts["work_ms"]), str(opts["batch"])],
+                                  env=os.environ) for _ in range(w)]
+        for p in procs:
+            p.wait()
+        dt = time.perf_counter() - t0
+        out[f"w{w}_jobs_rps"] = round(n / dt)
+        out[f"w{w}_overhead_ms"] = round(dt * min(w, cpus) / n * 1000 - opts["work_ms"], 2)
+        out[f"w{w}_queue_ms"] = round((dt - start * -(-w // cpus)) * min(w, cpus) / n * 1000 - opts["work_ms"], 2)
+    return out
+
+SCENARIOS = {name[len("scenario_"):]: fn for name, fn in globals().items() if name.startswith("scenario_")}
+
+# ---- điều phối ----
+
+def _git(*args):
+    try:
+        return subprocess.run(["git", *args], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _run_one(name, n, opts, env):
+    env = dict(env, DB_PATH=os.path.join(tempfile.mkdtemp(prefix=f"bench_{name}_"), "bench.db"))
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-m", "bench.run", "--one", name, "--size", str(n),
+                           "--opts", json.dumps(opts)], env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        print(proc.stderr[-2000:], file=sys.stderr)
+        return {"scenario": name, "size": n, "error": proc.stderr.strip().splitlines()[-1:]}
+    res = json.loads(proc.stdout.strip().splitlines()[-1])
+    return {"scenario": name, "size": n, **res, "total_s": round(time.perf_counter() - t0, 1)}
+
+def compare(old_path, results):
+    with open(old_path) as f:
+        old = {(r["scenario"], r["size"]): r for r in json.load(f)["results"]}
+    print(f"--- so với {old_path}")
+    for r in results:
+        prev = old.get((r["scenario"], r["size"]))
+        if prev is None:
+            continue
+        for k, v in r.items():
+            p = prev.get(k)
+            if k in ("size", "total_s") or not isinstance(v, (int, float)) or not isinstance(p, (int, float)) or not p:
+                continue
+            if k.endswith(("_s", "_ms", "_mb", "_rps")):
+                delta = (v - p) / p * 100
+                worse = delta < 0 if k.endswith("_rps") else delta > 0
+                flag = "  ⚠️" if worse and abs(delta) >= 10 else ""
+                print(f"{r['scenario']:>10} {r['size']:>8} {k:<24} {p:>10} → {v:<10} {delta:+6.1f}%{flag}")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--full", action="store_true", help="kích thước lớn (10k → 1M bài), lâu")
+    ap.add_argument("--only", help="chỉ chạy các kịch bản này, ví dụ: api,rank")
+    ap.add_argument("--sizes", help="ghi đè kích thước, ví dụ: 1000,5000")
+    ap.add_argument("--seconds", type=float, default=3, help="thời gian load mỗi endpoint (api)")
+    ap.add_argument("--concurrency", type=int, default=32)
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--feed-latency", type=float, default=0.05)
+    ap.add_argument("--page-latency", type=float, default=0.05)
+    ap.add_argument("--page-kb", type=int, default=8)
+    ap.add_argument("--llm-latency", type=float, default=0.2)
+    ap.add_argument("--rate-429", type=float, default=0.05)
+    ap.add_argument("--job-workers", default="1,2,4", help="số process worker (jobs)")
+    ap.add_argument("--job-ms", type=float, default=2, help="CPU mỗi job, ms (jobs)")
+    ap.add_argument("--job-batch", type=int, default=20, help="số job mỗi lần claim (jobs)")
+    ap.add_argument("--out", default=RESULTS)
+    ap.add_argument("--compare", help="file kết quả cũ để so sánh")
+    ap.add_argument("--one", choices=sorted(SCENARIOS), help=argparse.SUPPRESS)
+    ap.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    ap.add_argument("--opts", help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+
+    if args.one:
+        print(json.dumps(SCENARIOS[args.one](args.size, json.loads(args.opts))), flush=True)
+        return
+
+    profile = PROFILES["full" if args.full else "quick"]
+    names = args.only.split(",") if args.only else list(profile)
+    opts = {"seconds": args.seconds, "concurrency": args.concurrency, "repeat": args.repeat,
+            "workers": [int(w) for w in args.job_workers.split(",")], "work_ms": args.job_ms, "batch": args.job_batch}
+    llm, llm_base = start_stub(latency=args.llm_latency, rate_429=args.rate_429, retry_after=0.2)
+    tmp = tempfile.mkdtemp(prefix="bench_run_")
+    env = dict(os.environ, OPENAI_API_KEY="stub", OPENAI_BASE_URL=f"{llm_base}/v1", GOOGLE_API_KEY="")
+
+    results = []
+    for name in names:
+        for n in [int(x) for x in args.sizes.split(",")] if args.sizes else profile[name]:
+            site = None
+            scenario_env = env
+            if name in ("ingest", "extract"):
+                feeds = FEEDS if name == "ingest" else EXTRACT_HOSTS
+                site = start_site(feeds=feeds, entries=max(1, n // feeds), feed_latency=args.feed_latency,
+                                  page_latency=args.page_latency, page_kb=args.page_kb)
+                sources = write_sources(os.path.join(tmp, f"sources-{name}-{n}.yaml"), site)
+                scenario_env = dict(env, BENCH_SOURCES=sources, BENCH_SITE_PORT=str(site.server_address[1]))
+            res = _run_one(name, n, opts, scenario_env)
+            if site:
+                site.shutdown()
+                site.server_close()
+            print(json.dumps(res, ensure_ascii=False), flush=True)
+            results.append(res)
+    llm.shutdown()
+
+    commit = _git("rev-parse", "--short", "HEAD")
+    report = {
+        "commit": commit, "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "date": datetime.now().isoformat(timespec="seconds"), "profile": "full" if args.full else "quick",
+        "python": platform.python_version(), "cpus": os.cpu_count(), "machine": platform.machine(),
+        "params": {k: v for k, v in vars(args).items() if k not in ("one", "size", "opts", "compare", "out")},
+        "results": results,
+    }
+    os.makedirs(args.out, exist_ok=True)
+    path = os.path.join(args.out, f"{datetime.now():%Y%m%d-%H%M%S}-{commit or 'nogit'}.json")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=1, ensure_ascii=False)
+    print(f"📝 {path}")
+    if args.compare:
+        compare(args.compare, results)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""Benchmark /api/search (FTS5 + bm25) so với LIKE '%..%' trên DB SQLite tạm.
+
+    python -m bench.search                 # 100k, 1M
+    python -m bench.search 200000 --repeat 50
+
+Bài giả dùng tiêu đề tổng hợp của bench.dedupe; nội dung = vài tiêu đề ghép lại.
+Thời gian seed đã gồm chi phí trigger cập nhật search_fts.
+"""
+import argparse, asyncio, json, os, random, sqlite3, subprocess, sys, tempfile, time
+from bench.dedupe import synth_titles
+
+def _seed(path, n, batch=50_000):
+    from app.content import compress, register
+    titles = synth_titles(n + 4 * 1000, seed=1, dup_rate=0)
+    rng = random.Random(2)
+    con = sqlite3.connect(path)
+    register(con)  # trigger FTS đọc nội dung qua unzstd()
+    for start in range(0, n, batch):
+        ids = range(start + 1, min(n, start + batch) + 1)
+        con.executemany(
+            "INSERT INTO news (id, url, title, source, published_at, fetched_at, social_score) "
+            "VALUES (?, ?, ?, 'bench', '2025-01-01 00:00:00', '2025-01-01 00:00:00', 0)",
+            [(i, f"https://bench.local/{i}", titles[i - 1]) for i in ids],
+        )
+        con.executemany("INSERT INTO news_content (news_id, body) VALUES (?, ?)",
+                        [(i, compress(" ".join(rng.sample(titles, 4)))) for i in ids])
+        con.commit()
+    con.close()
+    return titles
+
+def _queries(titles):
+    # một từ hiếm, một từ phổ biến, hai từ, và một từ khoá AI xuất hiện ở rất nhiều bài
+    words = [w for t in titles[:2000] for w in t.split() if len(w) > 3]
+    freq = {}
+    for w in words:
+        freq[w] = freq.get(w, 0) + 1
+    ranked = sorted(freq, key=freq.get)
+    return {"rare": ranked[0], "common": ranked[-1], "two_words": f"{ranked[len(ranked) // 2]} {ranked[-2]}",
+            "ai_keyword": "OpenAI"}
+
+def _time(fn, repeat):
+    lat = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        lat.append(time.perf_counter() - t0)
+    lat.sort()
+    return round(lat[len(lat) // 2] * 1000, 2)
+
+def run(n, repeat):
+    # DB_PATH phải được đặt trước khi import app (xem main)
+    from app.db import engine, init_db
+    from app.search import search
+    from app.content import register
+    path = engine.url.database
+    init_db()
+    t0 = time.perf_counter()
+    titles = _seed(path, n)
+    seed_s = time.perf_counter() - t0
+
+    con = sqlite3.connect(path)
+    register(con)
+    res = {"n": n, "seed_s": round(seed_s, 1), "queries": {}}
+    loop = asyncio.new_event_loop()
+    for name, q in _queries(titles).items():
+        hits = loop.run_until_complete(search(q, 20))
+        fts_ms = _time(lambda: loop.run_until_complete(search(q, 20)), repeat)
+        like = q.split()[0]
+        like_ms = _time(lambda: con.execute(
+            "SELECT n.id FROM news n LEFT JOIN news_content c ON c.news_id = n.id "
+            "WHERE n.title LIKE ?1 OR unzstd(c.body) LIKE ?1 ORDER BY n.id DESC LIMIT 20", (f"%{like}%",)
+        ).fetchall(), max(1, repeat // 10))
+        res["queries"][name] = {"q": q, "hits": len(hits), "fts_p50_ms": fts_ms, "like_p50_ms": like_ms}
+    return res
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("sizes", nargs="*", type=int, default=[100_000, 1_000_000])
+    ap.add_argument("--repeat", type=int, default=20)
+    ap.add_argument("--one", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+    if args.one:
+        print(json.dumps(run(args.sizes[0], args.repeat)), flush=True)
+        return
+    for n in args.sizes:
+        env = dict(os.environ, DB_PATH=os.path.join(tempfile.mkdtemp(prefix="bench_search_"), "bench.db"))
+        subprocess.run([sys.executable, "-m", "bench.search", str(n), "--one", "--repeat", str(args.repeat)],
+                       env=env, check=True)
+
+if __name__ == "__main__":
+    sys.exit(main())
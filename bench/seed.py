@@ -0,0 +1,87 @@
+"""Seed DB SQLite (DB_PATH) với N bài giả cho benchmark, 10k – 1M bài.
+
+    DB_PATH=/tmp/bench.db python -m bench.seed 100000
+    DB_PATH=/tmp/bench.db python -m bench.seed 1000000 --content-words 30 --picks 10
+
+Tiêu đề tổng hợp của bench.dedupe, nội dung ghép từ cùng bộ từ vựng, published_at rải
+đều trong --hours giờ gần nhất; nguồn / social_score / topic_tags ngẫu nhiên theo bảng
+trọng số của ranker. Chèn thẳng bằng sqlite3 theo lô, nội dung nén zstd vào news_content
+(trigger FTS5 vẫn chạy, thời gian seed đã gồm chi phí đó). --picks K: thêm K summary + picks hôm nay và dựng sẵn picks_pages
+như stage publish.
+"""
+import argparse, json, random, sqlite3, sys, time
+from datetime import datetime, timedelta
+
+from bench.dedupe import synth_titles
+
+def seed_news(n, hours=70.0, content_words=50, dup_rate=0.0, picks=10, batch=50_000, seed=0):
+    # DB_PATH phải được đặt trước khi import app
+    from app.content import compress, content_hash, register
+    from app.db import engine, init_db
+    from app.ranker import SOURCE_WEIGHT, TOPIC_WEIGHT
+    init_db()
+    t0 = time.perf_counter()
+    rng = random.Random(seed)
+    titles = synth_titles(n, seed=seed, dup_rate=dup_rate)
+    words = " ".join(titles[:5000]).split()
+    sources = list(SOURCE_WEIGHT) + ["Blog A", "Blog B", "Blog C"]
+    tags = list(TOPIC_WEIGHT) + ["misc"]
+    now = datetime.utcnow()
+    con = sqlite3.connect(engine.url.database)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA synchronous=OFF")
+    register(con)
+    base = con.execute("SELECT COALESCE(MAX(id), 0) FROM news").fetchone()[0]
+    for lo in range(0, n, batch):
+        rows, bodies = [], []
+        for i in range(lo, min(n, lo + batch)):
+            content = " ".join(rng.choices(words, k=content_words))
+            rows.append((
+                base + i + 1, f"https://bench.local/{base + i}", titles[i], rng.choice(sources),
+                str(now - timedelta(hours=hours * i / max(1, n))), str(now),
+                rng.expovariate(1 / 20), len(content), content_hash(content),
+                ",".join(rng.sample(tags, rng.randint(0, 2))),
+            ))
+            bodies.append((base + i + 1, compress(content)))
+        con.executemany(
+            "INSERT INTO news (id, url, title, source, published_at, fetched_at, social_score, "
+            "content_len, content_hash, topic_tags) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        con.executemany("INSERT INTO news_content (news_id, body) VALUES (?, ?)", bodies)
+        con.commit()
+    con.close()
+    if picks:
+        _seed_picks(base + 1, picks)
+    return {"rows": n, "seed_s": round(time.perf_counter() - t0, 2)}
+
+def _seed_picks(first_id, k):
+    from app.db import SessionLocal
+    from app.models import Summary, Picks
+    from app.publish import today_str
+    from app.publish import materialize_picks
+    d = today_str()
+    with SessionLocal() as s:
+        for r in range(k):
+            summary = Summary(news_id=first_id + r, title_vi=f"Tin AI {r + 1}", bullets_json='["a", "b", "c"]',
+                              so_what_vn="", hashtags="#AInews", attribution="bench",
+                              url=f"https://bench.local/{first_id + r}")
+            s.add(summary)
+            s.flush()
+            s.add(Picks(date_str=d, rank=r + 1, news_id=first_id + r, summary_id=summary.id))
+        s.flush()
+        materialize_picks(s, d)
+        s.commit()
+
+def main(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("n", type=int)
+    ap.add_argument("--hours", type=float, default=70.0)
+    ap.add_argument("--content-words", type=int, default=50)
+    ap.add_argument("--dup-rate", type=float, default=0.0)
+    ap.add_argument("--picks", type=int, default=10)
+    args = ap.parse_args(argv)
+    print(json.dumps(seed_news(args.n, args.hours, args.content_words, args.dup_rate, args.picks)))
+
+if __name__ == "__main__":
+    sys.exit(main())
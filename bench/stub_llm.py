@@ -0,0 +1,104 @@
+"""Server giả lập OpenAI (chat.completions) và Gemini (generateContent) để đo offline.
+
+    python -m bench.stub_llm --port 8900 --latency 0.3 --rate-429 0.1
+
+Trong code: `server, base = start_stub(latency=0.2)` rồi đặt
+OPENAI_BASE_URL=f"{base}/v1" và GEMINI_BASE_URL=base trước khi import app.
+GET /stats trả số kết nối TCP và số request đã nhận (để đo tái sử dụng kết nối).
+"""
+import argparse, json, random, re, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def _summary(i=None):
+    out = {
+        "title_vi": "Tin AI tổng hợp từ server giả lập",
+        "bullets": ["Điểm mới", "Vì sao quan trọng", "Ứng dụng"],
+        "so_what_vn": "Doanh nghiệp Việt Nam có thể thử nghiệm sớm.",
+        "hashtags": ["#AInews", "#LLM", "#Stub"],
+    }
+    if i is not None:
+        out["id"] = i
+    return out
+
+def _answer(prompt: str) -> str:
+    ids = re.findall(r"^\[ID\]: (\d+)", prompt, re.M)
+    if ids:
+        return json.dumps({"items": [_summary(int(i)) for i in ids]}, ensure_ascii=False)
+    return json.dumps(_summary(), ensure_ascii=False)
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, addr, latency=0.2, rate_429=0.0, retry_after=1.0):
+        super().__init__(addr, StubHandler)
+        self.latency, self.rate_429, self.retry_after = latency, rate_429, retry_after
+        self.connections = self.requests = self.throttled = 0
+        self.lock = threading.Lock()
+
+    def process_request(self, request, client_address):
+        with self.lock:
+            self.connections += 1
+        super().process_request(request, client_address)
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body: dict, headers=None):
+        raw = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def do_GET(self):
+        srv = self.server
+        self._send(200, {"connections": srv.connections, "requests": srv.requests, "throttled": srv.throttled})
+
+    def do_POST(self):
+        srv = self.server
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        with srv.lock:
+            srv.requests += 1
+        time.sleep(srv.latency)
+        if srv.rate_429 and random.random() < srv.rate_429:
+            with srv.lock:
+                srv.throttled += 1
+            return self._send(429, {"error": {"message": "rate limited", "code": "rate_limit_exceeded"}},
+                              {"Retry-After": str(srv.retry_after)})
+        if self.path.startswith("/v1/chat/completions"):
+            prompt = body["messages"][-1]["content"]
+            return self._send(200, {
+                "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()),
+                "model": body.get("model", "stub"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": _answer(prompt)}}],
+                "usage": {"prompt_tokens": len(prompt) // 3, "completion_tokens": 200,
+                          "total_tokens": len(prompt) // 3 + 200},
+            })
+        if ":generateContent" in self.path:
+            prompt = body["contents"][-1]["parts"][0]["text"]
+            return self._send(200, {"candidates": [{"content": {"parts": [{"text": _answer(prompt)}]}}]})
+        self._send(404, {"error": "not found"})
+
+def start_stub(host="127.0.0.1", port=0, **kw):
+    server = StubServer((host, port), **kw)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8900)
+    ap.add_argument("--latency", type=float, default=0.2)
+    ap.add_argument("--rate-429", type=float, default=0.0)
+    ap.add_argument("--retry-after", type=float, default=1.0)
+    a = ap.parse_args()
+    srv = StubServer((a.host, a.port), latency=a.latency, rate_429=a.rate_429, retry_after=a.retry_after)
+    print(f"stub LLM on http://{a.host}:{a.port}")
+    srv.serve_forever()
@@ -0,0 +1,123 @@
+"""Server giả lập các site tin: RSS feed + trang bài HTML, độ trễ / kích thước tuỳ chỉnh.
+
+    python -m bench.stub_site --port 8901 --feeds 14 --entries 30 --page-latency 0.3
+
+GET /feed/<f>        RSS <entries> bài; ETag cố định theo feed → If-None-Match trả 304
+GET /page/<f>-<j>    trang bài ~<page_kb> KB, nội dung khác nhau theo từng bài
+Feed f trễ feed_latency × (1 + 9·f/(feeds-1)) giây (feed chậm dần, như site thật).
+Trong code: `site = start_site(...)` rồi `write_sources(path, site)` → sources.yaml với mỗi
+feed một host loopback riêng (127.0.0.<f+2>), để giới hạn theo host hoạt động như thật.
+"""
+import argparse, random, threading, time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from bench.dedupe import synth_titles
+
+class SiteServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, addr, feeds=14, entries=30, feed_latency=0.3, page_latency=0.3, page_kb=8,
+                 error_rate=0.0, dup_rate=0.05):
+        super().__init__(addr, SiteHandler)
+        self.feeds, self.entries = feeds, entries
+        self.feed_latency, self.page_latency, self.page_kb = feed_latency, page_latency, page_kb
+        self.error_rate = error_rate
+        self.titles = synth_titles(feeds * entries, seed=3, dup_rate=dup_rate)
+        self.words = " ".join(synth_titles(2000, seed=4, dup_rate=0)).split()
+        self.now = time.time()
+        self.requests = self.not_modified = 0
+        self.lock = threading.Lock()
+
+class SiteHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, body: str = "", ctype: str = "text/html", headers=None):
+        raw = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(raw)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def _feed(self, f: int):
+        srv = self.server
+        time.sleep(srv.feed_latency * (1 + 9 * f / max(1, srv.feeds - 1)))
+        etag = f'"feed-{f}-{srv.entries}"'
+        if self.headers.get("If-None-Match") == etag:
+            with srv.lock:
+                srv.not_modified += 1
+            return self._send(304, headers={"ETag": etag})
+        items = "".join(
+            f"<item><title>{srv.titles[f * srv.entries + j]}</title>"
+            f"<link>http://{self.headers['Host']}/page/{f}-{j}</link>"
+            f"<pubDate>{formatdate(srv.now - 60 * (f * srv.entries + j))}</pubDate></item>"
+            for j in range(srv.entries)
+        )
+        self._send(200, f'<?xml version="1.0"?><rss version="2.0"><channel><title>feed {f}</title>'
+                        f"{items}</channel></rss>", "application/rss+xml", {"ETag": etag})
+
+    def _page(self, key: str):
+        srv = self.server
+        time.sleep(srv.page_latency)
+        rng = random.Random(key)
+        if srv.error_rate and rng.random() < srv.error_rate:
+            return self._send(500, "error")
+        # ~280 byte mỗi đoạn 40 từ
+        paras = "".join(
+            "<p>" + " ".join(rng.choices(srv.words, k=40)) + ".</p>"
+            for _ in range(max(1, srv.page_kb * 1024 // 280))
+        )
+        self._send(200, f"<html><head><title>{key}</title>"
+                        f'<meta property="og:image" content="/img/{key}.png"></head>'
+                        f"<body><article><h1>{key}</h1>{paras}</article></body></html>")
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests += 1
+        kind, _, key = self.path.strip("/").partition("/")
+        if kind == "feed":
+            return self._feed(int(key))
+        if kind == "page":
+            return self._page(key)
+        self._send(404, "not found")
+
+def start_site(host="0.0.0.0", port=0, **kw):
+    server = SiteServer((host, port), **kw)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def feed_url(port: int, f: int) -> str:
+    return f"http://127.0.0.{f + 2}:{port}/feed/{f}"
+
+def page_url(port: int, f: int, j: int) -> str:
+    return f"http://127.0.0.{f + 2}:{port}/page/{f}-{j}"
+
+def write_sources(path, site):
+    port = site.server_address[1]
+    with open(path, "w") as f:
+        f.write("feeds:\n" + "".join(
+            f"  - name: bench {i}\n    url: {feed_url(port, i)}\n" for i in range(site.feeds)
+        ))
+    return path
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="0.0.0.0")
+    ap.add_argument("--port", type=int, default=8901)
+    ap.add_argument("--feeds", type=int, default=14)
+    ap.add_argument("--entries", type=int, default=30)
+    ap.add_argument("--feed-latency", type=float, default=0.3)
+    ap.add_argument("--page-latency", type=float, default=0.3)
+    ap.add_argument("--page-kb", type=int, default=8)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    a = ap.parse_args()
+    srv = SiteServer((a.host, a.port), feeds=a.feeds, entries=a.entries, feed_latency=a.feed_latency,
+                     page_latency=a.page_latency, page_kb=a.page_kb, error_rate=a.error_rate)
+    print(f"stub site on port {a.port}; feeds: http://127.0.0.2:{a.port}/feed/0 ... /feed/{a.feeds - 1}")
+    srv.serve_forever()